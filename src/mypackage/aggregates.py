@@ -0,0 +1,256 @@
+# %%
+import pandas as pd
+import numpy as np
+# %%
+# Mergeable partial states of the statistics used by the Analyzer.
+# Every state can be computed from a part of a dataset (a chunk, a partition, ...)
+# and two states can be merged into the state of both parts together, so the
+# statistics of a dataset can be computed without ever holding it in memory.
+# %%
+class Moments:
+    """Count, mean, variance, minimum and maximum of a numerical column.
+
+    The mean and the variance are merged with the parallel version of
+    Welford's algorithm (Chan et al.), which is numerically stable.
+
+
+    Attributes
+    ----------
+    count: int
+        The number of non-missing values.
+    mean: float
+        The mean of the values.
+    m2: float
+        The sum of the squared differences from the mean.
+    minimum, maximum: float
+        The smallest and the largest value.
+
+    """
+
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 minimum: float = np.nan, maximum: float = np.nan):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+
+    @classmethod
+    def from_values(cls, values):
+        """Computes the state of an array of values (missing values are ignored)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return cls()
+        mean = values.mean()
+        return cls(values.size, mean, ((values - mean) ** 2).sum(), values.min(), values.max())
+
+
+    def update(self, values):
+        """Adds an array of values to the state."""
+        return self.merge(Moments.from_values(values))
+
+
+    def merge(self, other):
+        """Merges another state into this state and returns this state."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        return self
+
+
+    @property
+    def variance(self):
+        """The sample variance (ddof = 1) like pandas computes it."""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+    def describe(self, name: str = None):
+        """Returns the statistics in the layout of pandas.Series.describe (without percentiles)."""
+        return pd.Series([float(self.count), self.mean if self.count else np.nan, self.std,
+                          self.minimum, self.maximum],
+                         index=["count", "mean", "std", "min", "max"], name=name)
+
+
+
+class ValueCounts:
+    """Frequencies of the values of a categorical column.
+
+
+    Attributes
+    ----------
+    counts: pandas.Series
+        The number of occurrences of every value (missing values are not counted).
+
+    """
+
+
+    def __init__(self, counts: pd.Series = None):
+        self.counts = pd.Series(dtype="int64") if counts is None else counts
+
+
+    @classmethod
+    def from_values(cls, values):
+        values = pd.Series(values)
+        return cls(values.value_counts(sort=False).astype("int64"))
+
+
+    def update(self, values):
+        return self.merge(ValueCounts.from_values(values))
+
+
+    def merge(self, other):
+        if len(self.counts) == 0:
+            self.counts = other.counts.copy()
+        elif len(other.counts):
+            self.counts = self.counts.add(other.counts, fill_value=0).astype("int64")
+        return self
+
+
+    def describe(self, name: str = None):
+        """Returns the statistics in the layout of pandas.Series.describe for categorical columns."""
+        counts = self.counts[self.counts > 0]
+        top = counts.idxmax() if len(counts) else np.nan
+        return pd.Series([int(counts.sum()), len(counts), top, int(counts.max()) if len(counts) else np.nan],
+                         index=["count", "unique", "top", "freq"], name=name, dtype=object)
+
+
+
+class GroupMoments:
+    """Count, mean, variance, minimum and maximum of a column per group.
+
+    This is the mergeable state behind the survival rates (the mean of
+    'survived' per group) and the ccf pivots (the fare statistics per
+    embarked town and class).
+
+
+    Attributes
+    ----------
+    table: pandas.DataFrame
+        One row per group (the group keys as index) and the columns
+        'count', 'mean', 'm2', 'min' and 'max'.
+
+    """
+
+
+    def __init__(self, table: pd.DataFrame = None):
+        if table is None:
+            table = pd.DataFrame(columns=["count", "mean", "m2", "min", "max"], dtype=float)
+        self.table = table
+
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, group_by, column: str):
+        """Computes the state of a DataFrame (rows with missing group keys are ignored)."""
+        grouped = data.groupby(group_by, observed=True)[column]
+        table = grouped.agg(["count", "mean", "var", "min", "max"])
+        # m2 is the variance times (count - 1), groups with one value have no variance
+        table["m2"] = (table.pop("var") * (table["count"] - 1)).fillna(0.0)
+        table["mean"] = table["mean"].fillna(0.0)
+        return cls(table[["count", "mean", "m2", "min", "max"]].astype(float))
+
+
+    def update(self, data: pd.DataFrame, group_by, column: str):
+        return self.merge(GroupMoments.from_frame(data, group_by, column))
+
+
+    def merge(self, other):
+        if len(self.table) == 0:
+            self.table = other.table.copy()
+            return self
+        if len(other.table) == 0:
+            return self
+        index = self.table.index.union(other.table.index)
+        a = self.table.reindex(index)
+        b = other.table.reindex(index)
+        na = a["count"].fillna(0.0)
+        nb = b["count"].fillna(0.0)
+        count = na + nb
+        delta = b["mean"].fillna(0.0) - a["mean"].fillna(0.0)
+        # the parallel Welford update, computed for all groups at once
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(count > 0, nb / count, 0.0)
+            cross = np.where(count > 0, delta ** 2 * na * nb / count, 0.0)
+        self.table = pd.DataFrame({
+            "count": count,
+            "mean": a["mean"].fillna(0.0) + delta * weight,
+            "m2": a["m2"].fillna(0.0) + b["m2"].fillna(0.0) + cross,
+            "min": np.fmin(a["min"], b["min"]),
+            "max": np.fmax(a["max"], b["max"]),
+        }, index=index)
+        return self
+
+
+    def statistic(self, statistic: str):
+        """Returns one statistic ('count', 'mean', 'std', 'var', 'min', 'max' or 'sum') per group."""
+        table = self.table.sort_index()
+        count = table["count"]
+        if statistic == "count":
+            return count.astype("int64")
+        if statistic == "mean":
+            return table["mean"].where(count > 0)
+        if statistic == "sum":
+            return table["mean"] * count
+        if statistic in ("var", "std"):
+            variance = (table["m2"] / (count - 1)).where(count > 1)
+            return np.sqrt(variance) if statistic == "std" else variance
+        if statistic in ("min", "max"):
+            return table[statistic]
+        raise ValueError(f"The statistic '{statistic}' can not be computed from partial states.")
+
+
+
+class ContingencyCounts:
+    """Frequencies of every combination of the values of two categorical columns.
+
+
+    Attributes
+    ----------
+    counts: pandas.Series
+        The number of occurrences of every observed combination,
+        indexed by a MultiIndex of the two columns.
+
+    """
+
+
+    def __init__(self, counts: pd.Series = None):
+        self.counts = pd.Series(dtype="int64") if counts is None else counts
+
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, column1: str, column2: str):
+        return cls(data.groupby([column1, column2], observed=True).size().astype("int64"))
+
+
+    def update(self, data: pd.DataFrame, column1: str, column2: str):
+        return self.merge(ContingencyCounts.from_frame(data, column1, column2))
+
+
+    def merge(self, other):
+        if len(self.counts) == 0:
+            self.counts = other.counts.copy()
+        elif len(other.counts):
+            self.counts = self.counts.add(other.counts, fill_value=0).astype("int64")
+        return self
+
+
+    def table(self):
+        """Returns the contingency table like pandas.crosstab."""
+        return self.counts.unstack(fill_value=0).sort_index().sort_index(axis=1)
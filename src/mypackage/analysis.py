@@ -2,15 +2,84 @@
 import pandas as pd
 import numpy as np
 import os
-import scipy
-from scipy.stats import chi2_contingency
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from mypackage.dataset import csv_path, load_data, open_store
+from mypackage import contingency, compaction, profiling, intervals
+from mypackage.profiling import profiled
+from mypackage.sketch import QuantileSketch, describe_approximate, describe_from_states
+from mypackage.aggregates import Moments, GroupMoments, ContingencyCounts
+from mypackage.cube import SurvivalCube
+from mypackage.bitmap import Bitmap, BitmapIndex
+from mypackage.report import compute_report
+from mypackage.backends import get_backend
 # %%
+# the dataset is loaded on first access of 'data' (or 'analyzer') instead of at import,
+# load_data() memory-maps the binary cache next to the csv file after the first load
 # data = pd.read_csv("cleaned_data.csv", index_col=0)
-csv_path = os.path.join(os.path.dirname(__file__), 'cleaned_data.csv')
-data = pd.read_csv(csv_path, index_col = 0)
+def __getattr__(name):
+    if name == "data":
+        return load_data()
+    if name == "analyzer":
+        # built once, later accesses find it in the module namespace
+        globals()["analyzer"] = Analyzer()
+        return globals()["analyzer"]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 # %%
-# show the first ten rows of the titanic dataset
-data.head(n = 10)
+logger = logging.getLogger(__name__)
+# %%
+# integer codes of the columns used by the worker processes of 'association_matrix',
+# they are sent once per worker through the pool initializer instead of once per task
+_worker_codes = None
+
+
+def _init_association_worker(codes):
+    global _worker_codes
+    _worker_codes = codes
+
+
+def _association_tables(i: int):
+    """Counts the contingency tables of column i with every later column."""
+    codes1, n_levels1 = _worker_codes[i]
+    return [contingency.contingency_counts(codes1, n_levels1, codes2, n_levels2)
+            for codes2, n_levels2 in _worker_codes[i + 1:]]
+# %%
+# statistics that every (cached) aggregation computes in its group-by pass,
+# so later pivots of another statistic can be served from the same pass
+DEFAULT_AGGREGATIONS = ("mean", "min", "max", "count", "median")
+
+# statistics that can be maintained incrementally after 'Analyzer.append'
+MERGEABLE_AGGREGATIONS = ("mean", "min", "max", "count", "sum", "std", "var")
+
+# the default dimensions of 'Analyzer.survival_cube'
+CUBE_DIMENSIONS = ("pclass", "sex", "who", "embark_town", "alone")
+# %%
+def _concat_rows(data: pd.DataFrame, pending: list):
+    """Concatenates appended rows to a dataset and keeps categorical dtypes."""
+    frames = [data] + pending
+    for name, dtype in data.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # the categories of the new rows are added to the categories of the dataset
+            new_values = pd.concat([frame[name] for frame in pending]).dropna().unique()
+            categories = dtype.categories.union(pd.Index(new_values).difference(dtype.categories))
+            merged = pd.CategoricalDtype(categories, ordered=dtype.ordered)
+            frames = [frame.astype({name: merged}) for frame in frames]
+    return pd.concat(frames)
+
+
+def _survival_intervals(counts: pd.DataFrame, ci: float, method: str, resamples: int, seed, n_jobs: int):
+    """Returns the survival rates with their confidence intervals from the survivors ('sum') and passengers ('count') per group."""
+    # check if the interval method is known and the level is a percentage
+    assert method in ("wilson", "bootstrap"), "The method must be 'wilson' or 'bootstrap'."
+    assert 0 < ci < 100, "The confidence level must be between 0 and 100."
+    with profiling.phase(method):
+        if method == "wilson":
+            lower, upper = intervals.wilson_interval(counts["sum"], counts["count"], ci)
+        else:
+            lower, upper = intervals.bootstrap_interval(counts["sum"], counts["count"], ci,
+                                                        resamples, seed, n_jobs)
+    return pd.DataFrame({"survived": counts["sum"] / counts["count"], "lower": lower, "upper": upper},
+                        index=counts.index)
 # %%
 class Analyzer:
     """The Analyzer class provides methods for statistical and categorical
@@ -21,30 +90,362 @@ class Analyzer:
     ----------
     data: pandas.DataFrame
         The Titanic dataset that is going to be analyzed.
+        Assigning a new dataset clears the cached aggregations.
+    columns: pandas.Index
+        The column names of the dataset.
+    n_rows: int
+        The number of rows of the dataset (including the appended rows).
+    store: str
+        The column store the dataset is memory-mapped from (see 'open'),
+        None for any other dataset.
+    backend: str
+        The backend the analyses run on (see mypackage.backends): "pandas"
+        for a DataFrame, "numpy" for a dict of numpy arrays and "arrow" for
+        a pyarrow Table.
     
     """
     
     
-    def __init__(self, data):
+    def __init__(self, data = None, compact: bool = False):
         """Initializes the class instance with the given (Titanic) dataset
         
         
         Parameters
         ----------
-        data: pandas.DataFrame
+        data: pandas.DataFrame, dict or pyarrow.Table
             The Titanic dataset that is going to be analyzed.
+            If no dataset is passed, the cleaned Titanic dataset that ships
+            with the package is loaded through 'load_data'.
+            A dict of 1-D numpy arrays or a pyarrow Table is analyzed as it
+            is (without a conversion to pandas) by get_stats, aggregate,
+            survival_rate, chi_square_test and the ccf pivots, the other
+            methods need a DataFrame.
+        compact: bool
+            Whether the dataset is converted to compact dtypes (see 'compact').
             
         """
-        # check if the dataset is stored as a pandas DataFrame
-        assert isinstance(data, pd.DataFrame), ("Data must be a pandas DataFrame")
+        if data is None:
+            data = load_data()
+        # check if the dataset is a pandas DataFrame, a dict of numpy arrays or a pyarrow Table
+        backend = get_backend(data)
         # ensure that the dataset is not empty
-        assert not data.empty, "The dataset must not be empty."
+        assert len(backend.columns(data)) > 0 and backend.n_rows(data) > 0, "The dataset must not be empty."
         
         self.data = data
+        if compact:
+            self.compact()
+        
+    
+    
+    @property
+    def data(self):
+        # rows added with 'append' are only concatenated when the full dataset is needed
+        if self._pending:
+            self._data = _concat_rows(self._data, self._pending)
+            self._pending = []
+            if self._memory_before is not None:
+                # the new rows may have widened the dtypes again
+                self._data = compaction.compact(self._data)
+        return self._data
+    
+    
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._backend = get_backend(data)
+        self._store = None
+        self._pending = []
+        self._incremental = False
+        self._memory_before = None
+        # cached aggregations belong to the old dataset
+        self.clear_cache()
+    
+    
+    @classmethod
+    def open(cls, store: str, columns: list = None):
+        """Opens a column store with memory-mapped, read-only columns.
+        
+        Opening takes milliseconds and reads no values: every method only
+        reads the columns it uses (e.g. 'survived' and 'pclass' for
+        survival_rate("pclass")). Worker processes (e.g. of
+        'Visualizer.render_all') open the same store instead of receiving a
+        copy of the dataset, so all processes share its pages in the page cache.
+        
+        
+        Parameters
+        ----------
+        store: str
+            The directory written by mypackage.dataset.write_store
+            (or the '<file>.cache' directory of a csv file).
+        columns: list
+            The columns to open, defaults to all columns.
+        
+        
+        Returns
+        -------
+        Analyzer
+            The instance of the dataset (a Visualizer for Visualizer.open).
+        
+        
+        Examples
+        --------
+        write_store(load_data(), "titanic.store")
+        
+        analyzer = Analyzer.open("titanic.store")
+        
+        """
+        analyzer = cls(open_store(store, columns))
+        analyzer._store = (os.fspath(store), None if columns is None else list(columns))
+        return analyzer
+    
+    
+    @property
+    def store(self):
+        return None if self._store is None else self._store[0]
+    
+    
+    @property
+    def backend(self):
+        return self._backend.name
+    
+    
+    @property
+    def columns(self):
+        return self._backend.columns(self._data)
+    
+    
+    @property
+    def n_rows(self):
+        # the appended rows are counted without concatenating them
+        return self._backend.n_rows(self._data) + sum(len(rows) for rows in self._pending)
+    
+    
+    def _require_pandas(self, method: str):
+        # check if the method can run on the dataset, it works on the DataFrame itself
+        assert self._backend.name == "pandas", \
+            f"'{method}' needs a pandas DataFrame, the dataset uses the {self._backend.name} backend."
+    
+    
+    
+    def clear_cache(self):
+        """Removes all cached aggregations, bitmap indexes and maintained states.
+        
+        Call this after changing 'self.data' in place (e.g. with .loc),
+        assigning a new dataset clears the cache automatically.
+        
+        """
+        self._aggregations = {}
+        self._bitmaps = {}
+        self._states = {}
+    
+    
+    
+    @profiled
+    def compact(self, max_category_ratio: float = 0.5):
+        """Converts the dataset to compact dtypes that keep every value.
+        
+        String columns with few distinct values become categoricals, flags
+        (e.g. an object column of True/False) become bool and integers get the
+        smallest signed integer dtype that holds all values (floats are kept).
+        All analyses give the same results, but the dataset needs several times
+        less memory and the group-bys work on small integer codes.
+        
+        
+        Parameters
+        ----------
+        max_category_ratio: float
+            String columns are converted to categoricals if the number of
+            distinct values is at most this share of the number of rows.
+        
+        
+        Returns
+        -------
+        Analyzer
+            The instance itself (to allow chaining).
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data, compact=True)
+        
+        analyzer.memory_report()
+        
+        """
+        self._require_pandas("compact")
+        before = compaction.column_memory(self.data)
+        # the setter clears the cached aggregations, their dtypes belong to the old dataset
+        self.data = compaction.compact(self.data, max_category_ratio)
+        self._memory_before = before
+        return self
+    
+    
+    
+    def memory_report(self):
+        """Shows the memory of every column before and after 'compact'.
+        
+        
+        Returns
+        -------
+        pandas.DataFrame
+            One row per column (plus the index and the total) with the dtypes,
+            the bytes before and after the compaction (including the Python
+            strings of object columns) and the ratio before / after.
+            Without a compaction both sides show the current dataset.
+        
+        """
+        self._require_pandas("memory_report")
+        after = compaction.column_memory(self.data)
+        before = after if self._memory_before is None else self._memory_before
+        return compaction.memory_report(before, after)
+    
+    
+    
+    @profiled
+    def append(self, rows):
+        """Adds new rows to the dataset and keeps the aggregates up to date.
+        
+        After the first call the Analyzer works incrementally: survival_rate,
+        chi_square_test, the ccf pivots (for mean, min, max, count, sum, std
+        and var) and get_stats(..., approx=True) are answered from maintained
+        partial states (group counts and sums, contingency counts, moments and
+        quantile sketches, see mypackage.aggregates). A state is built from
+        the full dataset on its first query and every later 'append' only
+        merges the state of the new rows, so later queries cost O(groups)
+        instead of O(rows).
+        
+        
+        Parameters
+        ----------
+        rows: pandas.DataFrame, dict or list of dicts
+            The new rows, with the same columns as the dataset.
+        
+        
+        Returns
+        -------
+        Analyzer
+            The instance itself (to allow chaining).
+        
+        
+        Notes
+        -----
+        The new rows are concatenated to 'self.data' only when the full
+        dataset is accessed. Other cached aggregations (see 'aggregate')
+        are cleared. Integer row labels are continued after the largest
+        label of the dataset.
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        analyzer.survival_rate("who")
+        
+        analyzer.append({"survived": 1, "pclass": 3, "sex": "female", ...})
         
+        analyzer.survival_rate("who")  # updated without a new group-by
+        
+        """
+        self._require_pandas("append")
+        rows = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(
+            [rows] if isinstance(rows, dict) else rows)
+        if len(rows) == 0:
+            return self
+        # check if the new rows have the columns of the dataset
+        missing = set(self.columns) - set(rows.columns)
+        assert not missing, f"The new rows miss the columns {sorted(missing)}."
+        rows = rows[list(self.columns)]
+        if pd.api.types.is_integer_dtype(self._data.index.dtype):
+            last = max([self._data.index.max()] + [pending.index.max() for pending in self._pending])
+            rows.index = pd.RangeIndex(last + 1, last + 1 + len(rows))
+        
+        with profiling.phase("update states", len(rows)):
+            for state, update in self._states.values():
+                update(state, rows)
+        self._pending.append(rows)
+        # the dataset is no longer the content of the store
+        self._store = None
+        self._aggregations = {}
+        self._bitmaps = {}
+        self._incremental = True
+        return self
+    
     
     
-    def get_stats(self, column: str):
+    def _maintained(self, key: tuple, build, update):
+        """Returns a maintained state, it is built from the full dataset on first use.
+        
+        build(data) computes the state of a DataFrame, update(state, rows)
+        merges the state of new rows into it.
+        
+        """
+        profiling.cache_access("states", key in self._states)
+        if key not in self._states:
+            with profiling.phase("build state"):
+                self._states[key] = (build(self.data), update)
+        return self._states[key][0]
+    
+    
+    
+    @profiled
+    def aggregate(self, group_by: list, column: str, statistics: tuple = DEFAULT_AGGREGATIONS):
+        """Computes statistics of a column for every group (memoized).
+        
+        The result is cached per (group keys, column, statistics). A request
+        whose statistics are all part of a cached aggregation of the same
+        groups and column is answered from the cache without a new group-by.
+        On a cache miss the requested statistics are computed together with
+        the default statistics (mean, min, max, count, median) in a single
+        group-by pass.
+        
+        
+        Parameters
+        ----------
+        group_by: list
+            The names of the columns to group by.
+        column: str
+            The name of the column to aggregate.
+        statistics: tuple
+            The names of the statistics (any aggregation known to
+            pandas' groupby.agg, e.g. "mean", "std", "sum").
+        
+        
+        Returns
+        -------
+        pandas.DataFrame
+            A DataFrame with one row per group (the group keys as index) and
+            one column per requested statistic.
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        analyzer.aggregate(["embark_town", "pclass"], "fare", ("mean", "count"))
+        
+        """
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        statistics = [statistics] if isinstance(statistics, str) else list(statistics)
+        # check if the passed columns exist in the dataset
+        for name in group_by + [column]:
+            assert name in self.columns, f"Column '{name}' does not exist in the dataset."
+        
+        # look for a cached aggregation of the same groups and column that contains all statistics
+        for (keys, value, computed), table in self._aggregations.items():
+            if keys == tuple(group_by) and value == column and set(statistics) <= set(computed):
+                profiling.cache_access("aggregations", True)
+                return table[statistics]
+        profiling.cache_access("aggregations", False)
+        
+        computed = tuple(dict.fromkeys(list(DEFAULT_AGGREGATIONS) + statistics))
+        with profiling.phase("groupby"):
+            self._aggregations[(tuple(group_by), column, computed)] = self._backend.aggregate(
+                self.data, group_by, column, list(computed))
+        return self._aggregations[(tuple(group_by), column, computed)][statistics]
+    
+    
+    
+    @profiled
+    def get_stats(self, column: str, approx: bool = False, relative_accuracy: float = 0.01):
         """Provides statistical summaries for a specific column in the dataset.
         
         
@@ -53,6 +454,13 @@ class Analyzer:
         column: str
             The name of the column to analyze. This should be a name of one
             of the columns in the Titanic dataset.
+        approx: bool
+            Whether the percentiles of a numerical column are approximated
+            with a mergeable quantile sketch (see mypackage.sketch) instead of
+            sorting the column. Count, mean, std, min and max stay exact.
+        relative_accuracy: float
+            The relative error bound of the approximate percentiles
+            (0.01 = every percentile is within 1% of the exact value).
         
         
         Returns
@@ -109,10 +517,26 @@ class Analyzer:
         
         """
         # check if the passed column exists in the dataset
-        assert column in self.data.columns, f"Column '{column}' does not exist in the dataset."
+        assert column in self.columns, f"Column '{column}' does not exist in the dataset."
+        
+        if approx and self._incremental and self._backend.is_numeric(self._data, column):
+            # moments and quantile sketch are maintained by 'append'
+            moments, sketch = self._maintained(
+                ("moments", column, relative_accuracy),
+                lambda data: (Moments.from_values(data[column].to_numpy(dtype=float, na_value=np.nan)),
+                              QuantileSketch.from_values(data[column].to_numpy(dtype=float, na_value=np.nan),
+                                                         relative_accuracy)),
+                lambda state, rows: [part.update(rows[column].to_numpy(dtype=float, na_value=np.nan))
+                                     for part in state])
+            return describe_from_states(moments, sketch, name=column)
         
-        # get the most important statistic through the .descibe function
-        return self.data[column].describe()
+        if approx and self._backend.is_numeric(self.data, column):
+            # one pass over the column, no sorting
+            with profiling.phase("sketch"):
+                return describe_approximate(self._backend.values(self.data, column), relative_accuracy, name=column)
+        # get the most important statistic through the .descibe function (of the backend)
+        with profiling.phase("describe"):
+            return self._backend.describe(self.data, column)
 
 
    
@@ -159,7 +583,9 @@ class Analyzer:
     
     
     
-    def chi_square_test(self, column1: str, column2: str):
+    @profiled
+    def chi_square_test(self, column1: str, column2: str, alpha: float = 0.05, method: str = "asymptotic",
+                        permutations: int = 10_000, seed: int = 0, n_jobs: int = 1):
         """Does a Chi-Square test to analyze the relationship
         between two categorical variables.
        
@@ -169,6 +595,21 @@ class Analyzer:
         column1, column2: str
            The names of the columns to analyze. These should be two strings
            corresponding to the column names in the Titanic dataset.
+        alpha: float
+           The significance level of the logged conclusion.
+        method: str
+           How the p-value is computed:
+           "asymptotic": from the chi-square distribution (scipy's chi2_contingency),
+           "permutation": from random permutations of the labels, which is
+           also valid for sparse tables (see contingency.permutation_pvalue),
+           "exact": from all permutations (only for 2 x 2 tables).
+        permutations: int
+           The largest number of permutations of the "permutation" method,
+           they stop early once the p-value is clearly above or below alpha.
+        seed: int
+           The seed of the permutations, the same seed gives the same p-value.
+        n_jobs: int
+           The number of processes that draw the permutations (-1 = all cores).
         
         
         Returns
@@ -187,7 +628,8 @@ class Analyzer:
         -----
         The Chi-Square test is only used for categorical variables.
         A p-value < 0.05 indicates a statistically significant relationship
-        between the two categorical variables.
+        between the two categorical variables. The conclusion is logged
+        (logger 'mypackage.analysis', level INFO), nothing is printed.
         Cramer's V value ranges from 0 to 1. Values close to 0 indicate weak
         association and values near 1 indicate a strong association.
        
@@ -199,35 +641,292 @@ class Analyzer:
         analyzer.chi_square_test(column1 = "pclass", column2 = "survived")
         
         Ouptput:
-        There is a statistically significant relationship between pclass and survived
         Out[13]: (102.88898875696056, 4.549251711298793e-23, 0.33981738800531175)
         
+        Logged:
+        There is a statistically significant relationship between pclass and survived
+        
         """
         # check if the passed columns exist in the dataset
-        assert column1 in self.data.columns, f"Column '{column1}' does not exist in the dataset."
-        assert column2 in self.data.columns, f"Column '{column2}' does not exist in the dataset."
+        assert column1 in self.columns, f"Column '{column1}' does not exist in the dataset."
+        assert column2 in self.columns, f"Column '{column2}' does not exist in the dataset."
         
-        # Create a contingency table for the two specified columns
-        contingency_table = pd.crosstab(self.data[column1], self.data[column2])
+        if self._incremental:
+            # the contingency counts are maintained by 'append'
+            contingency_table = self._maintained(
+                ("contingency", column1, column2),
+                lambda data: ContingencyCounts.from_frame(data, column1, column2),
+                lambda state, rows: state.update(rows, column1, column2)).table()
+        else:
+            # Create a contingency table for the two specified columns
+            with profiling.phase("crosstab"):
+                contingency_table = self._backend.crosstab(self.data, column1, column2)
         
+        return self._test_table(contingency_table, column1, column2, alpha, method, permutations, seed, n_jobs)
+    
+    
+    
+    def _test_table(self, contingency_table, column1: str, column2: str, alpha: float = 0.05,
+                    method: str = "asymptotic", permutations: int = 10_000, seed: int = 0, n_jobs: int = 1):
+        """Tests a contingency table, see 'chi_square_test'."""
         assert not contingency_table.empty, "Contingency table must not be empty."
         
         # Perform chi-square test to assess the independence between the two variables.
         # This returns the chi-square statistic, p-value, degrees of freedom, and the expected frequencies.
-        chi2, p, dof, expected = chi2_contingency(contingency_table)
+        # check if the method is known
+        assert method in ("asymptotic", "permutation", "exact"), \
+            "The method must be 'asymptotic', 'permutation' or 'exact'."
+        from scipy.stats import chi2_contingency
+        with profiling.phase("chi2_contingency"):
+            chi2, p, dof, expected = chi2_contingency(contingency_table)
+        if method == "permutation":
+            with profiling.phase("permutations"):
+                p, done = contingency.permutation_pvalue(contingency_table.to_numpy(), permutations, alpha,
+                                                         seed, n_jobs)
+            logger.info("permutation p-value of %s and %s from %d permutations", column1, column2, done)
+        elif method == "exact":
+            with profiling.phase("exact"):
+                p = contingency.exact_pvalue(contingency_table.to_numpy())
         # Calculate Cramér's V, which provides a measure of association between the two categorical variables.
-        v = self.cramers_v(chi2, contingency_table)
+        with profiling.phase("cramers_v"):
+            v = self.cramers_v(chi2, contingency_table)
 
-        alpha = 0.05
         # Determine if the result is statistically significant based on the p-value
-        if p < alpha: print(f"There is a statistically significant relationship between {column1} and {column2}")
-        else: print(f"\n There is no significant relationship between {column1} and {column2} \n")
+        if p < alpha: logger.info("There is a statistically significant relationship between %s and %s", column1, column2)
+        else: logger.info("There is no significant relationship between %s and %s", column1, column2)
        
         # Return the chi-square statistic, p-value, and Cramér's V for further analysis or reporting.
         return chi2, p, v
     
     
     
+    @profiled
+    def chi_square_tests(self, pairs: list, by: str = None, alpha: float = 0.05, correction: str = "fdr_bh"):
+        """Does Chi-Square tests for many pairs of categorical variables at once,
+        optionally per stratum of a grouping column.
+        
+        Every column is factorized once, all contingency tables (per pair and
+        stratum) are counted with np.bincount and stacked, and all p-values are
+        computed with one vectorized call. Nothing is printed, the number of
+        significant results is logged (logger 'mypackage.analysis').
+        
+        
+        Parameters
+        ----------
+        pairs: list
+            The pairs of column names, e.g. [("pclass", "survived"), ("sex", "survived")].
+        by: str
+            The name of a column whose values define the strata. Every pair is
+            tested separately for every value of this column.
+        alpha: float
+            The significance level that is applied to the adjusted p-values.
+        correction: str
+            The correction for multiple testing: "fdr_bh" (Benjamini-Hochberg,
+            default), "holm", "bonferroni" or None. All tests of the call are
+            corrected together.
+        
+        
+        Returns
+        -------
+        pandas.DataFrame
+            One row per test with the columns 'column1', 'column2' (and the
+            stratum column if 'by' is given), 'n', 'chi2', 'dof', 'p',
+            'p_adjusted', 'v' and 'significant'.
+        
+        
+        Notes
+        -----
+        The statistics are identical to 'chi_square_test' (including Yates'
+        correction for 2x2 tables). Strata in which a table has only one row
+        or column get chi2 = 0 and p = 1.
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        analyzer.chi_square_tests([("pclass", "survived"), ("sex", "survived")], by="embark_town")
+        
+        """
+        self._require_pandas("chi_square_tests")
+        pairs = [tuple(pair) for pair in pairs]
+        assert len(pairs) > 0, "At least one pair of columns is needed."
+        columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+        # check if the passed columns exist in the dataset
+        for column in columns + ([by] if by is not None else []):
+            assert column in self.data.columns, f"Column '{column}' does not exist in the dataset."
+        
+        # factorize every column (and the strata) only once
+        with profiling.phase("factorize"):
+            codes = {column: contingency.factorize(self.data[column]) for column in columns}
+            if by is None:
+                strata, strata_levels = np.zeros(len(self.data), dtype=np.intp), [None]
+            else:
+                strata, strata_levels = contingency.factorize(self.data[by])
+        
+        tables = []
+        with profiling.phase("count"):
+            for column1, column2 in pairs:
+                codes1, levels1 = codes[column1]
+                codes2, levels2 = codes[column2]
+                tables.extend(contingency.stratified_counts(codes1, len(levels1), codes2, len(levels2),
+                                                            strata, len(strata_levels)))
+        
+        with profiling.phase("statistics"):
+            chi2, dof, n, min_dim = contingency.chi2_statistics(contingency.stack_tables(tables))
+            p = contingency.chi2_pvalues(chi2, dof)
+            p_adjusted = contingency.adjust_pvalues(p, correction)
+        
+        result = pd.DataFrame({"column1": np.repeat([pair[0] for pair in pairs], len(strata_levels)),
+                               "column2": np.repeat([pair[1] for pair in pairs], len(strata_levels))})
+        if by is not None:
+            result[by] = np.tile(np.asarray(strata_levels, dtype=object), len(pairs))
+        result["n"] = n.astype("int64")
+        result["chi2"] = chi2
+        result["dof"] = dof
+        result["p"] = p
+        result["p_adjusted"] = p_adjusted
+        result["v"] = contingency.cramers_v_values(chi2, n, min_dim)
+        result["significant"] = p_adjusted < alpha
+        
+        logger.info("%d of %d chi-square tests are significant (alpha = %s, correction = %s)",
+                    int(result["significant"].sum()), len(result), alpha, correction)
+        return result
+    
+    
+    
+    def categorical_columns(self, max_levels: int = 50):
+        """Returns the columns that can be used as categorical variables.
+        
+        
+        Parameters
+        ----------
+        max_levels: int
+            Integer columns with at most this many distinct values are
+            treated as categorical variables (e.g. 'pclass', 'survived').
+        
+        
+        Returns
+        -------
+        list
+            The names of all string, categorical and boolean columns and the
+            integer columns with few distinct values.
+        
+        """
+        self._require_pandas("categorical_columns")
+        columns = []
+        for name, dtype in self.data.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype) or dtype == object or dtype == bool:
+                columns.append(name)
+            elif pd.api.types.is_integer_dtype(dtype) and self.data[name].nunique() <= max_levels:
+                columns.append(name)
+        return columns
+    
+    
+    
+    @profiled
+    def association_matrix(self, columns: list = None, n_jobs: int = 1, tidy: bool = True):
+        """Does a Chi-Square test for every pair of categorical columns.
+        
+        Every column is factorized to integer codes only once, the contingency
+        tables of all pairs are counted from these codes and the statistics
+        of all tables are computed together.
+        
+        
+        Parameters
+        ----------
+        columns: list
+            The names of the columns to analyze. Defaults to all columns
+            returned by 'categorical_columns'.
+        n_jobs: int
+            The number of worker processes that count the contingency tables.
+            With 1 (default) everything runs in the current process, -1 uses
+            one process per cpu core.
+        tidy: bool
+            Whether the result is returned as one row per pair of columns (default)
+            or as square matrices.
+        
+        
+        Returns
+        -------
+        pandas.DataFrame
+            If tidy is True: a DataFrame with one row per pair of columns and
+            the columns 'column1', 'column2', 'chi2', 'dof', 'p' and 'v'.
+        dict
+            If tidy is False: a dictionary with the keys 'chi2', 'p' and 'v',
+            each value is a symmetric DataFrame with the columns as index and
+            columns.
+        
+        
+        Notes
+        -----
+        The statistics are identical to the ones of 'chi_square_test'
+        (including Yates' correction for 2x2 tables), but nothing is logged per pair.
+        Rows with a missing value in one of the two columns are ignored.
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        analyzer.association_matrix(["pclass", "survived", "sex"])
+        
+        Output:
+            column1   column2        chi2  dof             p         v
+        0    pclass  survived  102.888989    2  4.549252e-23  0.339817
+        1    pclass       sex   16.971499    2  2.063886e-04  0.138013
+        2  survived       sex  260.717020    1  1.197357e-58  0.540936
+        
+        """
+        self._require_pandas("association_matrix")
+        if columns is None:
+            columns = self.categorical_columns()
+        # check if the passed columns exist in the dataset
+        for column in columns:
+            assert column in self.data.columns, f"Column '{column}' does not exist in the dataset."
+        assert len(columns) >= 2, "At least two columns are needed."
+        
+        # factorize every column only once
+        codes = []
+        with profiling.phase("factorize"):
+            for column in columns:
+                column_codes, levels = contingency.factorize(self.data[column])
+                codes.append((column_codes, len(levels)))
+        
+        # count the contingency tables of all pairs (i, j) with i < j
+        with profiling.phase("count"):
+            if n_jobs == 1:
+                _init_association_worker(codes)
+                tables = [_association_tables(i) for i in range(len(columns) - 1)]
+                _init_association_worker(None)
+            else:
+                with ProcessPoolExecutor(max_workers=None if n_jobs == -1 else n_jobs,
+                                         initializer=_init_association_worker, initargs=(codes,)) as pool:
+                    tables = list(pool.map(_association_tables, range(len(columns) - 1)))
+        
+        # stack all tables padded to the same shape and compute all statistics at once
+        pairs = [(i, j) for i in range(len(columns)) for j in range(i + 1, len(columns))]
+        flat_tables = [table for row in tables for table in row]
+        with profiling.phase("statistics"):
+            chi2, dof, n, min_dim = contingency.chi2_statistics(contingency.stack_tables(flat_tables))
+            p = contingency.chi2_pvalues(chi2, dof)
+            v = contingency.cramers_v_values(chi2, n, min_dim)
+        
+        result = pd.DataFrame({"column1": [columns[i] for i, j in pairs],
+                               "column2": [columns[j] for i, j in pairs],
+                               "chi2": chi2, "dof": dof, "p": p, "v": v})
+        if tidy:
+            return result
+        
+        # mirror the pairs to get symmetric matrices (the diagonal stays empty)
+        mirrored = result.rename(columns={"column1": "column2", "column2": "column1"})
+        both = pd.concat([result, mirrored], ignore_index=True)
+        return {statistic: both.pivot(index="column1", columns="column2", values=statistic)
+                               .reindex(index=columns, columns=columns)
+                for statistic in ("chi2", "p", "v")}
+    
+    
+    
     def ccf_categorization_mean(self):
         """City-Class-Fare_categorization_mean computes the avergage
         ticket price paid per class for every embarked town
@@ -258,12 +957,8 @@ class Analyzer:
         
         """
 
-        # Group the data by 'embark_town' and 'pclass', then select the 'fare' column for aggregation.
-        grouped = self.data.groupby(["embark_town", "pclass"])["fare"]
-        # Calculate statistics (mean, min, max, count) for each group and reset the index to flatten the DataFrame.
-        grouped_stats = grouped.agg(["mean", "min", "max", "count"]).reset_index()
-        # Pivot the table to have 'embark_town' as the index and 'pclass' as the columns, using the mean fare as values.
-        pivot_table_mean = grouped_stats.pivot(index='embark_town', columns='pclass', values='mean')
+        # Pivot the (cached) fare statistics per embark town and class, using the mean fare as values.
+        pivot_table_mean = self.ccf_categorization("mean")
         # Return the pivot table of mean fares.
         return pivot_table_mean
     
@@ -298,17 +993,70 @@ class Analyzer:
         
         """
 
-        # Group the data by 'embark_town' and 'pclass', then select the 'fare' column for aggregation.
-        grouped = self.data.groupby(["embark_town", "pclass"])["fare"]
-        # Calculate statistics (mean, min, max, count) for each group and reset the index to flatten the DataFrame.
-        grouped_stats = grouped.agg(["mean", "min", "max", "count"]).reset_index()
-        # Pivot the table to have 'embark_town' as the index and 'pclass' as the columns,
+        # Pivot the (cached) fare statistics per embark town and class,
         # using the count function to display passenger count.
-        pivot_table_count = grouped_stats.pivot(index='embark_town', columns='pclass', values = 'count')
+        pivot_table_count = self.ccf_categorization("count")
         return pivot_table_count
     
+    
+    @profiled
+    def ccf_categorization(self, statistic: str = "mean"):
+        """City-Class-Fare_categorization computes any statistic of the ticket
+        price per class for every embarked town.
+        
+        All statistics come from one cached aggregation (see 'aggregate'),
+        so e.g. the mean and the count pivot share a single group-by pass.
+        
+        
+        Parameters
+        ----------
+        statistic: str
+            The statistic of the fares, e.g. "mean", "min", "max", "count"
+            or "median".
+        
+        
+        Returns
+        -------
+        pandas.DataFrame
+            pivot-table which includes
+                - the three embarked towns as rows (Cherbourg, Queenstown, Southampton)
+                - the three classes as columns (1st, 2nd, 3rd)
+                - the statistic of the ticket price (fare) for every
+                  passenger class by embarked towns as values
+        
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        analyzer.ccf_categorization("median")
+        
+        Output:
+        pclass              1      2       3
+        embark_town
+        Cherbourg    78.2667  24.00  7.8958
+        Queenstown   90.0000  12.35  7.7500
+        Southampton  52.0000  13.50  8.0500
+        
+        """
+        if self._incremental and statistic in MERGEABLE_AGGREGATIONS:
+            # the fare moments per group are maintained by 'append'
+            fares = self._maintained(
+                ("groups", ("embark_town", "pclass"), "fare"),
+                lambda data: GroupMoments.from_frame(data, ["embark_town", "pclass"], "fare"),
+                lambda state, rows: state.update(rows, ["embark_town", "pclass"], "fare"))
+            return fares.statistic(statistic).rename(statistic).unstack("pclass")
+        
+        # Calculate the statistics for each group once, later calls are served from the cache.
+        grouped_stats = self.aggregate(["embark_town", "pclass"], "fare", (statistic,)).reset_index()
+        # Pivot the table to have 'embark_town' as the index and 'pclass' as the columns.
+        with profiling.phase("pivot"):
+            return grouped_stats.pivot(index='embark_town', columns='pclass', values=statistic)
+    
 
-    def survival_rate(self, group_by_column: str):
+    @profiled
+    def survival_rate(self, group_by_column: str, ci: float = None, method: str = "wilson",
+                      resamples: int = 10_000, seed: int = 0, n_jobs: int = 1):
         """Computes survival rates grouped by a categorical variable.
         
         
@@ -317,6 +1065,19 @@ class Analyzer:
         group_by_column: str
             The name of the column used to group survival rates.
             This should be a categorical variable.
+        ci: float, optional
+            The confidence level in percent (e.g. 95) of intervals around
+            the survival rates. Without it only the rates are returned.
+        method: str
+            "wilson" (the analytic Wilson score interval) or "bootstrap"
+            (percentile intervals of resampled rates, see mypackage.intervals).
+            Both only need the number of passengers and survivors per group.
+        resamples: int
+            The number of bootstrap resamples.
+        seed: int
+            The seed of the bootstrap, the same seed gives the same intervals.
+        n_jobs: int
+            The number of processes for the bootstrap (-1 = all cores).
             
             
         Returns
@@ -324,6 +1085,8 @@ class Analyzer:
         pandas.Series
             A Series containing the survival rates for each category of the
             categorical variable.
+        pandas.DataFrame
+            With 'ci': the columns 'survived' (the rates), 'lower' and 'upper'.
             
         
         Examples
@@ -347,15 +1110,418 @@ class Analyzer:
         2    0.472826
         3    0.242363
         Name: survived, dtype: float64
+        
+        analyzer.survival_rate("pclass", ci = 95, method = "bootstrap")
+        
+        Output:
+                survived     lower     upper
+        pclass                              
+        1       0.629630  0.565217  0.693024
+        2       0.472826  0.402009  0.546022
+        3       0.242363  0.204819  0.280488
             
         """
         # check if the column used to group the survival rates exists in the dataset
-        assert group_by_column in self.data.columns, f"Column '{group_by_column}' does not exist in the dataset."
+        assert group_by_column in self.columns, f"Column '{group_by_column}' does not exist in the dataset."
+        
+        if ci is not None:
+            return _survival_intervals(self._survival_counts(group_by_column), ci, method, resamples, seed, n_jobs)
+        
+        if self._incremental:
+            # the survivor counts and group sizes are maintained by 'append'
+            survived = self._maintained(
+                ("survival", group_by_column),
+                lambda data: GroupMoments.from_frame(data, group_by_column, "survived"),
+                lambda state, rows: state.update(rows, group_by_column, "survived"))
+            return survived.statistic("mean").rename("survived")
         
         # Calculate the survival rates by grouping the data by "survived".
-        survival_rates = self.data.groupby(group_by_column)["survived"].mean()
-        return survival_rates
-
-
+        with profiling.phase("groupby"):
+            survival_rates = self._backend.aggregate(self.data, [group_by_column], "survived", ["mean"])["mean"]
+        return survival_rates.rename("survived")
+    
+    
+    
+    def _survival_counts(self, group_by_column: str):
+        """Returns the number of survivors ('sum') and of passengers ('count') per group."""
+        if self._incremental:
+            survived = self._maintained(
+                ("survival", group_by_column),
+                lambda data: GroupMoments.from_frame(data, group_by_column, "survived"),
+                lambda state, rows: state.update(rows, group_by_column, "survived"))
+            count = survived.statistic("count")
+            return pd.DataFrame({"sum": survived.statistic("sum").round().astype("int64"), "count": count})
+        with profiling.phase("groupby"):
+            return self._backend.aggregate(self.data, [group_by_column], "survived", ["sum", "count"])
+    
+    
+    
+    @profiled
+    def survival_cube(self, dimensions: tuple = CUBE_DIMENSIONS):
+        """Returns the survival cube of some categorical columns (see mypackage.cube).
+        
+        The survivors and passengers of every combination of the dimensions are
+        counted in one pass over the dataset, all group-bys over subsets of the
+        dimensions (e.g. the survival rate per class and sex, or per town) are
+        then rolled up from these few cells. The cube is kept up to date by 'append'.
+        
+        
+        Parameters
+        ----------
+        dimensions: tuple
+            The names of the categorical columns.
+            
+            
+        Returns
+        -------
+        SurvivalCube
+            The cube with 'rollup', 'survival_rate', 'pivot', 'rollups' and 'save'.
+            
+        
+        Examples
+        --------
+        cube = analyzer.survival_cube()
+        
+        cube.survival_rate(["pclass", "sex"])
+        
+        cube.pivot("who", "embark_town")
+        
+        Output:
+        embark_town  Cherbourg  Queenstown  Southampton       All
+        who                                                      
+        child         0.777778    0.200000     0.566667  0.590361
+        man           0.288889    0.081081     0.143902  0.163873
+        woman         0.883333    0.742857     0.712644  0.756458
+        All           0.553571    0.389610     0.336957  0.383838
+        
+        """
+        self._require_pandas("survival_cube")
+        dimensions = tuple(dimensions)
+        # check if the dimensions exist in the dataset
+        for column in dimensions:
+            assert column in self.columns, f"Column '{column}' does not exist in the dataset."
+        return self._maintained(
+            ("cube", dimensions),
+            lambda data: SurvivalCube.from_frame(data, dimensions, "survived"),
+            lambda state, rows: state.update(rows))
+    
+    
+    
+    @profiled
+    def report(self, spec: dict = None):
+        """Computes many results of the dataset together (see mypackage.report).
+    
+        Instead of one scan per method call, all outputs of the spec are planned
+        together: every key column is factorized once, all group-bys with the
+        same keys are computed in one pass over shared integer codes and all
+        contingency tables are counted from the same codes.
+    
+    
+        Parameters
+        ----------
+        spec: dict
+            The outputs, any of the keys
+            'stats': the columns of 'get_stats' (or "all"),
+            'survival_rate': the group columns of 'survival_rate',
+            'ccf': the statistics of 'ccf_categorization' (e.g. ["mean", "count"]),
+            'aggregate': (group columns, column, statistics) of 'aggregate',
+            'chi_square': the pairs of columns of 'chi_square_test'.
+            Without a spec the standard report is computed: the statistics of
+            all columns, the survival rates of pclass, sex, who, embark_town
+            and alone, both ccf pivots and the Chi-Square tests of all pairs
+            of survived, pclass, sex, who, embark_town and alone.
+    
+    
+        Returns
+        -------
+        Report
+            The results in the attributes 'stats', 'survival_rates', 'ccf',
+            'aggregates' and 'chi_square'.
+    
+    
+        Notes
+        -----
+        The results are the ones of the single methods, the Chi-Square tests
+        are returned as one table (like 'chi_square_tests') and nothing is
+        printed. Sums, means and standard deviations of float columns can
+        differ from pandas in the last digits.
+    
+    
+        Examples
+        --------
+        analyzer = Analyzer(data)
+    
+        report = analyzer.report()
+        report.survival_rates["who"]
+    
+        analyzer.report({"survival_rate": ["who", "sex"], "chi_square": [("sex", "survived")]})
+    
+        """
+        self._require_pandas("report")
+        return compute_report(self.data, spec)
+    
+    
+    
+    def bitmap_index(self, column: str):
+        """Returns the bitmap index of a categorical column (see mypackage.bitmap).
+        
+        The index is built on first use and kept until the dataset changes.
+        It holds one bitmap per level, so it is meant for columns with few
+        levels like sex, who, pclass, embark_town, alone or survived.
+        
+        """
+        self._require_pandas("bitmap_index")
+        # check if the column exists in the dataset
+        assert column in self.columns, f"Column '{column}' does not exist in the dataset."
+        profiling.cache_access("bitmaps", column in self._bitmaps)
+        if column not in self._bitmaps:
+            with profiling.phase("bitmap index"):
+                self._bitmaps[column] = BitmapIndex.from_series(self.data[column])
+        return self._bitmaps[column]
+    
+    
+    
+    def where(self, **conditions):
+        """Selects rows by the values of categorical columns, without copying the dataset.
+        
+        Every condition is the bitmap of a column's values (one value, or a
+        list of values combined with OR), the conditions are combined with AND.
+        Views can be combined with & and | (e.g. to OR conditions of different
+        columns) and refined with another 'where'.
+        
+        
+        Parameters
+        ----------
+        conditions: value or list
+            The selected values per column, e.g. sex = "female" or
+            embark_town = ["Cherbourg", "Queenstown"].
+            
+            
+        Returns
+        -------
+        AnalyzerView
+            A view with 'survival_rate', 'get_stats', 'chi_square_test',
+            'aggregate' and the ccf pivots, computed on the selected rows.
+            
+        
+        Examples
+        --------
+        analyzer = Analyzer(data)
+        
+        view = analyzer.where(sex = "female", pclass = 3, embark_town = "Southampton")
+        
+        view.survival_rate("alone")
+        
+        Output:
+        alone
+        False    0.327586
+        True     0.466667
+        Name: survived, dtype: float64
+        
+        (analyzer.where(who = "child") | analyzer.where(pclass = 1)).get_stats("fare")
+        
+        """
+        return AnalyzerView(self, Bitmap.full(self.n_rows)).where(**conditions)
 # %%
-analyzer = Analyzer(data)
+class AnalyzerView:
+    """A subset of the rows of an Analyzer's dataset, selected with bitmap indexes.
+    
+    The methods of the view work like the Analyzer methods of the same name,
+    but only on the selected rows. Counts (survival rates, contingency tables,
+    summaries of categorical columns) are popcounts of ANDed bitmaps, numerical
+    columns are only gathered at the selected positions. A view belongs to the
+    dataset it was created from, it can't be used after 'append'.
+    
+    
+    Attributes
+    ----------
+    analyzer: Analyzer
+        The Analyzer of the full dataset.
+    bitmap: Bitmap
+        The selected rows.
+    n_rows: int
+        The number of selected rows.
+    
+    """
+    
+    
+    def __init__(self, analyzer: Analyzer, bitmap: Bitmap):
+        self.analyzer = analyzer
+        self.bitmap = bitmap
+    
+    
+    @property
+    def n_rows(self):
+        return self.bitmap.count()
+    
+    
+    def _combine(self, other, bitmap):
+        # check if both views select rows of the same dataset
+        assert isinstance(other, AnalyzerView) and other.analyzer is self.analyzer, \
+            "Only views of the same Analyzer can be combined."
+        return AnalyzerView(self.analyzer, bitmap)
+    
+    
+    def __and__(self, other):
+        return self._combine(other, self.bitmap & other.bitmap)
+    
+    
+    def __or__(self, other):
+        return self._combine(other, self.bitmap | other.bitmap)
+    
+    
+    def __invert__(self):
+        return AnalyzerView(self.analyzer, ~self.bitmap)
+    
+    
+    def _index(self, column: str):
+        """Returns the bitmap index of a column of the dataset the view belongs to."""
+        # check if the dataset is still the one the view was created from
+        assert self.bitmap.n_rows == self.analyzer.n_rows, "The dataset has changed since the view was created."
+        return self.analyzer.bitmap_index(column)
+    
+    
+    
+    def where(self, **conditions):
+        """Selects the rows of the view that also match the conditions (see 'Analyzer.where')."""
+        bitmap = self.bitmap
+        with profiling.phase("bitmaps"):
+            for column, values in conditions.items():
+                bitmap = bitmap & self._index(column).lookup(values)
+        return AnalyzerView(self.analyzer, bitmap)
+    
+    
+    
+    def to_frame(self):
+        """Returns the selected rows as a DataFrame (a copy)."""
+        return self.analyzer.data.iloc[self.bitmap.positions()]
+    
+    
+    
+    @profiled
+    def survival_rate(self, group_by_column: str, ci: float = None, method: str = "wilson",
+                      resamples: int = 10_000, seed: int = 0, n_jobs: int = 1):
+        """Computes the survival rates of the selected rows, see 'Analyzer.survival_rate'."""
+        counts = self._survival_counts(group_by_column)
+        if ci is not None:
+            return _survival_intervals(counts, ci, method, resamples, seed, n_jobs)
+        return (counts["sum"] / counts["count"]).rename("survived")
+    
+    
+    def _survival_counts(self, group_by_column: str):
+        """Returns the number of survivors ('sum') and of passengers ('count') per group."""
+        groups = self._index(group_by_column)
+        survived = self._index("survived")
+        with profiling.phase("bitmaps"):
+            known = self.bitmap & ~survived.missing
+            survivors = self.bitmap & survived.lookup(1)
+            counts = pd.DataFrame({"sum": groups.counts(survivors), "count": groups.counts(known)})
+            # like the groupby, levels without selected rows are left out
+            counts = counts[groups.counts(self.bitmap) > 0]
+        counts.index.name = group_by_column
+        return counts
+    
+    
+    
+    @profiled
+    def get_stats(self, column: str, approx: bool = False, relative_accuracy: float = 0.01):
+        """Provides statistical summaries of a column on the selected rows, see 'Analyzer.get_stats'.
+        
+        The summary of a categorical column comes from its bitmap index,
+        a numerical column is gathered at the selected positions.
+        
+        """
+        # check if the passed column exists in the dataset
+        assert column in self.analyzer.columns, f"Column '{column}' does not exist in the dataset."
+        
+        dtype = self.analyzer.data[column].dtype
+        if pd.api.types.is_numeric_dtype(dtype) and dtype != bool:
+            with profiling.phase("gather"):
+                values = self.analyzer.data[column].to_numpy(dtype=float, na_value=np.nan)[self.bitmap.positions()]
+            if approx:
+                with profiling.phase("sketch"):
+                    return describe_approximate(values, relative_accuracy, name=column)
+            with profiling.phase("describe"):
+                return pd.Series(values, name=column).describe()
+        
+        index = self._index(column)
+        with profiling.phase("bitmaps"):
+            counts = index.counts(self.bitmap)
+        counts = counts[counts > 0]
+        # the same statistics as pandas' describe of a categorical column
+        top = counts.idxmax() if len(counts) else np.nan
+        return pd.Series([counts.sum(), len(counts), top, counts.max() if len(counts) else np.nan],
+                         index=["count", "unique", "top", "freq"], name=column, dtype=object)
+    
+    
+    
+    @profiled
+    def chi_square_test(self, column1: str, column2: str, alpha: float = 0.05, method: str = "asymptotic",
+                        permutations: int = 10_000, seed: int = 0, n_jobs: int = 1):
+        """Does a Chi-Square test on the selected rows, see 'Analyzer.chi_square_test'.
+        
+        The contingency table is counted from the bitmap indexes of both columns.
+        
+        """
+        index1, index2 = self._index(column1), self._index(column2)
+        with profiling.phase("bitmaps"):
+            table = pd.DataFrame([index2.counts(self.bitmap & bitmap).to_numpy() for bitmap in index1.bitmaps],
+                                 index=index1.levels.rename(column1), columns=index2.levels.rename(column2))
+            # like pd.crosstab, only the values that occur in the selected rows
+            table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        return self.analyzer._test_table(table, column1, column2, alpha, method, permutations, seed, n_jobs)
+    
+    
+    
+    @profiled
+    def aggregate(self, group_by: list, column: str, statistics: tuple = DEFAULT_AGGREGATIONS):
+        """Computes statistics of a column for every group of the selected rows, see 'Analyzer.aggregate'.
+        
+        The groups are ANDed bitmaps of the group columns, only the values of
+        'column' in non-empty groups are gathered.
+        
+        """
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        statistics = [statistics] if isinstance(statistics, str) else list(statistics)
+        # check if the passed column exists in the dataset
+        assert column in self.analyzer.columns, f"Column '{column}' does not exist in the dataset."
+        
+        with profiling.phase("bitmaps"):
+            # the level positions of every group and its rows
+            cells = [((), self.bitmap)]
+            for name in group_by:
+                index = self._index(name)
+                cells = [(keys + (position,), cell & bitmap) for keys, cell in cells
+                         for position, bitmap in enumerate(index.bitmaps)]
+                # empty groups are left out, like in a groupby with observed = True
+                cells = [(keys, cell) for keys, cell in cells if cell.count() > 0]
+        series = self.analyzer.data[column]
+        with profiling.phase("aggregate"):
+            rows = [series.iloc[cell.positions()].agg(statistics) for _, cell in cells]
+        # the group keys keep the dtypes of the columns (e.g. categorical)
+        keys = np.array([keys for keys, _ in cells], dtype=np.int64).reshape(len(cells), len(group_by))
+        arrays = [self._index(name).levels.take(keys[:, i]).rename(name) for i, name in enumerate(group_by)]
+        index = arrays[0] if len(group_by) == 1 else pd.MultiIndex.from_arrays(arrays)
+        table = pd.DataFrame(rows, index=index, columns=statistics)
+        # the statistics of a group are one Series, the counts are converted back to integers
+        return table.astype({name: np.int64 for name in statistics if name in ("count", "size", "nunique")})
+    
+    
+    
+    def ccf_categorization_mean(self):
+        """The mean fare per class for every embarked town of the selected rows, see 'Analyzer.ccf_categorization_mean'."""
+        return self.ccf_categorization("mean")
+    
+    
+    def ccf_categorization_count(self):
+        """The passenger count per class for every embarked town of the selected rows, see 'Analyzer.ccf_categorization_count'."""
+        return self.ccf_categorization("count")
+    
+    
+    @profiled
+    def ccf_categorization(self, statistic: str = "mean"):
+        """Any statistic of the fare per class for every embarked town of the selected rows, see 'Analyzer.ccf_categorization'."""
+        grouped_stats = self.aggregate(["embark_town", "pclass"], "fare", (statistic,)).reset_index()
+        with profiling.phase("pivot"):
+            return grouped_stats.pivot(index='embark_town', columns='pclass', values=statistic)
+
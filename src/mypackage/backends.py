@@ -0,0 +1,342 @@
+# %%
+import pandas as pd
+import numpy as np
+import sys
+from abc import ABC, abstractmethod
+from mypackage import contingency
+from mypackage.report import FUSED_STATISTICS, describe_counts, describe_levels, group_codes, group_index, \
+    group_statistics
+# %%
+# The operations of the Analyzer that scan the rows of the dataset (describe,
+# group-by aggregations and crosstabs) run on a backend, so a dataset doesn't
+# have to be converted to pandas first:
+#   "pandas": a pandas DataFrame (describe, groupby and crosstab of pandas),
+#   "numpy":  a dict of 1-D numpy arrays (factorized codes and np.bincount),
+#   "arrow":  a pyarrow Table (the multithreaded group-by and aggregation
+#             kernels of pyarrow.compute, pyarrow is imported on demand).
+# Every backend returns pandas objects (the results are small) with the same
+# values, the index and the columns of a result don't depend on the backend.
+# %%
+# the index of the 'describe' of a numerical column
+DESCRIBE_INDEX = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+# the hash aggregations of pyarrow.compute per statistic of 'aggregate' (std and var with ddof = 1),
+# the median is exact on the other backends, so it is computed from the codes instead of
+# pyarrow's approximate median
+ARROW_AGGREGATIONS = {"count": "count", "sum": "sum", "mean": "mean", "min": "min", "max": "max",
+                      "std": "stddev", "var": "variance"}
+# %%
+class Backend(ABC):
+    """The operations of the Analyzer that scan the rows of a dataset.
+
+    Every backend implements all abstract methods for its kind of dataset.
+
+
+    Attributes
+    ----------
+    name: str
+        The name of the backend ("pandas", "numpy" or "arrow").
+
+    """
+
+    name = None
+
+
+    @abstractmethod
+    def columns(self, data):
+        """Returns the column names of a dataset as a pandas.Index."""
+
+
+    @abstractmethod
+    def n_rows(self, data):
+        """Returns the number of rows of a dataset."""
+
+
+    @abstractmethod
+    def is_numeric(self, data, column: str):
+        """Whether a column is numerical (booleans are not)."""
+
+
+    @abstractmethod
+    def values(self, data, column: str):
+        """Returns a numerical column as a float array, missing values are NaN."""
+
+
+    @abstractmethod
+    def describe(self, data, column: str):
+        """Returns the statistical summary of a column like pandas' describe."""
+
+
+    @abstractmethod
+    def aggregate(self, data, keys: list, column: str, statistics: list):
+        """Computes statistics of a column per group.
+
+        Returns a DataFrame with one row per observed group (sorted, rows with
+        a missing key are ignored) and one column per statistic, like
+        data.groupby(keys, observed=True)[column].agg(statistics).
+
+        """
+
+
+    @abstractmethod
+    def crosstab(self, data, column1: str, column2: str):
+        """Returns the contingency table of two columns like pd.crosstab."""
+
+
+
+class PandasBackend(Backend):
+    """The operations on a pandas DataFrame."""
+
+    name = "pandas"
+
+
+    def columns(self, data):
+        return data.columns
+
+
+    def n_rows(self, data):
+        return len(data)
+
+
+    def is_numeric(self, data, column: str):
+        dtype = data[column].dtype
+        return pd.api.types.is_numeric_dtype(dtype) and dtype != bool
+
+
+    def values(self, data, column: str):
+        return data[column].to_numpy(dtype=float, na_value=np.nan)
+
+
+    def describe(self, data, column: str):
+        return data[column].describe()
+
+
+    def aggregate(self, data, keys: list, column: str, statistics: list):
+        return data.groupby(list(keys), observed=True)[column].agg(list(statistics))
+
+
+    def crosstab(self, data, column1: str, column2: str):
+        return pd.crosstab(data[column1], data[column2])
+
+
+
+class NumpyBackend(Backend):
+    """The operations on a dict of 1-D numpy arrays (one per column).
+
+    Every key column is factorized to integer codes, the group statistics
+    are computed with np.bincount over the codes (see mypackage.report),
+    'aggregate' supports count, sum, mean, std, var, min, max and median.
+
+    """
+
+    name = "numpy"
+
+
+    def columns(self, data):
+        return pd.Index(list(data))
+
+
+    def n_rows(self, data):
+        return len(next(iter(data.values()))) if data else 0
+
+
+    def is_numeric(self, data, column: str):
+        return data[column].dtype.kind in "iuf"
+
+
+    def values(self, data, column: str):
+        return np.asarray(data[column], dtype=float)
+
+
+    def _factorize(self, values):
+        codes, levels = contingency.factorize(values)
+        return codes, pd.Index(levels)
+
+
+    def describe(self, data, column: str):
+        values = data[column]
+        summary = None
+        if values.dtype.kind == "f":
+            present = values[~np.isnan(values)]
+            if present.size:
+                summary = pd.Series([present.size, present.mean(),
+                                     present.std(ddof=1) if present.size > 1 else np.nan, present.min(),
+                                     *np.percentile(present, [25, 50, 75]), present.max()],
+                                    index=DESCRIBE_INDEX, name=column)
+        else:
+            # integers and categorical columns are summarized from the number of rows per value
+            codes, levels = self._factorize(values)
+            counts = np.bincount(codes[codes >= 0], minlength=len(levels))
+            summary = (describe_levels if values.dtype.kind in "iu" else describe_counts)(levels, counts, column)
+        if summary is None:
+            # no values, or several most frequent values (pandas picks one of them by the order of its sort)
+            summary = pd.Series(values, name=column, copy=False).describe()
+        return summary
+
+
+    def aggregate(self, data, keys: list, column: str, statistics: list):
+        # check if the statistics can be computed from the codes
+        unknown = [statistic for statistic in statistics if statistic not in FUSED_STATISTICS]
+        assert not unknown, f"The numpy backend computes the statistics {FUSED_STATISTICS}, not {unknown}."
+        codes = [self._factorize(data[key]) for key in keys]
+        valid, groups, cells = group_codes([key_codes for key_codes, _ in codes], [len(levels) for _, levels in codes])
+        index = group_index(keys, [levels for _, levels in codes], cells)
+        return pd.DataFrame(group_statistics(np.asarray(data[column])[valid], groups, len(index), tuple(statistics)),
+                            index=index)
+
+
+    def crosstab(self, data, column1: str, column2: str):
+        codes1, levels1 = self._factorize(data[column1])
+        codes2, levels2 = self._factorize(data[column2])
+        table = contingency.contingency_counts(codes1, len(levels1), codes2, len(levels2))
+        # like pd.crosstab, values that only occur next to a missing value of the other column are left out
+        rows, columns = table.sum(axis=1) > 0, table.sum(axis=0) > 0
+        return pd.DataFrame(table[rows][:, columns], index=levels1[rows].rename(column1),
+                            columns=levels2[columns].rename(column2))
+
+
+
+class ArrowBackend(Backend):
+    """The operations on a pyarrow Table.
+
+    The group-bys run on the hash aggregation kernels of pyarrow.compute,
+    which use all cores. Dictionary columns are decoded and NaN of float
+    columns is treated as a missing value (like pandas).
+
+    """
+
+    name = "arrow"
+
+
+    def columns(self, data):
+        return pd.Index(data.column_names)
+
+
+    def n_rows(self, data):
+        return data.num_rows
+
+
+    def _column(self, data, column: str):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        values = data[column]
+        if pa.types.is_dictionary(values.type):
+            values = values.cast(values.type.value_type)
+        if pa.types.is_floating(values.type):
+            values = pc.if_else(pc.is_nan(values), pa.scalar(None, values.type), values)
+        return values
+
+
+    def is_numeric(self, data, column: str):
+        import pyarrow as pa
+        dtype = data.schema.field(column).type
+        return pa.types.is_integer(dtype) or pa.types.is_floating(dtype)
+
+
+    def values(self, data, column: str):
+        import pyarrow as pa
+        return self._column(data, column).cast(pa.float64()).to_numpy()
+
+
+    def describe(self, data, column: str):
+        import pyarrow.compute as pc
+        values = self._column(data, column)
+        summary = None
+        if self.is_numeric(data, column):
+            count = pc.count(values).as_py()
+            if count:
+                extremes = pc.min_max(values)
+                summary = pd.Series([count, pc.mean(values).as_py(), pc.stddev(values, ddof=1).as_py(),
+                                     extremes["min"].as_py(),
+                                     *pc.quantile(values, q=[0.25, 0.5, 0.75], interpolation="linear").to_pylist(),
+                                     extremes["max"].as_py()], index=DESCRIBE_INDEX, dtype=float, name=column)
+        else:
+            counts = pc.value_counts(values)
+            present = pc.is_valid(counts.field("values"))
+            summary = describe_counts(pd.Index(counts.field("values").filter(present).to_pylist()),
+                                      counts.field("counts").filter(present).to_numpy(zero_copy_only=False), column)
+        if summary is None:
+            # no values, or several most frequent values (pandas picks one of them by the order of its sort)
+            summary = values.to_pandas().rename(column).describe()
+        return summary
+
+
+    def _keyed(self, data, keys: list, columns: list):
+        """The key and value columns of the rows without a missing key."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        table = pa.table({name: self._column(data, name) for name in dict.fromkeys(list(keys) + list(columns))})
+        valid = pc.is_valid(table[keys[0]])
+        for key in keys[1:]:
+            valid = pc.and_(valid, pc.is_valid(table[key]))
+        return table.filter(valid)
+
+
+    def aggregate(self, data, keys: list, column: str, statistics: list):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        keys = list(keys)
+        table = self._keyed(data, keys, [column])
+        threaded = [statistic for statistic in statistics if statistic in ARROW_AGGREGATIONS]
+        options = {"std": pc.VarianceOptions(ddof=1), "var": pc.VarianceOptions(ddof=1)}
+        result = table.group_by(keys).aggregate(
+            [(column, ARROW_AGGREGATIONS[statistic], options.get(statistic)) for statistic in threaded])
+        # the groups come in the order the threads found them
+        result = result.sort_by([(key, "ascending") for key in keys])
+        index = group_index(keys, [pd.Index(result[key].to_pylist()) for key in keys],
+                            [np.arange(result.num_rows)] * len(keys))
+        frame = pd.DataFrame({statistic: result[f"{column}_{ARROW_AGGREGATIONS[statistic]}"].to_numpy()
+                              for statistic in threaded}, index=index)
+        if "sum" in frame and pa.types.is_boolean(table[column].type):
+            # pyarrow sums booleans to uint64, pandas to int64
+            frame["sum"] = frame["sum"].astype(np.int64)
+        others = [statistic for statistic in statistics if statistic not in ARROW_AGGREGATIONS]
+        if others:
+            # e.g. the exact median, from the codes of the (already filtered) columns
+            arrays = {name: table[name].to_numpy() for name in table.column_names}
+            rest = NumpyBackend().aggregate(arrays, keys, column, others)
+            for statistic in others:
+                frame[statistic] = rest[statistic].to_numpy()
+        return frame[list(statistics)]
+
+
+    def crosstab(self, data, column1: str, column2: str):
+        import pyarrow as pa
+        table = self._keyed(data, [column1, column2], [])
+        table = table.append_column("rows", pa.array(np.ones(table.num_rows, dtype=np.int64)))
+        counts = table.group_by([column1, column2]).aggregate([("rows", "sum")])
+        # the small table of counts is pivoted by pandas (sorted like pd.crosstab)
+        counts = pd.DataFrame({column1: counts[column1].to_pylist(), column2: counts[column2].to_pylist(),
+                               "count": counts["rows_sum"].to_numpy()})
+        return counts.pivot(index=column1, columns=column2, values="count").fillna(0).astype(np.int64)
+# %%
+def get_backend(data):
+    """Returns the backend of a dataset.
+
+
+    Parameters
+    ----------
+    data: pandas.DataFrame, dict or pyarrow.Table
+        A DataFrame, a dict of 1-D numpy arrays of the same length (one per
+        column) or a pyarrow Table.
+
+
+    Returns
+    -------
+    Backend
+        The backend that computes on the dataset without converting it.
+
+    """
+    if isinstance(data, pd.DataFrame):
+        return PandasBackend()
+    if isinstance(data, dict):
+        # check if the dict holds columns of the same length
+        assert all(isinstance(values, np.ndarray) and values.ndim == 1 for values in data.values()), \
+            "The columns of a dict must be 1-D numpy arrays."
+        assert len({len(values) for values in data.values()}) <= 1, "The columns must have the same length."
+        return NumpyBackend()
+    # a Table can only exist if pyarrow has been imported
+    pyarrow = sys.modules.get("pyarrow")
+    assert pyarrow is not None and isinstance(data, pyarrow.Table), \
+        "Data must be a pandas DataFrame, a dict of numpy arrays or a pyarrow Table"
+    return ArrowBackend()
@@ -0,0 +1,144 @@
+# %%
+import pandas as pd
+import numpy as np
+from mypackage import contingency
+# %%
+# Bitmap indexes of categorical columns. Every level of a column has a bitmap with
+# one bit per row, packed 8 rows per byte (np.packbits). A filter like
+# "women in 3rd class from Southampton" is the AND of three bitmaps, and the number
+# of rows of a group inside the filter is a popcount of one more AND, so counts,
+# rates and contingency tables of a subset never touch the rows of the dataset.
+# %%
+class Bitmap:
+    """A set of rows of a dataset, stored as packed bits.
+
+
+    Attributes
+    ----------
+    bits: numpy.ndarray
+        The packed bits (uint8), bit i is set if row i is part of the set.
+    n_rows: int
+        The number of rows of the dataset.
+
+    """
+
+    __slots__ = ("bits", "n_rows")
+
+
+    def __init__(self, bits, n_rows: int):
+        self.bits = bits
+        self.n_rows = n_rows
+
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Packs a boolean mask with one element per row."""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask), mask.size)
+
+
+    @classmethod
+    def full(cls, n_rows: int):
+        """Returns the bitmap of all rows."""
+        return cls.from_mask(np.ones(n_rows, dtype=bool))
+
+
+    def _check(self, other):
+        # check if both bitmaps index the same rows
+        assert isinstance(other, Bitmap) and other.n_rows == self.n_rows, \
+            "Only bitmaps of the same dataset can be combined."
+
+
+    def __and__(self, other):
+        self._check(other)
+        return Bitmap(self.bits & other.bits, self.n_rows)
+
+
+    def __or__(self, other):
+        self._check(other)
+        return Bitmap(self.bits | other.bits, self.n_rows)
+
+
+    def __invert__(self):
+        bits = ~self.bits
+        if self.n_rows % 8:
+            # the padding bits of the last byte stay unset
+            bits[-1] &= np.uint8(0xFF << (8 - self.n_rows % 8) & 0xFF)
+        return Bitmap(bits, self.n_rows)
+
+
+    def count(self):
+        """Returns the number of rows in the set (a popcount of the bits)."""
+        return int(np.bitwise_count(self.bits).sum())
+
+
+    def to_mask(self):
+        """Returns the boolean mask with one element per row."""
+        return np.unpackbits(self.bits, count=self.n_rows).view(bool)
+
+
+    def positions(self):
+        """Returns the positions of the rows in the set."""
+        return np.flatnonzero(self.to_mask())
+
+
+
+class BitmapIndex:
+    """The bitmaps of all levels of a categorical column.
+
+
+    Attributes
+    ----------
+    levels: pandas.Index
+        The sorted distinct values of the column.
+    bitmaps: list
+        The Bitmap of every level.
+    missing: Bitmap
+        The rows with a missing value.
+
+    """
+
+
+    def __init__(self, levels, bitmaps: list, missing: Bitmap):
+        self.levels = levels
+        self.bitmaps = bitmaps
+        self.missing = missing
+
+
+    @classmethod
+    def from_series(cls, series):
+        """Builds the index of a column in one factorization and one comparison per level."""
+        codes, levels = contingency.factorize(series)
+        bitmaps = [Bitmap.from_mask(codes == code) for code in range(len(levels))]
+        return cls(levels, bitmaps, Bitmap.from_mask(codes == -1))
+
+
+    @property
+    def n_rows(self):
+        return self.missing.n_rows
+
+
+    def lookup(self, values):
+        """Returns the bitmap of the rows with any of the values.
+
+        A single value or a list of values (combined with OR). Values that
+        don't occur in the column select no rows, None or NaN selects the
+        missing values.
+
+        """
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        selected = Bitmap(np.zeros_like(self.missing.bits), self.n_rows)
+        for value in values:
+            if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+                selected = selected | self.missing
+                continue
+            position = self.levels.get_indexer([value])[0]
+            if position >= 0:
+                selected = selected | self.bitmaps[position]
+        return selected
+
+
+    def counts(self, within: Bitmap = None):
+        """Returns the number of rows of every level (inside of a bitmap) as a Series indexed by the levels."""
+        counts = [(bitmap if within is None else bitmap & within).count() for bitmap in self.bitmaps]
+        return pd.Series(counts, index=self.levels, dtype=np.int64)
@@ -0,0 +1,102 @@
+# %%
+import pandas as pd
+import numpy as np
+# %%
+# Compact dtypes for an in-memory dataset. Strings with few distinct values
+# become categoricals (integer codes plus one copy of every value), flags become
+# bool and integers get the smallest signed dtype that holds every value, so the
+# dataset needs less memory and group-bys work on small integer codes.
+# Floats keep their dtype: pandas reduces a float32 column in float32, so means
+# and standard deviations would change even if every value fits.
+# %%
+# the values of an object column that are read as a flag
+FLAG_VALUES = {True: True, False: False, "True": True, "False": False, "true": True, "false": False}
+# %%
+def compact_series(series: pd.Series, max_category_ratio: float = 0.5):
+    """Converts a column to the smallest dtype that keeps all of its values.
+
+
+    Parameters
+    ----------
+    series: pandas.Series
+        The column.
+    max_category_ratio: float
+        String columns are converted to categoricals if the number of distinct
+        values is at most this share of the number of values.
+
+
+    Returns
+    -------
+    pandas.Series
+        The compacted column (or the column itself if it can't be compacted).
+
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == bool:
+        return series
+
+    if dtype == object:
+        values = series.dropna()
+        # flags without missing values become bool
+        if len(values) == len(series) and values.map(lambda value: value in FLAG_VALUES).all():
+            return series.map(FLAG_VALUES).astype(bool)
+        if values.nunique() <= max_category_ratio * len(series):
+            return series.astype("category")
+        return series
+
+    if pd.api.types.is_integer_dtype(dtype):
+        # the integer dtypes are ordered from small to large, so the first one that fits is used,
+        # signed even for non-negative columns, differences of unsigned columns would wrap around
+        return pd.to_numeric(series, downcast="integer")
+    return series
+
+
+
+def compact(data: pd.DataFrame, max_category_ratio: float = 0.5):
+    """Converts every column of a dataset to its compact dtype (see 'compact_series').
+
+    The values don't change: the compacted dataset gives the same results
+    in every analysis, only the dtypes (and the memory) differ.
+
+    """
+    index = data.index
+    # consecutive integer labels (like those of read_csv) are stored as a RangeIndex without an array
+    if (pd.api.types.is_integer_dtype(index.dtype) and not isinstance(index, pd.RangeIndex)
+            and len(index) > 0 and index.equals(pd.RangeIndex(index[0], index[0] + len(index)))):
+        index = pd.RangeIndex(index[0], index[0] + len(index), name=index.name)
+    compacted = pd.DataFrame({name: compact_series(data[name], max_category_ratio) for name in data.columns})
+    compacted.index = index
+    return compacted
+
+
+
+def column_memory(data: pd.DataFrame):
+    """Returns the dtype and the bytes (including the Python strings of object columns)
+    of the index and of every column of a dataset."""
+    dtypes = pd.concat([pd.Series({"Index": data.index.dtype}), data.dtypes]).astype(str)
+    return pd.DataFrame({"dtype": dtypes, "bytes": data.memory_usage(deep=True)})
+
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame):
+    """Compares the memory of every column of two versions of a dataset.
+
+
+    Parameters
+    ----------
+    before, after: pandas.DataFrame
+        The result of 'column_memory' for the dataset before and after the compaction.
+
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per column (plus the index and the total) with the
+        dtypes and the bytes before and after and the ratio before / after.
+
+    """
+    report = before.join(after, lsuffix="_before", rsuffix="_after", how="outer").reindex(before.index)
+    report.loc["total"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    report = report.astype({"bytes_before": np.int64, "bytes_after": np.int64})
+    report["ratio"] = report["bytes_before"] / report["bytes_after"]
+    return report
@@ -0,0 +1,404 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+# %%
+# The functions in this module work on integer codes instead of the original values.
+# A column is factorized once and every contingency table that uses the column
+# is counted with np.bincount on the codes, which is much cheaper than
+# calling pd.crosstab for every pair of columns.
+# %%
+def factorize(values):
+    """Encodes the values of a column as integer codes.
+
+
+    Parameters
+    ----------
+    values: pandas.Series or array-like
+        The values of a (categorical) column.
+
+
+    Returns
+    -------
+    codes: numpy.ndarray
+        The integer code of every value, missing values get the code -1.
+    levels: pandas.Index
+        The sorted distinct values, levels[code] is the original value.
+
+    """
+    codes, levels = pd.factorize(values, sort=True)
+    return codes.astype(np.intp, copy=False), levels
+
+
+
+def contingency_counts(codes1, n_levels1: int, codes2, n_levels2: int):
+    """Counts how often every combination of two coded columns occurs.
+
+
+    Parameters
+    ----------
+    codes1, codes2: numpy.ndarray
+        The integer codes of the two columns (see 'factorize').
+        Rows where one of the codes is -1 (missing) are not counted.
+    n_levels1, n_levels2: int
+        The number of levels of the two columns.
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The contingency table with the shape (n_levels1, n_levels2).
+
+    """
+    valid = (codes1 >= 0) & (codes2 >= 0)
+    # every combination of the two codes gets its own position in a flat array
+    flat = codes1[valid] * n_levels2 + codes2[valid]
+    counts = np.bincount(flat, minlength=n_levels1 * n_levels2)
+    return counts.reshape(n_levels1, n_levels2)
+
+
+
+def stratified_counts(codes1, n_levels1: int, codes2, n_levels2: int, strata, n_strata: int):
+    """Counts one contingency table of two coded columns per stratum.
+
+
+    Parameters
+    ----------
+    codes1, n_levels1, codes2, n_levels2:
+        The codes and numbers of levels of the two columns (see 'contingency_counts').
+    strata: numpy.ndarray
+        The integer code of the stratum of every row (-1 = missing, not counted).
+    n_strata: int
+        The number of strata.
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The stacked contingency tables with the shape (n_strata, n_levels1, n_levels2).
+
+    """
+    valid = (codes1 >= 0) & (codes2 >= 0) & (strata >= 0)
+    flat = (strata[valid] * n_levels1 + codes1[valid]) * n_levels2 + codes2[valid]
+    counts = np.bincount(flat, minlength=n_strata * n_levels1 * n_levels2)
+    return counts.reshape(n_strata, n_levels1, n_levels2)
+
+
+
+def stack_tables(tables):
+    """Stacks contingency tables of different shapes by padding them with zeros.
+
+    The padded rows and columns are empty, so they don't change the
+    results of 'chi2_statistics'.
+
+    """
+    tables = [np.asarray(table) for table in tables]
+    n_rows = max(table.shape[-2] for table in tables)
+    n_cols = max(table.shape[-1] for table in tables)
+    stacked = np.zeros((len(tables), n_rows, n_cols))
+    for k, table in enumerate(tables):
+        stacked[k, :table.shape[-2], :table.shape[-1]] = table
+    return stacked
+
+
+
+def chi2_statistics(tables, correction: bool = True):
+    """Computes the Chi-Square statistics of one or many contingency tables.
+
+
+    Parameters
+    ----------
+    tables: numpy.ndarray
+        A contingency table with the shape (r, c) or a stack of tables with
+        the shape (..., r, c). Empty rows and columns are ignored, so tables
+        of different sizes can be stacked by padding them with zeros.
+    correction: bool
+        Whether Yates' continuity correction is applied to tables with
+        one degree of freedom (like scipy.stats.chi2_contingency does).
+
+
+    Returns
+    -------
+    chi2: numpy.ndarray
+        The Chi-Square statistics.
+    dof: numpy.ndarray
+        The degrees of freedom.
+    n: numpy.ndarray
+        The number of observations of every table.
+    min_dim: numpy.ndarray
+        The smaller dimension of every table minus one (used for Cramer's V).
+
+
+    Notes
+    -----
+    The results are identical to scipy.stats.chi2_contingency for tables
+    without empty rows or columns, but all tables are handled in a
+    few vectorized numpy operations.
+
+    """
+    observed = np.asarray(tables, dtype=float)
+    row_sums = observed.sum(axis=-1)
+    col_sums = observed.sum(axis=-2)
+    n = row_sums.sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = row_sums[..., :, None] * col_sums[..., None, :] / n[..., None, None]
+    expected = np.nan_to_num(expected)
+
+    n_rows = (row_sums > 0).sum(axis=-1)
+    n_cols = (col_sums > 0).sum(axis=-1)
+    dof = np.clip(n_rows - 1, 0, None) * np.clip(n_cols - 1, 0, None)
+
+    if correction:
+        # Yates' correction moves every observed value half a unit towards the expected value
+        diff = expected - observed
+        adjusted = observed + np.sign(diff) * np.minimum(0.5, np.abs(diff))
+        observed = np.where((dof == 1)[..., None, None], adjusted, observed)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+    chi2 = terms.sum(axis=(-2, -1))
+    min_dim = np.minimum(n_rows, n_cols) - 1
+    return chi2, dof, n, min_dim
+
+
+
+def chi2_pvalues(chi2, dof):
+    """Computes the p-values of Chi-Square statistics in one vectorized call.
+
+    Tables without any degree of freedom get the p-value 1 (no evidence
+    against independence), like scipy.stats.chi2_contingency.
+
+    """
+    from scipy.stats import chi2 as chi2_distribution
+    chi2 = np.asarray(chi2, dtype=float)
+    dof = np.asarray(dof)
+    with np.errstate(invalid="ignore"):
+        p = chi2_distribution.sf(chi2, np.maximum(dof, 1))
+    return np.where(dof > 0, p, 1.0)
+
+
+
+def cramers_v_values(chi2, n, min_dim):
+    """Computes Cramer's V for arrays of Chi-Square statistics.
+
+    Tables with only one row or column have no association, V is set to 0.
+
+    """
+    chi2 = np.asarray(chi2, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = np.sqrt(chi2 / (np.asarray(n) * np.asarray(min_dim)))
+    return np.where(np.asarray(min_dim) > 0, v, 0.0)
+
+
+
+def adjust_pvalues(p, method: str = "fdr_bh"):
+    """Corrects p-values for multiple testing.
+
+
+    Parameters
+    ----------
+    p: array-like
+        The p-values of all tests.
+    method: str
+        "bonferroni", "holm", "fdr_bh" (Benjamini-Hochberg) or None (no correction).
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The adjusted p-values (in the order of p, capped at 1).
+
+    """
+    p = np.asarray(p, dtype=float)
+    m = p.size
+    if method is None or m == 0:
+        return p.copy()
+    if method == "bonferroni":
+        return np.minimum(p * m, 1.0)
+
+    order = np.argsort(p, kind="stable")
+    ranked = p[order]
+    if method == "holm":
+        # step-down: the k-th smallest p-value is multiplied by (m - k), monotone increasing
+        adjusted = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    elif method == "fdr_bh":
+        # step-up: the k-th smallest p-value is multiplied by m / (k + 1), monotone from the top
+        adjusted = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown correction method '{method}'.")
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+
+def random_tables(row_sums, col_sums, size: int, rng):
+    """Draws random contingency tables with the given row and column sums.
+
+    Shuffling the labels of one column relative to the other only changes
+    the cells of the table, not its sums, and the tables of all shuffles
+    follow the (multivariate) hypergeometric distribution. The tables are
+    drawn cell by cell with rng.hypergeometric, vectorized over all tables,
+    so the cost depends on the size of the table but not on the number of rows.
+
+
+    Parameters
+    ----------
+    row_sums, col_sums: numpy.ndarray
+        The sums of the rows and columns (with the same total).
+    size: int
+        The number of tables.
+    rng: numpy.random.Generator
+        The random generator.
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The tables with the shape (size, len(row_sums), len(col_sums)).
+
+    """
+    row_sums = np.asarray(row_sums, dtype=np.int64)
+    col_sums = np.asarray(col_sums, dtype=np.int64)
+    tables = np.zeros((size, row_sums.size, col_sums.size), dtype=np.int64)
+    # the column sums that are left for the following rows, per table
+    remaining = np.broadcast_to(col_sums, (size, col_sums.size)).copy()
+    for i, row_sum in enumerate(row_sums[:-1]):
+        left = np.full(size, row_sum)
+        # the values of the later columns that are still left
+        later = remaining[:, ::-1].cumsum(axis=1)[:, ::-1]
+        for j in range(col_sums.size - 1):
+            cell = rng.hypergeometric(remaining[:, j], later[:, j + 1], left)
+            tables[:, i, j] = cell
+            left -= cell
+        tables[:, i, -1] = left
+        remaining -= tables[:, i]
+    tables[:, -1] = remaining
+    return tables
+
+
+
+def _count_extreme(row_sums, col_sums, observed: float, size: int, seed):
+    """Counts the random tables whose Chi-Square statistic is at least the observed one."""
+    tables = random_tables(row_sums, col_sums, size, np.random.default_rng(seed))
+    chi2 = chi2_statistics(tables, correction=False)[0]
+    # a relative tolerance, so tables with the observed statistic aren't lost to rounding
+    return int((chi2 >= observed * (1 - 1e-9)).sum())
+
+
+
+def permutation_pvalue(table, permutations: int = 10_000, alpha: float = 0.05, seed=0, n_jobs: int = 1,
+                       batch_size: int = 10_000, early_stop: bool = True):
+    """Computes the p-value of the Chi-Square test of independence with random permutations.
+
+    The p-value is the share of the tables of shuffled labels whose (Pearson)
+    Chi-Square statistic is at least the statistic of the observed table,
+    p = (1 + extreme) / (1 + permutations). It doesn't rely on the
+    asymptotic chi-square distribution, so it is also valid for sparse tables.
+
+
+    Parameters
+    ----------
+    table: array-like
+        The observed contingency table.
+    permutations: int
+        The (largest) number of permutations.
+    alpha: float
+        The significance level the early stop decides against.
+    seed: int
+        The seed of the random generator. Every batch has its own random
+        stream derived from the seed, so the result doesn't depend on n_jobs.
+    n_jobs: int
+        The number of processes (-1 = all cores).
+    batch_size: int
+        The number of permutations per batch.
+    early_stop: bool
+        Whether the permutations stop as soon as the 99.9% (Clopper-Pearson)
+        confidence interval of the p-value lies completely above or below alpha.
+
+
+    Returns
+    -------
+    p: float
+        The permutation p-value.
+    permutations: int
+        The number of permutations that were drawn.
+
+    """
+    observed = np.asarray(table, dtype=np.int64)
+    # empty rows and columns don't change the statistic
+    observed = observed[observed.sum(axis=1) > 0][:, observed.sum(axis=0) > 0]
+    if min(observed.shape) < 2:
+        return 1.0, 0
+    statistic = chi2_statistics(observed, correction=False)[0]
+    row_sums, col_sums = observed.sum(axis=1), observed.sum(axis=0)
+
+    sizes = [min(batch_size, permutations - start) for start in range(0, permutations, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = ((row_sums, col_sums, statistic, size, batch_seed) for size, batch_seed in zip(sizes, seeds))
+
+    from scipy.stats import beta
+
+    def decided(extreme, done):
+        # the batches are evaluated in order, so the stop doesn't depend on the number of processes
+        lower = beta.ppf(0.0005, extreme, done - extreme + 1) if extreme > 0 else 0.0
+        upper = beta.ppf(0.9995, extreme + 1, done - extreme) if extreme < done else 1.0
+        return early_stop and (upper < alpha or lower > alpha)
+
+    extreme = done = 0
+    if n_jobs == 1:
+        for job in jobs:
+            extreme += _count_extreme(*job)
+            done += job[3]
+            if decided(extreme, done):
+                break
+    else:
+        workers = os.cpu_count() if n_jobs == -1 else n_jobs
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # a few batches per process are in flight, the rest is submitted while the results arrive
+            pending = collections.deque()
+            for job in itertools.islice(jobs, 2 * workers):
+                pending.append((pool.submit(_count_extreme, *job), job[3]))
+            while pending:
+                future, size = pending.popleft()
+                extreme += future.result()
+                done += size
+                if decided(extreme, done):
+                    for future, _ in pending:
+                        future.cancel()
+                    break
+                job = next(jobs, None)
+                if job is not None:
+                    pending.append((pool.submit(_count_extreme, *job), job[3]))
+    return (extreme + 1) / (done + 1), done
+
+
+
+def exact_pvalue(table):
+    """Computes the exact permutation p-value of the Chi-Square test of a 2 x 2 table.
+
+    All tables with the sums of the observed table are enumerated (a 2 x 2
+    table with fixed sums has one free cell), the p-value is the
+    hypergeometric probability of the tables whose Chi-Square statistic is
+    at least the observed one.
+
+    """
+    observed = np.asarray(table, dtype=np.int64)
+    # check if the table has one free cell
+    assert observed.shape == (2, 2), "The exact p-value is only available for 2 x 2 tables."
+    (a, b), (c, d) = observed
+    row1, col1, n = a + b, a + c, observed.sum()
+    if min(row1, n - row1, col1, n - col1) == 0:
+        return 1.0
+    cells = np.arange(max(0, row1 + col1 - n), min(row1, col1) + 1)
+    tables = np.stack([np.stack([cells, row1 - cells], axis=-1),
+                       np.stack([col1 - cells, n - row1 - col1 + cells], axis=-1)], axis=1)
+    chi2 = chi2_statistics(tables, correction=False)[0]
+    statistic = chi2_statistics(observed, correction=False)[0]
+    from scipy.stats import hypergeom
+    probabilities = hypergeom.pmf(cells, n, col1, row1)
+    return float(min(1.0, probabilities[chi2 >= statistic * (1 - 1e-9)].sum()))
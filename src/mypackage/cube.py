@@ -0,0 +1,277 @@
+# %%
+import pandas as pd
+import numpy as np
+import json
+import itertools
+from mypackage import contingency
+# %%
+# A cube holds the sum and the count of a measure (e.g. 'survived') for every
+# observed combination of a few categorical columns (the dimensions). Every
+# group-by over a subset of the dimensions is a rollup of these cells, so it is
+# computed with np.bincount over the (small) cube instead of the rows.
+# %%
+# version of the file layout written by 'SurvivalCube.save'
+CUBE_VERSION = 1
+
+# the label of the margins in 'SurvivalCube.pivot'
+ALL = "All"
+# %%
+class SurvivalCube:
+    """The survivor counts of every combination of the dimension columns,
+    with rollups to any subset of the dimensions.
+
+    The cube is a mergeable state like the states in mypackage.aggregates:
+    cubes of different parts of a dataset are merged by adding the counts
+    of their cells.
+
+
+    Attributes
+    ----------
+    dimensions: tuple
+        The names of the dimension columns.
+    measure: str
+        The name of the aggregated 0/1 column.
+    levels: dict
+        The sorted distinct values of every dimension.
+    codes: numpy.ndarray
+        One row per cell with the level position of every dimension (-1 = missing).
+    sums, counts: numpy.ndarray
+        The sum of the measure and the number of rows of every cell.
+
+    """
+
+
+    def __init__(self, dimensions, measure: str = "survived", levels: dict = None, codes=None,
+                 sums=None, counts=None):
+        self.dimensions = tuple(dimensions)
+        self.measure = measure
+        self.levels = levels if levels is not None else {name: pd.Index([]) for name in self.dimensions}
+        self.codes = codes if codes is not None else np.zeros((0, len(self.dimensions)), dtype=np.int64)
+        self.sums = sums if sums is not None else np.zeros(0)
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+        self._rollups = {}
+
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, dimensions, measure: str = "survived"):
+        """Computes the cube of a DataFrame in one pass over its rows.
+
+        Rows with a missing measure are not counted, rows with a missing
+        dimension are kept (they are part of the rollups without that dimension).
+
+        """
+        dimensions = tuple(dimensions)
+        # check if the columns exist in the dataset
+        for name in dimensions + (measure,):
+            assert name in data.columns, f"Column '{name}' does not exist in the dataset."
+        values = data[measure].to_numpy(dtype=float, na_value=np.nan)
+        valid = ~np.isnan(values)
+        levels, codes = {}, []
+        for name in dimensions:
+            column_codes, levels[name] = contingency.factorize(data[name])
+            codes.append(column_codes[valid])
+        codes = np.stack(codes, axis=1) if codes else np.zeros((int(valid.sum()), 0), dtype=np.int64)
+        return cls._aggregate(dimensions, measure, levels, codes, values[valid], np.ones(codes.shape[0], np.int64))
+
+
+    @classmethod
+    def _aggregate(cls, dimensions, measure, levels, codes, sums, counts):
+        """Adds up the sums and counts of equal cells."""
+        # one integer per cell (the missing code -1 is shifted to 0), unique on one
+        # column is much faster than unique on the rows of the code matrix
+        sizes = [len(levels[name]) + 1 for name in dimensions]
+        assert np.prod(sizes, dtype=float) < 2 ** 63, "The dimensions have too many combinations for a cube."
+        keys, inverse = np.unique(np.ravel_multi_index((codes + 1).T, sizes), return_inverse=True)
+        cells = np.stack(np.unravel_index(keys, sizes), axis=1) - 1
+        return cls(dimensions, measure, levels, cells.astype(np.int64),
+                   np.bincount(inverse, weights=sums, minlength=keys.size),
+                   np.bincount(inverse, weights=counts, minlength=keys.size).astype(np.int64))
+
+
+    def update(self, data: pd.DataFrame):
+        """Adds the rows of a DataFrame to the cube and returns the cube."""
+        return self.merge(SurvivalCube.from_frame(data, self.dimensions, self.measure))
+
+
+    def merge(self, other):
+        """Merges another cube with the same dimensions into this cube and returns this cube."""
+        # check if both cubes have the same cells
+        assert self.dimensions == other.dimensions and self.measure == other.measure, \
+            "Only cubes with the same dimensions and measure can be merged."
+        levels, codes = {}, []
+        for i, name in enumerate(self.dimensions):
+            levels[name] = self.levels[name].append(other.levels[name]).unique().sort_values()
+            # the positions of the levels of both cubes in the merged levels (-1 stays missing)
+            parts = []
+            for cube in (self, other):
+                positions = np.append(levels[name].get_indexer(cube.levels[name]), -1)
+                parts.append(positions[cube.codes[:, i]])
+            codes.append(np.concatenate(parts))
+        codes = np.stack(codes, axis=1) if codes else np.zeros((len(self.counts) + len(other.counts), 0), np.int64)
+        merged = SurvivalCube._aggregate(self.dimensions, self.measure, levels, codes,
+                                         np.concatenate([self.sums, other.sums]),
+                                         np.concatenate([self.counts, other.counts]))
+        self.levels, self.codes, self.sums, self.counts = merged.levels, merged.codes, merged.sums, merged.counts
+        self._rollups = {}
+        return self
+
+
+    def rollup(self, dimensions=(), where: dict = None):
+        """Aggregates the cube to a subset of its dimensions.
+
+
+        Parameters
+        ----------
+        dimensions: str or list
+            The dimensions to group by (an empty list gives the total).
+        where: dict
+            Only the cells with these values are aggregated, e.g.
+            {"pclass": 1} or {"embark_town": ["Cherbourg", "Queenstown"]}
+            (drill-down into a slice of the cube).
+
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per observed group with the columns 'sum' and 'count'
+            and 'mean' (e.g. the survival rate). Groups with a missing
+            value are left out, like in pandas' groupby.
+
+        """
+        dimensions = (dimensions,) if isinstance(dimensions, str) else tuple(dimensions)
+        # check if the dimensions are part of the cube
+        for name in dimensions + tuple(where or ()):
+            assert name in self.dimensions, f"'{name}' is not a dimension of the cube."
+        key = (dimensions, None if where is None else json.dumps(where, sort_keys=True, default=str))
+        if key not in self._rollups:
+            self._rollups[key] = self._compute_rollup(dimensions, where)
+        return self._rollups[key]
+
+
+    def _compute_rollup(self, dimensions: tuple, where: dict):
+        selected = np.ones(len(self.counts), dtype=bool)
+        for name, values in (where or {}).items():
+            values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            wanted = self.levels[name].get_indexer(values)
+            selected &= np.isin(self.codes[:, self.dimensions.index(name)], wanted[wanted >= 0])
+        codes = self.codes[:, [self.dimensions.index(name) for name in dimensions]]
+        # cells with a missing value of a grouped dimension belong to no group
+        selected &= (codes >= 0).all(axis=1)
+        codes, sums, counts = codes[selected], self.sums[selected], self.counts[selected]
+
+        if not dimensions:
+            index = pd.Index([ALL])
+            group_sums, group_counts = np.array([sums.sum()]), np.array([counts.sum()])
+        else:
+            sizes = [len(self.levels[name]) for name in dimensions]
+            groups, inverse = np.unique(np.ravel_multi_index(codes.T, sizes), return_inverse=True)
+            group_sums = np.bincount(inverse, weights=sums, minlength=groups.size)
+            group_counts = np.bincount(inverse, weights=counts, minlength=groups.size).astype(np.int64)
+            group_codes = np.unravel_index(groups, sizes)
+            arrays = [self.levels[name][group_code] for name, group_code in zip(dimensions, group_codes)]
+            index = (arrays[0].rename(dimensions[0]) if len(dimensions) == 1
+                     else pd.MultiIndex.from_arrays(arrays, names=list(dimensions)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = group_sums / group_counts
+        return pd.DataFrame({"sum": group_sums, "count": group_counts, "mean": means}, index=index)
+
+
+    def rollups(self):
+        """Computes the rollups of all 2^k subsets of the dimensions.
+
+
+        Returns
+        -------
+        dict
+            The rollup (see 'rollup') of every subset, keyed by the tuple of its dimensions.
+
+        """
+        return {subset: self.rollup(subset)
+                for size in range(len(self.dimensions) + 1)
+                for subset in itertools.combinations(self.dimensions, size)}
+
+
+    def survival_rate(self, dimensions, where: dict = None):
+        """Returns the mean of the measure per group, like 'Analyzer.survival_rate'."""
+        return self.rollup(dimensions, where)["mean"].rename(self.measure)
+
+
+    def pivot(self, rows, columns, where: dict = None, margins: bool = True):
+        """Returns the survival rates as a pivot table of two sets of dimensions.
+
+
+        Parameters
+        ----------
+        rows, columns: str or list
+            The dimensions of the rows and of the columns.
+        where: dict
+            Only the cells with these values are aggregated (see 'rollup').
+        margins: bool
+            Whether a row and a column with the label "All" are added that
+            hold the rates of the rows and of the columns alone.
+
+
+        Returns
+        -------
+        pandas.DataFrame
+            The rates of the combined groups, like pandas.pivot_table(..., margins = True).
+            Unlike pandas, the margins are the rollups of the cube, so they also
+            count the rows with a missing value of the other dimensions.
+
+        """
+        rows = [rows] if isinstance(rows, str) else list(rows)
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        table = self.rollup(rows + columns, where)["mean"].unstack(columns)
+        if not margins:
+            return table
+
+        def label(names):
+            # a MultiIndex needs a label for every level
+            return ALL if len(names) == 1 else (ALL,) + ("",) * (len(names) - 1)
+
+        table[label(columns)] = self.rollup(rows, where)["mean"]
+        # a copy, the rollups are memoized and must not get the margin
+        total = self.rollup(columns, where)["mean"].copy()
+        total[label(columns)] = self.rollup((), where)["mean"].iloc[0]
+        # the row is added as a frame, a MultiIndex row can't be enlarged with .loc
+        row_index = (pd.Index([ALL], name=rows[0]) if len(rows) == 1
+                     else pd.MultiIndex.from_tuples([label(rows)], names=rows))
+        return pd.concat([table, total.reindex(table.columns).to_frame().T.set_axis(row_index)])
+
+
+    def to_frame(self):
+        """Returns the cells of the cube as a DataFrame (the dimensions, 'sum' and 'count')."""
+        table = pd.DataFrame({name: self.levels[name].take(self.codes[:, i], allow_fill=True)
+                              if len(self.levels[name]) else np.full(len(self.counts), np.nan)
+                              for i, name in enumerate(self.dimensions)})
+        table["sum"] = self.sums
+        table["count"] = self.counts
+        return table
+
+
+    def save(self, path: str):
+        """Writes the cube to a JSON file (see 'load')."""
+        content = {"version": CUBE_VERSION, "dimensions": list(self.dimensions), "measure": self.measure,
+                   "levels": {name: self.levels[name].tolist() for name in self.dimensions},
+                   "categorical": [name for name in self.dimensions
+                                   if isinstance(self.levels[name], pd.CategoricalIndex)],
+                   "codes": self.codes.tolist(), "sums": self.sums.tolist(), "counts": self.counts.tolist()}
+        with open(path, "w") as file:
+            # numpy scalars (e.g. the levels of integer columns) are written as Python numbers
+            json.dump(content, file, default=lambda value: value.item())
+        return path
+
+
+    @classmethod
+    def load(cls, path: str):
+        """Reads a cube written by 'save'."""
+        with open(path) as file:
+            content = json.load(file)
+        # check if the file was written with the current layout
+        assert content.get("version") == CUBE_VERSION, f"'{path}' is not a cube of version {CUBE_VERSION}."
+        dimensions = content["dimensions"]
+        levels = {name: pd.CategoricalIndex(values, categories=values) if name in content["categorical"]
+                  else pd.Index(values) for name, values in content["levels"].items()}
+        return cls(dimensions, content["measure"], levels,
+                   np.array(content["codes"], dtype=np.int64).reshape(-1, len(dimensions)),
+                   np.array(content["sums"], dtype=float), np.array(content["counts"], dtype=np.int64))
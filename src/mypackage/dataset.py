@@ -0,0 +1,451 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+import time
+import json
+import shutil
+import hashlib
+import tempfile
+import contextlib
+# %%
+# path of the cleaned Titanic dataset that ships with the package
+csv_path = os.path.join(os.path.dirname(__file__), 'cleaned_data.csv')
+
+# version of the on-disk cache layout, bump it whenever the layout changes
+CACHE_VERSION = 1
+
+# seconds after which the lock file of a cache counts as left behind by a crashed process,
+# the lock is only held while the written cache is moved into place
+LOCK_TIMEOUT = 60
+# %%
+def file_fingerprint(path: str, hash_file: bool = True):
+    """Computes the fingerprint that identifies the content of a file.
+
+
+    Parameters
+    ----------
+    path: str
+        The path of the file.
+    hash_file: bool
+        Whether the sha256 hash of the file content should be computed as well.
+        Hashing reads the whole file, so it can be skipped when size and
+        modification time are enough.
+
+
+    Returns
+    -------
+    dict
+        A dictionary with the keys 'size', 'mtime_ns' and 'sha256'
+        ('sha256' is None if hash_file is False).
+
+    """
+    stat = os.stat(path)
+    digest = None
+    if hash_file:
+        sha = hashlib.sha256()
+        with open(path, "rb") as file:
+            # read the file in blocks of 1 MiB to keep the memory usage constant
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+
+
+def cache_path_for(path: str):
+    """Returns the directory of the binary cache that belongs to a csv file.
+
+
+    Parameters
+    ----------
+    path: str
+        The path of the csv file.
+
+
+    Returns
+    -------
+    str
+        The cache directory next to the csv file ('<file>.cache').
+
+    """
+    return os.fspath(path) + ".cache"
+
+
+
+@contextlib.contextmanager
+def _cache_lock(cache_dir: str):
+    """Holds the lock file of a cache directory ('<cache_dir>.lock'), waits while another process holds it."""
+    lock = cache_dir + ".lock"
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > LOCK_TIMEOUT:
+                    os.remove(lock)
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.remove(lock)
+
+
+
+def _publish(tmp_dir: str, cache_dir: str, fingerprint: dict):
+    """Moves a written cache into place.
+
+    Several processes may write the cache of the same file at once (e.g.
+    workers that start without a cache). They publish one after another
+    under the lock file, and a cache of the same source that another process
+    published in the meantime is kept instead of being replaced. An outdated
+    cache is moved aside before it is deleted, so the cache directory never
+    holds a mix of files.
+
+    """
+    old_dir = None
+    with _cache_lock(cache_dir):
+        meta = _read_meta(cache_dir)
+        if fingerprint is not None and meta is not None and meta["source"] is not None \
+                and meta["source"]["size"] == fingerprint["size"] and meta["source"]["sha256"] == fingerprint["sha256"]:
+            return
+        if os.path.isdir(cache_dir):
+            old_dir = tempfile.mkdtemp(prefix=".old-", dir=os.path.dirname(os.path.abspath(cache_dir)))
+            os.replace(cache_dir, os.path.join(old_dir, "cache"))
+        os.replace(tmp_dir, cache_dir)
+    if old_dir is not None:
+        # processes that mapped the outdated columns keep them until they close them
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+
+def _write_cache(data: pd.DataFrame, cache_dir: str, fingerprint: dict):
+    """Writes a DataFrame as a typed, columnar binary cache.
+
+    Every column is stored as its own '.npy' file. Categorical and string
+    columns are stored as integer codes, the categories are kept in
+    'meta.json' together with the fingerprint of the source file
+    (None for a store written by 'write_store').
+    The cache is written into a temporary directory first and then moved
+    into place (see '_publish'), so a reader never sees a half written cache.
+
+    """
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        columns = []
+        for i, name in enumerate(data.columns):
+            series = data[name]
+            # string columns are stored as categoricals, that keeps them fixed width
+            if series.dtype == object:
+                series = series.astype("category")
+            entry = {"name": name, "file": f"{i}.npy"}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                entry["kind"] = "category"
+                entry["categories"] = series.cat.categories.tolist()
+                entry["ordered"] = bool(series.cat.ordered)
+                values = series.cat.codes.to_numpy()
+            else:
+                entry["kind"] = "array"
+                values = series.to_numpy()
+                # only fixed width numpy dtypes (int, float, bool) can be memory-mapped
+                assert values.dtype != object, f"Column '{name}' can not be cached."
+            np.save(os.path.join(tmp_dir, entry["file"]), values, allow_pickle=False)
+            columns.append(entry)
+
+        np.save(os.path.join(tmp_dir, "index.npy"), data.index.to_numpy(), allow_pickle=False)
+        meta = {"version": CACHE_VERSION, "source": fingerprint,
+                "index_name": data.index.name, "columns": columns}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+        _publish(tmp_dir, cache_dir, fingerprint)
+    finally:
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+
+def write_cache_chunks(chunks, cache_dir: str, n_rows: int, dtypes: dict, source: str):
+    """Writes a dataset that arrives in chunks as a typed binary cache.
+
+    Like the cache written by 'load_data', but the columns are filled chunk
+    by chunk through memory-mapped '.npy' files, so the dataset never has to
+    be in memory at once. The number of rows and the dtypes (with the
+    categories of categorical columns) must be known in advance.
+
+
+    Parameters
+    ----------
+    chunks: iterable
+        The pandas DataFrames with the rows, in order.
+    cache_dir: str
+        The cache directory (see 'cache_path_for').
+    n_rows: int
+        The total number of rows of all chunks.
+    dtypes: dict
+        The dtype of every column, categorical columns need a
+        pandas.CategoricalDtype with all of their categories.
+    source: str
+        The csv file the cache belongs to. Its fingerprint is computed after
+        all chunks are consumed, so the chunks may write the csv file themselves.
+
+    """
+    # ensure that there is something to write
+    assert n_rows > 0, "The dataset must not be empty."
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        columns, arrays = [], {}
+        for i, (name, dtype) in enumerate(dtypes.items()):
+            entry = {"name": name, "file": f"{i}.npy"}
+            if isinstance(dtype, pd.CategoricalDtype):
+                entry["kind"] = "category"
+                entry["categories"] = dtype.categories.tolist()
+                entry["ordered"] = bool(dtype.ordered)
+                # the smallest code dtype that pandas would use for these categories
+                array_dtype = pd.Categorical([], dtype=dtype).codes.dtype
+            else:
+                entry["kind"] = "array"
+                array_dtype = np.dtype(dtype)
+                assert array_dtype != object, f"Column '{name}' can not be cached."
+            arrays[name] = np.lib.format.open_memmap(os.path.join(tmp_dir, entry["file"]), mode="w+",
+                                                     dtype=array_dtype, shape=(n_rows,))
+            columns.append(entry)
+        index = None
+
+        start = 0
+        for chunk in chunks:
+            stop = start + len(chunk)
+            assert stop <= n_rows, "The chunks have more rows than announced."
+            for name, dtype in dtypes.items():
+                series = chunk[name].astype(dtype)
+                arrays[name][start:stop] = series.cat.codes if isinstance(dtype, pd.CategoricalDtype) else series
+            if index is None:
+                index = np.lib.format.open_memmap(os.path.join(tmp_dir, "index.npy"), mode="w+",
+                                                  dtype=chunk.index.dtype, shape=(n_rows,))
+                index_name = chunk.index.name
+            index[start:stop] = chunk.index
+            start = stop
+        assert start == n_rows, "The chunks have fewer rows than announced."
+        for array in [*arrays.values(), index]:
+            array.flush()
+        del arrays, index
+
+        meta = {"version": CACHE_VERSION, "source": file_fingerprint(source),
+                "index_name": index_name, "columns": columns}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+        _publish(tmp_dir, cache_dir, meta["source"])
+    finally:
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+
+def _read_meta(cache_dir: str):
+    """Reads the meta data of a cache, returns None if there is no valid cache."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    return meta
+
+
+
+def _read_cache(cache_dir: str, meta: dict, mmap_mode="c", names: list = None):
+    """Builds a DataFrame from the memory-mapped column files of a cache (or of some of its columns)."""
+    entries = meta["columns"]
+    if names is not None:
+        known = [entry["name"] for entry in entries]
+        # check if the requested columns are part of the cache
+        for name in names:
+            assert name in known, f"Column '{name}' does not exist in the store."
+        entries = [entry for entry in entries if entry["name"] in names]
+    columns = {}
+    for entry in entries:
+        values = np.load(os.path.join(cache_dir, entry["file"]), mmap_mode=mmap_mode)
+        if entry["kind"] == "category":
+            dtype = pd.CategoricalDtype(entry["categories"], ordered=entry["ordered"])
+            # the codes were written from a valid Categorical, validating them would read every page
+            columns[entry["name"]] = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        else:
+            columns[entry["name"]] = values
+
+    index = pd.Index(np.load(os.path.join(cache_dir, "index.npy"), mmap_mode=mmap_mode),
+                     name=meta["index_name"])
+    # copy=False keeps the memory-mapped arrays instead of copying them into new blocks
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+
+def _try_read_cache(cache_dir: str, meta: dict):
+    """Like '_read_cache', but returns None if the cache was replaced by another process while it was opened."""
+    try:
+        return _read_cache(cache_dir, meta)
+    except (OSError, ValueError):
+        return None
+
+
+
+def write_store(data: pd.DataFrame, directory: str):
+    """Writes a DataFrame as a column store.
+
+    The layout is the one of the cache of 'load_data': one fixed width '.npy'
+    file per column, categorical and string columns as integer codes with
+    their categories in 'meta.json'.
+
+
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        The dataset, e.g. the cleaned Titanic dataset.
+    directory: str
+        The directory of the store (replaced if it exists).
+
+
+    Returns
+    -------
+    str
+        The directory of the store.
+
+    """
+    _write_cache(data, os.fspath(directory), None)
+    return os.fspath(directory)
+
+
+
+def open_store(directory: str, columns: list = None, read_only: bool = True):
+    """Opens a column store (or the cache directory of a csv file) as a DataFrame of memory-mapped columns.
+
+    Opening only maps the files, no values are read. A column is read (by
+    the operating system, page by page) when it is used for the first time,
+    and processes that open the same store share these pages through the
+    page cache instead of holding copies of the dataset.
+
+
+    Parameters
+    ----------
+    directory: str
+        The directory written by 'write_store' (or '<file>.cache').
+    columns: list
+        The columns to open, defaults to all columns.
+    read_only: bool
+        Whether the columns are read-only views (writing raises an error).
+        Otherwise they are copy-on-write: changed pages become private
+        copies and the store stays unchanged.
+
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataset.
+
+
+    Examples
+    --------
+    write_store(load_data(), "titanic.store")
+
+    data = open_store("titanic.store", columns=["survived", "pclass"])
+
+    """
+    meta = _read_meta(os.fspath(directory))
+    # check if the directory holds a store of the current layout
+    assert meta is not None, f"'{directory}' is not a column store of version {CACHE_VERSION}."
+    return _read_cache(os.fspath(directory), meta, "r" if read_only else "c", columns)
+
+
+
+def load_data(path: str = None, cache: bool = True):
+    """Loads the (cleaned) Titanic dataset.
+
+    The first load parses the csv file and writes a typed binary cache
+    next to it. Later loads memory-map the cache instead of parsing the csv file
+    again, as long as the csv file has not changed.
+
+
+    Parameters
+    ----------
+    path: str
+        The path of the csv file. Defaults to the 'cleaned_data.csv' that
+        ships with the package.
+    cache: bool
+        Whether the binary cache should be used (and written).
+
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataset. String columns are returned as categoricals and
+        boolean columns keep their bool dtype.
+
+
+    Notes
+    -----
+    The cache is keyed on the size, the modification time and the sha256
+    hash of the csv file. If only the modification time changed, the hash
+    is compared, so touching the file does not invalidate the cache.
+    The memory-mapped columns are copy-on-write, changing the returned
+    DataFrame never changes the cache.
+    If the cache directory can not be written the csv file is parsed
+    on every call. Processes that load the same file at once may all parse
+    it, one of their caches is kept.
+
+
+    Examples
+    --------
+    data = load_data()
+
+    analyzer = Analyzer(data)
+
+    """
+    path = csv_path if path is None else os.fspath(path)
+    if not cache:
+        return pd.read_csv(path, index_col=0)
+
+    cache_dir = cache_path_for(path)
+    meta = _read_meta(cache_dir)
+    fingerprint = file_fingerprint(path, hash_file=False)
+
+    if meta is not None and meta["source"] is not None and meta["source"]["size"] == fingerprint["size"]:
+        if meta["source"]["mtime_ns"] == fingerprint["mtime_ns"]:
+            data = _try_read_cache(cache_dir, meta)
+            if data is not None:
+                return data
+        else:
+            # the file was touched, only use the cache if the content is still the same
+            fingerprint = file_fingerprint(path)
+            if meta["source"]["sha256"] == fingerprint["sha256"]:
+                meta["source"] = fingerprint
+                try:
+                    # replaced at once, other processes may be reading the meta data
+                    with tempfile.NamedTemporaryFile("w", dir=cache_dir, suffix=".json", delete=False) as file:
+                        json.dump(meta, file)
+                    os.replace(file.name, os.path.join(cache_dir, "meta.json"))
+                except OSError:
+                    pass
+                data = _try_read_cache(cache_dir, meta)
+                if data is not None:
+                    return data
+
+    # hash before parsing, so a file that changes while it is read is not cached as up to date
+    fingerprint = file_fingerprint(path)
+    data = pd.read_csv(path, index_col=0)
+    try:
+        _write_cache(data, cache_dir, fingerprint)
+    except OSError:
+        # read-only installations can't hold a cache, fall back to the parsed csv file
+        return data
+    meta = _read_meta(cache_dir)
+    if meta is None or meta["source"] is None or meta["source"]["sha256"] != fingerprint["sha256"]:
+        # the cache was replaced by another process (e.g. after the csv file changed again)
+        return data
+    cached = _try_read_cache(cache_dir, meta)
+    return data if cached is None else cached
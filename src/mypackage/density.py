@@ -0,0 +1,253 @@
+# %%
+import numpy as np
+# %%
+# Vectorized numpy kernels for plots of large datasets. Instead of drawing every
+# observation, the data is binned once and only the bins are drawn, so the
+# rendering time barely grows with the number of rows.
+# %%
+def bin_edges(values, bins: int, log: bool = False):
+    """Computes equally wide bin edges over the range of the values.
+
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        The values (without missing values).
+    bins: int
+        The number of bins.
+    log: bool
+        Whether the bins are equally wide on a logarithmic scale
+        (only the positive values are covered).
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The bins + 1 edges.
+
+    """
+    if log:
+        values = values[values > 0]
+        return np.geomspace(values.min(), values.max(), bins + 1)
+    low, high = values.min(), values.max()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+
+def bin_index(values, edges, log: bool = False):
+    """Returns the bin of every value for equally wide bins (-1 = outside of the edges).
+
+    Because the bins are equally wide the bin is computed arithmetically,
+    which is much faster than searching the edges.
+
+    """
+    if log:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values, edges = np.log(values), np.log(edges)
+    bins = edges.size - 1
+    position = (values - edges[0]) / (edges[-1] - edges[0]) * bins
+    index = np.floor(np.nan_to_num(position, nan=-1.0, neginf=-1.0, posinf=-1.0)).astype(np.int64)
+    # the largest value belongs to the last bin
+    index[(index == bins) & (values <= edges[-1])] = bins - 1
+    index[(index < 0) | (index >= bins)] = -1
+    return index
+
+
+
+def histogram2d(x, y, x_edges, y_edges, log_y: bool = False):
+    """Counts the observations in the cells of a 2-D grid.
+
+
+    Parameters
+    ----------
+    x, y: numpy.ndarray
+        The coordinates of the observations.
+    x_edges, y_edges: numpy.ndarray
+        The equally wide bin edges (see 'bin_edges').
+    log_y: bool
+        Whether the y edges are equally wide on a logarithmic scale.
+
+
+    Returns
+    -------
+    numpy.ndarray
+        The counts with the shape (len(x_edges) - 1, len(y_edges) - 1).
+
+    """
+    ix = bin_index(x, x_edges)
+    iy = bin_index(y, y_edges, log=log_y)
+    valid = (ix >= 0) & (iy >= 0)
+    n_y = y_edges.size - 1
+    counts = np.bincount(ix[valid] * n_y + iy[valid], minlength=(x_edges.size - 1) * n_y)
+    return counts.reshape(x_edges.size - 1, n_y)
+
+
+
+def linear_fits(x, y, groups=None, n_groups: int = 1):
+    """Fits a least squares line y = intercept + slope * x per group in one pass.
+
+    Only the sufficient statistics (n, sums of x, y, x*x, x*y, y*y, min and
+    max of x) are computed per group with np.bincount, so all groups are
+    fitted together without sorting or resampling.
+
+
+    Parameters
+    ----------
+    x, y: numpy.ndarray
+        The observations (rows with a missing value are ignored).
+    groups: numpy.ndarray
+        The integer code of the group of every row (-1 = ignored).
+        Without groups all rows form one group.
+    n_groups: int
+        The number of groups.
+
+
+    Returns
+    -------
+    dict
+        Arrays with one value per group: 'n', 'slope', 'intercept',
+        'x_mean', 'sxx' (sum of squared deviations of x), 'residual_var',
+        'x_min' and 'x_max'.
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    groups = np.zeros(x.size, dtype=np.int64) if groups is None else np.asarray(groups)
+    valid = ~np.isnan(x) & ~np.isnan(y) & (groups >= 0)
+    x, y, groups = x[valid], y[valid], groups[valid]
+
+    def sums(weights):
+        return np.bincount(groups, weights=weights, minlength=n_groups)
+
+    n = sums(None)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = sums(x) / n
+        y_mean = sums(y) / n
+        sxx = sums(x * x) - n * x_mean ** 2
+        sxy = sums(x * y) - n * x_mean * y_mean
+        syy = sums(y * y) - n * y_mean ** 2
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+        # the variance of the residuals with n - 2 degrees of freedom
+        residual_var = np.clip(syy - slope * sxy, 0, None) / (n - 2)
+
+    x_min = np.full(n_groups, np.inf)
+    x_max = np.full(n_groups, -np.inf)
+    np.minimum.at(x_min, groups, x)
+    np.maximum.at(x_max, groups, x)
+    return {"n": n, "slope": slope, "intercept": intercept, "x_mean": x_mean, "sxx": sxx,
+            "residual_var": residual_var, "x_min": x_min, "x_max": x_max}
+
+
+
+def fit_line(fits: dict, group: int = 0, ci: float = 95, points: int = 100):
+    """Evaluates a fitted line and its analytic confidence band.
+
+
+    Parameters
+    ----------
+    fits: dict
+        The result of 'linear_fits'.
+    group: int
+        The group whose line is evaluated.
+    ci: float
+        The confidence level in percent of the band around the mean
+        prediction, or None for no band.
+    points: int
+        The number of x values between the smallest and the largest x.
+
+
+    Returns
+    -------
+    x, y, lower, upper: numpy.ndarray
+        The line and the band (lower and upper are None without ci).
+
+    """
+    grid = np.linspace(fits["x_min"][group], fits["x_max"][group], points)
+    line = fits["intercept"][group] + fits["slope"][group] * grid
+    if ci is None or fits["n"][group] < 3:
+        return grid, line, None, None
+    n = fits["n"][group]
+    # standard error of the mean prediction of an ordinary least squares line
+    se = np.sqrt(fits["residual_var"][group] * (1 / n + (grid - fits["x_mean"][group]) ** 2 / fits["sxx"][group]))
+    from scipy.stats import t as t_distribution
+    critical = t_distribution.ppf(0.5 + ci / 200, n - 2)
+    return grid, line, line - critical * se, line + critical * se
+
+
+
+def binned_kde(values, bins: int = None, bw_adjust: float = 1.0, cut: float = 3, oversample: int = None):
+    """Computes a histogram and a gaussian kernel density estimate from one binning pass.
+
+    The values are counted once on a fine grid (np.bincount). The histogram
+    sums neighbouring cells of that grid and the density is the convolution of
+    the grid counts with a gaussian kernel (computed with the FFT), so the
+    cost grows with the number of values plus the number of grid cells
+    instead of their product.
+
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        The values of a numerical column (missing values are ignored).
+    bins: int
+        The number of histogram bins. Defaults to numpy's "auto" rule
+        (the larger of the Freedman-Diaconis and Sturges estimates, at most 1000).
+    bw_adjust: float
+        Factor for the bandwidth of Scott's rule (like seaborn's bw_adjust).
+    cut: float
+        How many bandwidths the density reaches past the smallest and the
+        largest value (like seaborn's cut).
+    oversample: int
+        The number of fine grid cells per histogram bin. Defaults to
+        about 1024 cells over the range of the values.
+
+
+    Returns
+    -------
+    dict
+        'edges' and 'counts' of the histogram, 'grid' and 'density' of the
+        density estimate (integrates to 1), 'bandwidth' and 'n'.
+
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    n = values.size
+    # ensure that there is something to estimate
+    assert n > 0, "There are no values to estimate the density of."
+    if bins is None:
+        bins = int(np.ceil(np.log2(n)) + 1)
+        # np.percentile selects instead of sorting, so this stays linear in n
+        q25, q75 = np.percentile(values, [25, 75])
+        if q75 > q25:
+            bins = max(bins, int(np.ceil((values.max() - values.min()) / (2 * (q75 - q25) * n ** (-1 / 3)))))
+        bins = min(bins, 1000)
+    if oversample is None:
+        oversample = int(np.ceil(1024 / bins))
+
+    edges = bin_edges(values, bins)
+    cell = (edges[-1] - edges[0]) / (bins * oversample)
+    std = values.std(ddof=1) if n > 1 else 0.0
+    # Scott's rule like scipy.stats.gaussian_kde, with a fallback for constant values
+    bandwidth = bw_adjust * (std * n ** (-1 / 5) if std > 0 else edges[1] - edges[0])
+
+    # the fine grid covers the histogram and 'cut' bandwidths on both sides
+    pad = int(np.ceil(cut * bandwidth / cell))
+    start = edges[0] - pad * cell
+    index = np.floor((values - start) / cell).astype(np.int64)
+    index = np.clip(index, pad, pad + bins * oversample - 1)
+    fine = np.bincount(index, minlength=bins * oversample + 2 * pad).astype(float)
+    counts = fine[pad:pad + bins * oversample].reshape(bins, oversample).sum(axis=1)
+
+    # the gaussian kernel sampled on the grid, up to 4 bandwidths from its center
+    half = int(np.ceil(4 * bandwidth / cell))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) * cell / bandwidth) ** 2)
+    kernel /= kernel.sum()
+    from scipy.signal import fftconvolve
+    smoothed = np.clip(fftconvolve(fine, kernel, mode="same"), 0, None)
+
+    grid = start + (np.arange(fine.size) + 0.5) * cell
+    return {"edges": edges, "counts": counts, "grid": grid, "density": smoothed / (n * cell),
+            "bandwidth": bandwidth, "n": n}
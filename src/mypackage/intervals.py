@@ -0,0 +1,101 @@
+# %%
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+# %%
+# Confidence intervals of proportions (e.g. survival rates) per group.
+# Both intervals only need the number of successes and the number of rows per
+# group, so they cost the same for a thousand or a billion rows.
+# %%
+def wilson_interval(successes, n, ci: float = 95):
+    """Computes the Wilson score interval of proportions.
+
+
+    Parameters
+    ----------
+    successes, n: array-like
+        The number of successes (e.g. survivors) and of observations per group.
+    ci: float
+        The confidence level in percent.
+
+
+    Returns
+    -------
+    lower, upper: numpy.ndarray
+        The bounds of the intervals (NaN for groups without observations).
+
+    """
+    from scipy.stats import norm
+    successes = np.asarray(successes, dtype=float)
+    n = np.asarray(n, dtype=float)
+    z = norm.ppf(0.5 + ci / 200)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = successes / n
+        center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        half = z / (1 + z ** 2 / n) * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+    return center - half, center + half
+
+
+
+def _bootstrap_batch(successes, failures, size: int, seed):
+    """Draws 'size' bootstrap resamples of the proportions per group."""
+    rng = np.random.default_rng(seed)
+    counts = np.concatenate([successes, failures])
+    total = int(counts.sum())
+    # a resample of all rows only changes how many rows fall into every (group, outcome) cell
+    cells = rng.multinomial(total, counts / total, size=size)
+    resampled_successes = cells[:, :successes.size]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return resampled_successes / (resampled_successes + cells[:, successes.size:])
+
+
+
+def bootstrap_interval(successes, n, ci: float = 95, resamples: int = 10_000, seed=0, n_jobs: int = 1,
+                       batch_size: int = 10_000):
+    """Computes percentile bootstrap intervals of proportions per group.
+
+    A bootstrap resample draws all rows again with replacement. For proportions
+    per group only the number of resampled rows per (group, outcome) cell
+    matters, which follows a multinomial distribution with the observed cell
+    shares. So every resample is one multinomial draw over the 2 x groups
+    cells instead of a new group-by over the rows.
+
+
+    Parameters
+    ----------
+    successes, n: array-like
+        The number of successes and of observations per group.
+    ci: float
+        The confidence level in percent.
+    resamples: int
+        The number of bootstrap resamples.
+    seed: int
+        The seed of the random generator. Every batch has its own random
+        stream derived from the seed, so the result doesn't depend on n_jobs.
+    n_jobs: int
+        The number of processes (-1 = all cores).
+    batch_size: int
+        The number of resamples per batch.
+
+
+    Returns
+    -------
+    lower, upper: numpy.ndarray
+        The bounds of the intervals.
+
+    """
+    successes = np.asarray(successes, dtype=np.int64)
+    failures = np.asarray(n, dtype=np.int64) - successes
+    # ensure that there is something to resample
+    assert successes.size > 0 and (successes + failures).sum() > 0, "There are no observations."
+    sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = ([successes] * len(sizes), [failures] * len(sizes), sizes, seeds)
+    if n_jobs == 1:
+        rates = list(map(_bootstrap_batch, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=os.cpu_count() if n_jobs == -1 else n_jobs) as pool:
+            rates = list(pool.map(_bootstrap_batch, *args))
+    # resamples without a row of a group have no proportion for that group
+    lower, upper = np.nanpercentile(np.concatenate(rates), [50 - ci / 2, 50 + ci / 2], axis=0)
+    return lower, upper
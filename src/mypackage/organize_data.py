@@ -1,76 +1,181 @@
 #%%
 import pandas as pd
-import seaborn as sns
 import numpy as np
-import os 
+import os
+import sys
+import logging
+from mypackage.dataset import cache_path_for, write_cache_chunks
+from mypackage.aggregates import GroupMoments, ValueCounts
 #%%
-data = sns.load_dataset("titanic")
-# %%
-data.shape # (891, 15)
-data.describe() # the first statistical information of the numerical data
-# (min, max, mean, etc.)
-# %%
-# check whether the two columns "pclass" and "class" share the same information
-first = ((data["pclass"] == 1) & (data["class"] != "First")).sum()
-second = ((data["pclass"] == 2) & (data["class"] != "Second")).sum()
-third = ((data["pclass"] == 3) & (data["class"] != "Third")).sum()
-
-print(f"First: {first}, Second: {second}, Third: {third}") #First: 0, Second: 0, Third: 0
-# this means we can delete one of the columns  => delete "class"
-
-# %%
-data = data.drop(columns= "class")
-# deletes the column "class"
-# %%
-data = data.drop(columns= "adult_male")
-# drop "adult_male" column because it's irrelevant for our analysis
-# %%
-((data["age"].isnull()) & (data["who"] == "child")).sum() # 0
-((data["age"].isnull()) & (data["who"] == "woman")).sum() # 53
-((data["age"].isnull()) & (data["who"] == "man")).sum() # 124
-# no missing age for children, 53 missing values for women, 124 missing values for men
-# %%
-data["age"].isnull().sum() 
-# 177 missing values (in the column age) which we'll fill with 
-# the average age depending on the column "who" (woman or man) since there is no
-# missing age for children
-data.groupby("who")["age"].mean().round()
-# who
-# child     6.0
-# man      33.0
-# woman    32.0
-men_age = 33
-women_age = 32
-data.loc[data["who"] == "woman", "age"] = data.loc[data["who"] == "woman", "age"].fillna(women_age)
-data.loc[data["who"] == "man", "age"] = data.loc[data["who"] == "man", "age"].fillna(men_age)
-# %%
-data["age"].isnull().sum() # 0 --> no more missing values
-# %%
-# check whether the two colums "embark_town" and "embarked" share the same information
-southampton = ((data["embark_town"] == "Southampton") & (data["embarked"] != "S")).sum()
-cherbourg = ((data["embark_town"] == "Cherbourg") & (data["embarked"] != "C")).sum()
-queenstown = ((data["embark_town"] == "Queenstown") & (data["embarked"] != "Q")).sum()
-
-print(f"Southampton: {southampton}, Cherbourg: {cherbourg}, Queenstown: {queenstown}")
-# Southampton: 0, Cherbourg: 0, Queenstown: 0
-# again we can delete one of the columns. In this case we'll delete "embarked" 
-# because the "embark_town" is more understandable
-# %%
-data = data.drop(columns="embarked") # no need
-data = data.drop(columns="deck") # too many missing values and too little information
-# %%
-not_alone = ((data["sibsp"] > 0) & (data["alone"] != False)).sum()
-alone = ((data["sibsp"] == 0) & (data["alone"] != True)).sum()
-
-
-print(f"Alone: {alone}, Not Alone: {not_alone}")
-# alone == False and sibsp > 0 are identical but alone == True and sibsp == 0 are not 
-# so we leave as it is
-# %%
-output_folder = os.path.join(os.getcwd())
-output_file = os.path.join(output_folder, "cleaned_data.csv")
-data.to_csv(output_file)
-# saved the cleaned data as a new csv file ("cleaned_data.csv") 
-# into the mypackage folder in the source folder
-
-# %%
+# The cleaning of the raw Titanic dataset (the 'titanic' dataset of seaborn,
+# e.g. saved with sns.load_dataset("titanic").to_csv(path, index=False)).
+# The raw file is read twice in chunks, so it never has to fit into memory:
+# the first pass runs the consistency checks and collects the imputation
+# values, the categories and the dtypes, the second pass cleans every chunk
+# and writes it to the output csv file and its typed binary cache.
+#%%
+logger = logging.getLogger(__name__)
+#%%
+# "pclass" and "class" share the same information (First: 0, Second: 0, Third: 0
+# mismatches), so "class" is deleted. The same holds for "embark_town" and "embarked",
+# "embark_town" is kept because it's more understandable.
+# "adult_male" is irrelevant for our analysis and "deck" has too many missing
+# values and too little information.
+DROP_COLUMNS = ("class", "adult_male", "embarked", "deck")
+
+# the consistency checks: (key column, column that should agree, expected value per key)
+CONSISTENCY_CHECKS = {
+    "pclass/class": ("pclass", "class", {1: "First", 2: "Second", 3: "Third"}),
+    "embark_town/embarked": ("embark_town", "embarked", {"Southampton": "S", "Cherbourg": "C", "Queenstown": "Q"}),
+}
+#%%
+def check_consistency(chunk: pd.DataFrame):
+    """Runs all consistency checks on a chunk in one vectorized pass.
+
+
+    Parameters
+    ----------
+    chunk: pandas.DataFrame
+        A chunk of the raw dataset (checks whose columns are missing are skipped).
+
+
+    Returns
+    -------
+    pandas.Series
+        The number of inconsistent rows, indexed by (check, value of the key column).
+        "sibsp/alone" counts the rows with siblings or spouses that are not marked
+        as not alone ("not alone") and the rows without that are not marked
+        as alone ("alone").
+
+    """
+    counts = {}
+    for check, (key, other, expected) in CONSISTENCY_CHECKS.items():
+        if key not in chunk or other not in chunk:
+            continue
+        keys = chunk[key]
+        # rows with a missing or unknown key are not checked
+        mismatch = keys.isin(list(expected)) & (chunk[other] != keys.map(expected))
+        mismatches = keys[mismatch].value_counts()
+        for value in expected:
+            counts[(check, value)] = int(mismatches.get(value, 0))
+
+    if "sibsp" in chunk and "alone" in chunk:
+        # alone == False and sibsp > 0 are identical, but alone == True and sibsp == 0
+        # are not (passengers with parents or children aren't alone either)
+        counts[("sibsp/alone", "not alone")] = int(((chunk["sibsp"] > 0) & (chunk["alone"] != False)).sum())
+        counts[("sibsp/alone", "alone")] = int(((chunk["sibsp"] == 0) & (chunk["alone"] != True)).sum())
+    return pd.Series(counts, dtype="int64")
+
+
+
+def clean(source: str, output: str, chunksize: int = 1_000_000, impute: str = "age",
+          impute_by: str = "who", drop: tuple = DROP_COLUMNS, cache: bool = True):
+    """Cleans a raw Titanic dataset and writes it as a csv file like 'cleaned_data.csv'.
+
+
+    Parameters
+    ----------
+    source: str
+        The path of the raw csv file (without an index column), e.g. the
+        'titanic' dataset of seaborn saved to a local file.
+    output: str
+        The path of the cleaned csv file.
+    chunksize: int
+        The number of rows that are in memory at once.
+    impute: str
+        The column whose missing values are filled.
+    impute_by: str
+        The missing values are filled with the (rounded) mean of the row's
+        group in this column (e.g. the average age of women for women).
+        Groups without a mean keep their missing values.
+    drop: tuple
+        The columns that are deleted.
+    cache: bool
+        Whether the typed binary cache of the output is written as well, so
+        'load_data(output)' memory-maps it without parsing the csv file.
+
+
+    Returns
+    -------
+    dict
+        'rows': the number of rows,
+        'checks': the inconsistent rows per check (see 'check_consistency'),
+        'imputation': the value that filled the missing values per group,
+        'imputed': the number of filled values and
+        'dtypes': the dtypes of the cleaned columns.
+
+
+    Examples
+    --------
+    report = clean("titanic.csv", "cleaned_data.csv")
+
+    analyzer = Analyzer(load_data("cleaned_data.csv"))
+
+    """
+    # check if the raw file exists and if the chunksize is valid
+    assert os.path.isfile(source), f"File '{source}' does not exist."
+    assert chunksize > 0, "The chunksize must be positive."
+
+    # first pass: consistency checks, imputation values, categories and dtypes
+    n_rows = 0
+    checks = None
+    groups = GroupMoments()
+    categories, dtypes = {}, {}
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        n_rows += len(chunk)
+        # every chunk has the same columns, so every chunk runs the same checks
+        counts = check_consistency(chunk)
+        checks = counts if checks is None else checks + counts
+        if impute_by is not None:
+            groups.update(chunk, impute_by, impute)
+        chunk = chunk.drop(columns=[name for name in drop if name in chunk])
+        for name, dtype in chunk.dtypes.items():
+            if dtype == object:
+                categories.setdefault(name, ValueCounts()).update(chunk[name])
+            else:
+                # e.g. an integer column is read as float in chunks with missing values
+                dtypes[name] = np.result_type(dtypes.get(name, dtype), dtype)
+    assert n_rows > 0, "The dataset must not be empty."
+
+    # string columns get the categories of all chunks, the other columns the common dtype
+    columns = list(chunk.columns)
+    dtypes.update({name: pd.CategoricalDtype(sorted(state.counts.index)) for name, state in categories.items()})
+    dtypes = {name: dtypes[name] for name in columns}
+    # a rounded group mean like the original cleaning (man: 33, woman: 32)
+    imputation = groups.statistic("mean").round() if impute_by is not None else pd.Series(dtype=float)
+
+    # second pass: impute, drop and write the typed chunks
+    imputed = 0
+    output_dir = os.path.dirname(os.path.abspath(output))
+    assert os.path.isdir(output_dir), f"Directory '{output_dir}' does not exist."
+
+    def cleaned_chunks():
+        nonlocal imputed
+        first = True
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            if impute_by is not None:
+                missing = chunk[impute].isna()
+                chunk.loc[missing, impute] = chunk.loc[missing, impute_by].map(imputation)
+                imputed += int((missing & chunk[impute].notna()).sum())
+            chunk = chunk[columns].astype(dtypes)
+            chunk.to_csv(output, mode="w" if first else "a", header=first)
+            first = False
+            yield chunk
+
+    if cache:
+        write_cache_chunks(cleaned_chunks(), cache_path_for(output), n_rows, dtypes, output)
+    else:
+        for _ in cleaned_chunks():
+            pass
+
+    report = {"rows": n_rows, "checks": checks, "imputation": imputation.to_dict(),
+              "imputed": imputed, "dtypes": dtypes}
+    logger.info("Cleaned %d rows from %s into %s, %d inconsistent rows, %d imputed values.",
+                n_rows, source, output, int(checks.sum()), imputed)
+    return report
+#%%
+if __name__ == "__main__":
+    # python -m mypackage.organize_data <raw csv file> <output csv file>
+    report = clean(sys.argv[1], sys.argv[2])
+    print(report["checks"].to_string())
+    print(f"{report['rows']} rows, {report['imputed']} imputed values: {report['imputation']}")
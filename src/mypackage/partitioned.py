@@ -0,0 +1,192 @@
+# %%
+import pandas as pd
+import os
+import copy
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from mypackage.streaming import StreamingAnalyzer
+# %%
+# Analyses of a dataset that is split into many csv files with the schema of
+# 'cleaned_data.csv' (e.g. one file per sailing or day). Every file is reduced to
+# the mergeable partial states of a StreamingAnalyzer in a pool of processes,
+# the states of all files are merged into the global results afterwards.
+# A worker reads its file in chunks, so the memory per worker is bounded by the
+# chunksize and never depends on the size of the whole dataset.
+# %%
+def _run_partition(path: str, options: dict):
+    """Computes the partial states of one file (in a worker process)."""
+    return StreamingAnalyzer(path, **options).run()
+
+
+
+class PartitionedAnalyzer:
+    """The PartitionedAnalyzer class provides the analyses of the
+    'StreamingAnalyzer' class for datasets that are split into many csv files,
+    with a result for every file and the exact merged result of all files.
+
+    Counts, survival rates, contingency tables (and the Chi-Square tests),
+    the fare statistics of the ccf pivots and count, mean, std, min and max
+    of 'get_stats' are exact. The percentiles of numerical columns come from
+    merged quantile sketches (see mypackage.sketch).
+
+
+    Attributes
+    ----------
+    paths: list
+        The csv files (the partitions), read with index_col = 0.
+    partitions: dict
+        The StreamingAnalyzer of every file, keyed by its path.
+    total: StreamingAnalyzer
+        The merged states of all files.
+
+
+    Examples
+    --------
+    analyzer = PartitionedAnalyzer("sailings/*.csv", n_jobs = -1).run()
+
+    analyzer.survival_rate("who")
+
+    analyzer.per_partition("survival_rate", "who")
+
+    """
+
+
+    def __init__(self, paths, n_jobs: int = 1, chunksize: int = 100_000, categorical: list = None,
+                 pairs: list = None, max_levels: int = 50, relative_accuracy: float = 0.01):
+        """Initializes the class instance with the given partitions.
+
+
+        Parameters
+        ----------
+        paths: str or list
+            A glob pattern (e.g. "sailings/*.csv") or a list of csv files.
+        n_jobs: int
+            The number of worker processes (-1 = all cores). With 1 the files
+            are processed in the current process.
+        chunksize: int
+            The number of rows per chunk when a file is read.
+        categorical, pairs, max_levels, relative_accuracy:
+            See 'StreamingAnalyzer'. The defaults of 'categorical' and 'pairs'
+            are decided on the first chunk of the first file and then used for
+            all files, so the states of all files can be merged.
+
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = sorted(glob.glob(os.fspath(paths)))
+        self.paths = [os.fspath(path) for path in paths]
+        # ensure that there is something to analyze
+        assert self.paths, "There are no partitions."
+        assert chunksize > 0, "The chunksize must be positive."
+
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.chunksize = chunksize
+        self._options = {"chunksize": chunksize, "categorical": categorical, "pairs": pairs,
+                         "max_levels": max_levels, "relative_accuracy": relative_accuracy}
+        self._done = False
+
+
+    def run(self):
+        """Computes the partial states of every file and merges them.
+
+        The other methods call 'run' automatically on first use.
+
+
+        Returns
+        -------
+        PartitionedAnalyzer
+            The instance itself (to allow chaining).
+
+        """
+        options = dict(self._options)
+        if options["categorical"] is None or options["pairs"] is None:
+            # every partition needs the same states, they are decided once on the first chunk
+            probe = StreamingAnalyzer(self.paths[0], **options)
+            probe._setup(pd.read_csv(self.paths[0], index_col=0, nrows=self.chunksize))
+            options["categorical"], options["pairs"] = probe._categorical, probe._pairs
+
+        # the largest files first, so no worker starts a big file at the end
+        order = sorted(self.paths, key=os.path.getsize, reverse=True)
+        if self.n_jobs == 1:
+            results = [_run_partition(path, options) for path in order]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                results = list(pool.map(_run_partition, order, [options] * len(order)))
+        partitions = dict(zip(order, results))
+        self.partitions = {path: partitions[path] for path in self.paths}
+
+        # the partitions stay untouched, the total is merged into a copy of the first one
+        partitions = list(self.partitions.values())
+        self.total = copy.deepcopy(partitions[0])
+        for partition in partitions[1:]:
+            self.total.merge(partition)
+        self._done = True
+        return self
+
+
+    def _ensure_run(self):
+        if not self._done:
+            self.run()
+
+
+    @property
+    def n_rows(self):
+        self._ensure_run()
+        return self.total.n_rows
+
+
+    def per_partition(self, method: str, *args, **kwargs):
+        """Calls a method (e.g. "survival_rate") on every partition.
+
+
+        Returns
+        -------
+        dict
+            The result of every partition, keyed by its path.
+
+        """
+        self._ensure_run()
+        # check if the method is one of the analyses
+        assert method in ("get_stats", "survival_rate", "ccf_categorization", "ccf_categorization_mean",
+                          "ccf_categorization_count", "contingency_table", "chi_square_test"), \
+            f"Unknown method '{method}'."
+        return {path: getattr(partition, method)(*args, **kwargs) for path, partition in self.partitions.items()}
+
+
+    def get_stats(self, column: str):
+        """Provides statistical summaries of a column of all partitions, see 'StreamingAnalyzer.get_stats'."""
+        self._ensure_run()
+        return self.total.get_stats(column)
+
+
+    def survival_rate(self, group_by_column: str):
+        """Computes the survival rates of all partitions grouped by a categorical variable."""
+        self._ensure_run()
+        return self.total.survival_rate(group_by_column)
+
+
+    def ccf_categorization(self, statistic: str = "mean"):
+        """Computes a statistic of the ticket price per class and embarked town of all partitions."""
+        self._ensure_run()
+        return self.total.ccf_categorization(statistic)
+
+
+    def ccf_categorization_mean(self):
+        """Computes the average ticket price paid per class for every embarked town."""
+        return self.ccf_categorization("mean")
+
+
+    def ccf_categorization_count(self):
+        """Computes the passenger count for every passenger class by embarked towns."""
+        return self.ccf_categorization("count")
+
+
+    def contingency_table(self, column1: str, column2: str):
+        """Returns the contingency table of two categorical columns of all partitions."""
+        self._ensure_run()
+        return self.total.contingency_table(column1, column2)
+
+
+    def chi_square_test(self, column1: str, column2: str):
+        """Does a Chi-Square test on the merged contingency table, see 'StreamingAnalyzer.chi_square_test'."""
+        self._ensure_run()
+        return self.total.chi_square_test(column1, column2)
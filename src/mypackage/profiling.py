@@ -0,0 +1,231 @@
+# %%
+import pandas as pd
+import json
+import time
+import functools
+import contextlib
+import tracemalloc
+# %%
+# Opt-in instrumentation of the Analyzer and Visualizer methods.
+# The instrumented methods and phases only check whether a Profiler is active,
+# so they cost a single global lookup while no Profiler is running.
+# The Profiler is process wide and not meant to be used from several threads
+# at once, work done in worker processes (n_jobs, render_all) is not recorded.
+# %%
+# the running Profiler (None = instrumentation disabled)
+_active = None
+
+_disabled = contextlib.nullcontext()
+# %%
+class _Phase:
+    """Measures one call of a method or one phase inside of a method."""
+
+    __slots__ = ("profiler", "name", "rows", "path", "start", "memory_start", "max_peak")
+
+
+    def __init__(self, profiler, name: str, rows: int = None):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+
+    def __enter__(self):
+        stack = self.profiler._stack
+        self.path = "/".join([phase.name for phase in stack] + [self.name])
+        if self.profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # the peak so far belongs to the enclosing phase
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+            self.max_peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack
+        stack.pop()
+        allocated = peak = None
+        if self.profiler.memory:
+            current, traced_peak = tracemalloc.get_traced_memory()
+            phase_peak = max(self.max_peak, traced_peak)
+            allocated, peak = current - self.memory_start, phase_peak - self.memory_start
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, phase_peak)
+            tracemalloc.reset_peak()
+        self.profiler.records.append({"path": self.path, "name": self.name, "depth": len(stack),
+                                      "time": elapsed, "rows": self.rows,
+                                      "allocated": allocated, "peak": peak})
+        return False
+
+
+
+class Profiler:
+    """Records the wall time, the row counts, the allocated memory and the
+    cache hits and misses of the instrumented methods while it is active.
+
+    Every call of an instrumented method and every phase inside of it
+    (e.g. 'crosstab', 'chi2_contingency' and 'cramers_v' in 'chi_square_test')
+    becomes one record. Nested calls are identified by their path,
+    e.g. 'Analyzer.ccf_categorization/Analyzer.aggregate/groupby'.
+
+
+    Attributes
+    ----------
+    memory: bool
+        Whether the allocated bytes are measured with tracemalloc
+        (this slows the measured code down).
+    records: list
+        One dict per call or phase: 'path', 'name', 'depth', 'time' (seconds),
+        'rows' (of the dataset), 'allocated' (bytes still allocated at the end)
+        and 'peak' (the largest number of additionally allocated bytes).
+    caches: dict
+        The hits and misses per cache, e.g. {"aggregations": {"hit": 3, "miss": 1}}.
+
+
+    Examples
+    --------
+    with Profiler(memory=True) as profiler:
+        analyzer.chi_square_test("sex", "pclass")
+        analyzer.ccf_categorization_mean()
+
+    profiler.summary()
+
+    profiler.to_json("profile.json")
+
+    """
+
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.records = []
+        self.caches = {}
+        self._stack = []
+        self._previous = None
+        self._tracing = False
+
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        _active = self
+        return self
+
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        return False
+
+
+    def to_frame(self):
+        """Returns the records as a DataFrame (one row per call or phase, in the order they ended)."""
+        return pd.DataFrame(self.records, columns=["path", "name", "depth", "time", "rows", "allocated", "peak"])
+
+
+    def summary(self):
+        """Aggregates the records per path.
+
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per path, sorted by the total time: 'calls', 'total_time',
+            'mean_time', 'max_time', 'rows' (the largest dataset),
+            'allocated' (the sum) and 'peak' (the largest).
+
+        """
+        grouped = self.to_frame().groupby("path", sort=False)
+        table = pd.DataFrame({
+            "calls": grouped.size(),
+            "total_time": grouped["time"].sum(),
+            "mean_time": grouped["time"].mean(),
+            "max_time": grouped["time"].max(),
+            "rows": grouped["rows"].max(),
+            "allocated": grouped["allocated"].sum(min_count=1),
+            "peak": grouped["peak"].max(),
+        })
+        return table.sort_values("total_time", ascending=False)
+
+
+    def cache_stats(self):
+        """Returns the hits, misses and the hit rate of every cache as a DataFrame."""
+        table = pd.DataFrame.from_dict(self.caches, orient="index", columns=["hit", "miss"]).fillna(0).astype(int)
+        table["hit_rate"] = table["hit"] / (table["hit"] + table["miss"])
+        return table
+
+
+    def to_dict(self):
+        """Returns the records and the cache counts as plain Python objects (e.g. for a metrics system)."""
+        return {"records": [dict(record) for record in self.records],
+                "caches": {name: dict(counts) for name, counts in self.caches.items()}}
+
+
+    def to_json(self, path: str = None):
+        """Returns the records and the cache counts as a JSON string, or writes them to a file."""
+        text = json.dumps(self.to_dict())
+        if path is None:
+            return text
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+# %%
+def phase(name: str, rows: int = None):
+    """Returns a context manager that measures a phase of an instrumented method.
+
+
+    Parameters
+    ----------
+    name: str
+        The name of the phase, e.g. "groupby".
+    rows: int
+        The number of rows the phase works on (optional).
+
+
+    Examples
+    --------
+    with profiling.phase("crosstab"):
+        table = pd.crosstab(data[column1], data[column2])
+
+    """
+    if _active is None:
+        return _disabled
+    return _Phase(_active, name, rows)
+
+
+
+def cache_access(cache: str, hit: bool):
+    """Counts a hit or a miss of a cache."""
+    if _active is None:
+        return
+    counts = _active.caches.setdefault(cache, {"hit": 0, "miss": 0})
+    counts["hit" if hit else "miss"] += 1
+
+
+
+def profiled(method):
+    """Decorator that measures every call of a method while a Profiler is active.
+
+    The number of rows comes from the 'n_rows' attribute of the instance (if it has one).
+
+    """
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _active is None:
+            return method(self, *args, **kwargs)
+        with _Phase(_active, name, getattr(self, "n_rows", None)):
+            return method(self, *args, **kwargs)
+
+    return wrapper
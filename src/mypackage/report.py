@@ -0,0 +1,448 @@
+# %%
+import pandas as pd
+import numpy as np
+import itertools
+from mypackage import contingency, profiling
+# %%
+# A report asks for many results of the same dataset at once (the statistics of
+# every column, survival rates, the ccf pivots, a few Chi-Square tests, ...).
+# Called one by one, every method scans the dataset again and factorizes its
+# key columns again. 'compute_report' plans all outputs together instead: every
+# key column is factorized once, every group-by is reduced to the requested
+# statistics of all its value columns with np.bincount over shared group codes
+# and every contingency table is counted from the same codes.
+# %%
+# the columns of the Chi-Square tests of the default report (all pairs)
+REPORT_COLUMNS = ("survived", "pclass", "sex", "who", "embark_town", "alone")
+
+# the outputs of 'Analyzer.report' without a spec
+DEFAULT_REPORT = {
+    "stats": "all",
+    "survival_rate": ("pclass", "sex", "who", "embark_town", "alone"),
+    "ccf": ("mean", "count"),
+    "chi_square": tuple(itertools.combinations(REPORT_COLUMNS, 2)),
+}
+
+# the statistics of a group-by that are computed from the shared group codes,
+# any other statistic known to pandas' groupby.agg is computed by a group-by
+FUSED_STATISTICS = ("count", "sum", "mean", "std", "var", "min", "max", "median")
+
+# the group keys and the value column of the ccf pivots (see 'Analyzer.ccf_categorization')
+CCF_KEYS = ("embark_town", "pclass")
+CCF_COLUMN = "fare"
+
+# the largest number of cells of the joint counts of all key columns (see '_JointCounts')
+MAX_JOINT_CELLS = 1 << 22
+# %%
+class Report:
+    """The results of 'Analyzer.report'.
+
+
+    Attributes
+    ----------
+    stats: dict
+        The statistical summary of every column (like 'get_stats'), keyed by column.
+    survival_rates: dict
+        The survival rates per group (like 'survival_rate'), keyed by the group column.
+    ccf: dict
+        The ccf pivot of every statistic (like 'ccf_categorization'), keyed by the statistic.
+    aggregates: dict
+        The group statistics (like 'aggregate'), keyed by (group columns, column).
+    chi_square: pandas.DataFrame
+        One row per Chi-Square test with the columns 'column1', 'column2',
+        'n', 'chi2', 'dof', 'p' and 'v' (like 'chi_square_test', nothing is printed).
+
+    """
+
+
+    def __init__(self, stats: dict = None, survival_rates: dict = None, ccf: dict = None,
+                 aggregates: dict = None, chi_square: pd.DataFrame = None):
+        self.stats = stats or {}
+        self.survival_rates = survival_rates or {}
+        self.ccf = ccf or {}
+        self.aggregates = aggregates or {}
+        self.chi_square = chi_square
+
+
+    def __repr__(self):
+        tests = 0 if self.chi_square is None else len(self.chi_square)
+        return (f"Report({len(self.stats)} column statistics, {len(self.survival_rates)} survival rates, "
+                f"{len(self.ccf)} ccf pivots, {len(self.aggregates)} aggregations, {tests} chi-square tests)")
+# %%
+def normalize_spec(spec: dict, columns):
+    """Checks a report spec and fills in the defaults.
+
+
+    Parameters
+    ----------
+    spec: dict
+        Any of the keys
+        'stats': a list of columns or "all",
+        'survival_rate': a list of group columns,
+        'ccf': a list of statistics of the ccf pivots (e.g. ["mean", "count"]),
+        'aggregate': a list of (group columns, column, statistics),
+        'chi_square': a list of pairs of columns.
+        None is the default report (DEFAULT_REPORT).
+    columns: pandas.Index
+        The columns of the dataset.
+
+
+    Returns
+    -------
+    dict
+        The spec with every key, all values as tuples.
+
+    """
+    spec = DEFAULT_REPORT if spec is None else spec
+    # check if the spec only asks for known outputs
+    unknown = set(spec) - {"stats", "survival_rate", "ccf", "aggregate", "chi_square"}
+    assert not unknown, f"Unknown report outputs: {sorted(unknown)}."
+
+    stats = spec.get("stats", ())
+    stats = tuple(columns) if isinstance(stats, str) and stats == "all" else tuple(stats)
+    aggregates = []
+    for group_by, column, statistics in spec.get("aggregate", ()):
+        group_by = (group_by,) if isinstance(group_by, str) else tuple(group_by)
+        statistics = (statistics,) if isinstance(statistics, str) else tuple(statistics)
+        aggregates.append((group_by, column, statistics))
+    normalized = {"stats": stats,
+                  "survival_rate": tuple(spec.get("survival_rate", ())),
+                  "ccf": tuple(spec.get("ccf", ())),
+                  "aggregate": tuple(aggregates),
+                  "chi_square": tuple(tuple(pair) for pair in spec.get("chi_square", ()))}
+
+    # check if every test compares two different columns
+    assert all(len(pair) == 2 and pair[0] != pair[1] for pair in normalized["chi_square"]), \
+        "Every Chi-Square test needs two different columns."
+
+    used = set(normalized["stats"]) | set(normalized["survival_rate"])
+    used |= {name for pair in normalized["chi_square"] for name in pair}
+    used |= {name for group_by, column, _ in normalized["aggregate"] for name in group_by + (column,)}
+    if normalized["ccf"]:
+        used |= set(CCF_KEYS) | {CCF_COLUMN}
+    if normalized["survival_rate"]:
+        used.add("survived")
+    # check if the requested columns exist in the dataset
+    for name in sorted(used, key=str):
+        assert name in columns, f"Column '{name}' does not exist in the dataset."
+    return normalized
+
+
+
+def _is_categorical(dtype):
+    """Whether 'describe' summarizes a column with count, unique, top and freq."""
+    return pd.api.types.is_bool_dtype(dtype) or not (pd.api.types.is_numeric_dtype(dtype)
+                                                     or pd.api.types.is_datetime64_any_dtype(dtype))
+
+
+
+def _is_counted(dtype):
+    """Whether the 'describe' of a column is computed from the number of rows per value."""
+    return _is_categorical(dtype) or (isinstance(dtype, np.dtype) and pd.api.types.is_integer_dtype(dtype))
+
+
+
+def describe_counts(levels, counts, name: str):
+    """The 'describe' of a categorical column from the number of rows of every level.
+
+    Returns None if several levels are the most frequent one, pandas picks
+    one of them by the order of its sort.
+
+    """
+    if counts.size == 0 or (counts == counts.max()).sum() > 1:
+        return None
+    top = int(counts.argmax())
+    return pd.Series([int(counts.sum()), int((counts > 0).sum()), levels[top], int(counts[top])],
+                     index=["count", "unique", "top", "freq"], dtype=object, name=name)
+
+
+
+def describe_levels(levels, counts, name: str):
+    """The 'describe' of an integer column from the number of rows of every value."""
+    n = int(counts.sum())
+    if n == 0:
+        return None
+    values = levels.to_numpy(dtype=float)
+    mean = (values * counts).sum() / n
+    std = np.sqrt((counts * (values - mean) ** 2).sum() / (n - 1)) if n > 1 else np.nan
+    # the two values around every percentile (numpy's linear interpolation) from the cumulative counts
+    positions = np.array([0.25, 0.5, 0.75]) * (n - 1)
+    below = np.floor(positions)
+    ends = np.cumsum(counts)
+    lower = values[np.searchsorted(ends, below, side="right")]
+    upper = values[np.searchsorted(ends, np.minimum(below + 1, n - 1), side="right")]
+    fraction = positions - below
+    percentiles = np.where(fraction >= 0.5, upper - (upper - lower) * (1 - fraction),
+                           lower + (upper - lower) * fraction)
+    present = values[counts > 0]
+    return pd.Series([n, mean, std, present[0], *percentiles, present[-1]],
+                     index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"], name=name)
+
+
+
+class _JointCounts:
+    """The number of rows (and of survivors) of every combination of the key columns.
+
+    All combinations are counted in one pass over the rows, the missing
+    values are the level 0 of every column. Every contingency table, the
+    level counts and the survival rates of the key columns are margins of
+    these counts, so they don't need another pass.
+
+    """
+
+
+    def __init__(self, codes: dict, names: list, survived=None):
+        self.names = list(names)
+        shape = tuple(len(codes[name][1]) + 1 for name in self.names)
+        size = int(np.prod(shape, dtype=np.int64))
+        # the position of the combination of every row (like np.ravel_multi_index, in place)
+        flat = codes[self.names[0]][0] + 1
+        for name, levels in zip(self.names[1:], shape[1:]):
+            flat *= levels
+            flat += codes[name][0]
+            flat += 1
+        self.counts = np.bincount(flat, minlength=size).reshape(shape)
+        self.survivors = self.survived = None
+        if survived is not None:
+            present = ~np.isnan(survived)
+            if present.all():
+                self.survivors = np.bincount(flat, weights=survived, minlength=size).reshape(shape)
+                self.survived = self.counts
+            else:
+                self.survivors = np.bincount(flat[present], weights=survived[present], minlength=size).reshape(shape)
+                self.survived = np.bincount(flat[present], minlength=size).reshape(shape)
+
+
+    def margin(self, cells, names: list):
+        """Sums cells over all other columns, without the missing values of the kept columns."""
+        axes = [self.names.index(name) for name in names]
+        margin = cells.sum(axis=tuple(axis for axis in range(cells.ndim) if axis not in axes))
+        # the kept axes are in the order of the cells, put them into the requested order
+        margin = margin.transpose(np.argsort(np.argsort(axes)))
+        return margin[(slice(1, None),) * len(names)]
+
+
+
+def group_codes(codes: list, n_levels: list):
+    """Combines the codes of the key columns to a dense group number per row.
+
+
+    Returns
+    -------
+    valid: numpy.ndarray
+        The rows without a missing key.
+    groups: numpy.ndarray
+        The group of every valid row.
+    cells: list
+        The level position of every key column per group, the groups are
+        sorted like the groups of a (sorted) pandas group-by.
+
+    """
+    valid = np.logical_and.reduce([column_codes >= 0 for column_codes in codes])
+    shape = tuple(n_levels)
+    flat = np.ravel_multi_index(tuple(column_codes[valid] for column_codes in codes), shape)
+    size = int(np.prod(shape, dtype=np.int64))
+    if size <= max(flat.size, 1 << 16):
+        # few possible combinations: renumber the observed ones with a bincount
+        present = np.bincount(flat, minlength=size) > 0
+        cells = np.flatnonzero(present)
+        groups = (np.cumsum(present) - 1)[flat]
+    else:
+        cells, groups = np.unique(flat, return_inverse=True)
+    return valid, groups, list(np.unravel_index(cells, shape))
+
+
+
+def group_index(keys, levels: list, cells: list):
+    """The index of the groups of 'group_codes', like the index of a pandas group-by."""
+    if len(keys) == 1:
+        return levels[0].take(cells[0]).rename(keys[0])
+    return pd.MultiIndex.from_arrays([column_levels.take(cell) for column_levels, cell in zip(levels, cells)],
+                                     names=list(keys))
+
+
+
+def group_statistics(values, groups, n_groups: int, statistics: tuple):
+    """Computes statistics of a column per group with one bincount per statistic.
+
+    Sums, means and variances are computed in the order of the rows, so they
+    can differ from pandas in the last digits; count, min, max and median
+    are exact.
+
+    """
+    dtype = values.dtype
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    groups, values = groups[present], values[present]
+
+    count = np.bincount(groups, minlength=n_groups)
+    result = {"count": count}
+    empty = count == 0
+    if {"sum", "mean", "std", "var"} & set(statistics):
+        total = np.bincount(groups, weights=values, minlength=n_groups)
+        result["sum"] = total
+        mean = np.divide(total, count, out=np.full(n_groups, np.nan), where=~empty)
+        result["mean"] = mean
+        if {"std", "var"} & set(statistics):
+            # two passes (mean first) like pandas, the squares of large values don't cancel
+            deviations = values - mean[groups]
+            squares = np.bincount(groups, weights=deviations * deviations, minlength=n_groups)
+            var = np.divide(squares, count - 1, out=np.full(n_groups, np.nan), where=count > 1)
+            result["var"] = var
+            result["std"] = np.sqrt(var)
+    if {"min", "max", "median"} & set(statistics):
+        # one sort by group and value serves all order statistics
+        ordered = values[np.lexsort((values, groups))]
+        start = np.cumsum(count) - count
+        last = np.maximum(start + count - 1, 0)
+        nan = np.full(n_groups, np.nan)
+        if ordered.size:
+            result["min"] = np.where(empty, np.nan, ordered[np.minimum(start, ordered.size - 1)])
+            result["max"] = np.where(empty, np.nan, ordered[np.minimum(last, ordered.size - 1)])
+            lower = ordered[np.minimum(start + np.maximum(count - 1, 0) // 2, ordered.size - 1)]
+            upper = ordered[np.minimum(start + count // 2, ordered.size - 1)]
+            result["median"] = np.where(empty, np.nan, (lower + upper) / 2)
+        else:
+            result["min"], result["max"], result["median"] = nan, nan, nan
+
+    if (pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)) and not empty.any():
+        # the dtypes of pandas for columns without missing values
+        if "sum" in result:
+            result["sum"] = result["sum"].round().astype(np.int64)
+        for statistic in ("min", "max"):
+            if statistic in result:
+                result[statistic] = result[statistic].astype(dtype)
+    return {statistic: result[statistic] for statistic in statistics}
+
+
+
+def _group_by(data, keys: tuple, columns: dict, codes: dict):
+    """Computes the requested statistics of all value columns of one group-by."""
+    valid, groups, cells = group_codes([codes[key][0] for key in keys], [len(codes[key][1]) for key in keys])
+    n_groups = len(cells[0])
+    index = group_index(keys, [codes[key][1] for key in keys], cells)
+
+    tables = {}
+    for column, statistics in columns.items():
+        fused = tuple(statistic for statistic in statistics if statistic in FUSED_STATISTICS)
+        with profiling.phase("bincount"):
+            table = pd.DataFrame(group_statistics(data[column].to_numpy()[valid], groups, n_groups, fused),
+                                 index=index)
+        others = [statistic for statistic in statistics if statistic not in FUSED_STATISTICS]
+        if others:
+            with profiling.phase("groupby"):
+                rest = data.groupby(list(keys), observed=True)[column].agg(others)
+            for statistic in others:
+                table[statistic] = rest[statistic].to_numpy()
+        tables[column] = table[list(statistics)]
+    return tables
+
+
+
+def compute_report(data: pd.DataFrame, spec: dict = None):
+    """Computes all outputs of a report spec together (see 'Analyzer.report').
+
+
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        The dataset.
+    spec: dict
+        The outputs of the report, see 'normalize_spec'.
+
+
+    Returns
+    -------
+    Report
+        The results of all outputs.
+
+    """
+    spec = normalize_spec(spec, data.columns)
+
+    # plan: the statistics of every value column per group keys, so group-bys with the same keys share one pass
+    plan = {}
+    for column in spec["survival_rate"]:
+        plan.setdefault((column,), {}).setdefault("survived", set()).add("mean")
+    for statistic in spec["ccf"]:
+        plan.setdefault(CCF_KEYS, {}).setdefault(CCF_COLUMN, set()).add(statistic)
+    for group_by, column, statistics in spec["aggregate"]:
+        plan.setdefault(group_by, {}).setdefault(column, set()).update(statistics)
+
+    # every key column is factorized once
+    keys = {name for group_by in plan for name in group_by}
+    keys |= {name for pair in spec["chi_square"] for name in pair}
+    keys |= {name for name in spec["stats"] if _is_counted(data[name].dtype)}
+    with profiling.phase("factorize"):
+        codes = {name: contingency.factorize(data[name]) for name in sorted(keys, key=str)}
+
+    # the survival rates, contingency tables and level counts of the key columns come from their joint counts
+    names = sorted({name for name in keys if (name,) in plan} | {name for pair in spec["chi_square"] for name in pair}
+                   | {name for name in spec["stats"] if _is_categorical(data[name].dtype)}, key=str)
+    joint = None
+    if names and np.prod([len(codes[name][1]) + 1 for name in names], dtype=float) <= MAX_JOINT_CELLS:
+        with profiling.phase("joint counts"):
+            survived = (data["survived"].to_numpy(dtype=float, na_value=np.nan)
+                        if spec["survival_rate"] else None)
+            joint = _JointCounts(codes, names, survived)
+        for column in spec["survival_rate"]:
+            if plan[(column,)].keys() == {"survived"} and plan[(column,)]["survived"] == {"mean"}:
+                del plan[(column,)]
+
+    report = Report()
+    for name in spec["stats"]:
+        summary = None
+        if name in codes and _is_counted(data[name].dtype):
+            # the number of rows per value, from the joint counts or from the codes of the column
+            with profiling.phase("counts"):
+                column_codes, levels = codes[name]
+                if joint is not None and name in names:
+                    counts = joint.margin(joint.counts, [name])
+                else:
+                    counts = np.bincount(column_codes[column_codes >= 0], minlength=len(levels))
+                describe = describe_counts if _is_categorical(data[name].dtype) else describe_levels
+                summary = describe(levels, counts, name)
+        if summary is None:
+            with profiling.phase("describe"):
+                summary = data[name].describe()
+        report.stats[name] = summary
+
+    groups = {}
+    for group_by, columns in plan.items():
+        # the statistics are in a fixed order, the outputs pick their columns
+        columns = {column: tuple(statistic for statistic in dict.fromkeys(FUSED_STATISTICS + tuple(sorted(wanted)))
+                                 if statistic in wanted)
+                   for column, wanted in columns.items()}
+        groups[group_by] = _group_by(data, group_by, columns, codes)
+    for column in spec["survival_rate"]:
+        if (column,) in groups:
+            report.survival_rates[column] = groups[(column,)]["survived"]["mean"].rename("survived")
+            continue
+        present = np.flatnonzero(joint.margin(joint.counts, [column]))
+        survivors = joint.margin(joint.survivors, [column])[present]
+        survived = joint.margin(joint.survived, [column])[present]
+        rates = np.divide(survivors, survived, out=np.full(present.size, np.nan), where=survived > 0)
+        report.survival_rates[column] = pd.Series(rates, index=codes[column][1].take(present).rename(column),
+                                                  name="survived")
+    for statistic in spec["ccf"]:
+        table = groups[CCF_KEYS][CCF_COLUMN][[statistic]].reset_index()
+        with profiling.phase("pivot"):
+            report.ccf[statistic] = table.pivot(index=CCF_KEYS[0], columns=CCF_KEYS[1], values=statistic)
+    for group_by, column, statistics in spec["aggregate"]:
+        report.aggregates[(group_by, column)] = groups[group_by][column][list(statistics)]
+
+    if spec["chi_square"]:
+        with profiling.phase("count"):
+            if joint is not None:
+                tables = [joint.margin(joint.counts, list(pair)) for pair in spec["chi_square"]]
+            else:
+                tables = [contingency.contingency_counts(codes[column1][0], len(codes[column1][1]),
+                                                         codes[column2][0], len(codes[column2][1]))
+                          for column1, column2 in spec["chi_square"]]
+        with profiling.phase("statistics"):
+            chi2, dof, n, min_dim = contingency.chi2_statistics(contingency.stack_tables(tables))
+            p = contingency.chi2_pvalues(chi2, dof)
+            v = contingency.cramers_v_values(chi2, n, min_dim)
+        report.chi_square = pd.DataFrame({"column1": [pair[0] for pair in spec["chi_square"]],
+                                          "column2": [pair[1] for pair in spec["chi_square"]],
+                                          "n": n.astype("int64"), "chi2": chi2, "dof": dof, "p": p, "v": v})
+    return report
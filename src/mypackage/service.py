@@ -0,0 +1,333 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import functools
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from mypackage.dataset import csv_path, load_data, file_fingerprint
+# %%
+# A local HTTP/JSON service around the Analyzer and headless Visualizer rendering,
+# built on asyncio only (no web framework needed).
+#
+# - the methods run in a pool of worker processes, every worker loads the
+#   (memory-mapped) dataset once,
+# - concurrent identical requests wait for one computation,
+# - results are kept in an LRU cache keyed by the fingerprint of the dataset
+#   and the request.
+#
+# python -m mypackage.service --data cleaned_data.csv --port 8000 --workers 4
+#
+# curl -X POST localhost:8000/analyze -d '{"method": "survival_rate", "args": ["who"]}'
+# curl -X POST localhost:8000/analyze -d '{"method": "survival_rate", "args": ["alone"], "where": {"sex": "female"}}'
+# curl -X POST localhost:8000/plot -d '{"method": "ccf_mean_heatmap", "format": "svg"}' -o ccf.svg
+# %%
+logger = logging.getLogger(__name__)
+
+# the Analyzer methods that can be requested
+ANALYZER_METHODS = ("get_stats", "aggregate", "chi_square_test", "chi_square_tests", "association_matrix",
+                    "ccf_categorization", "ccf_categorization_mean", "ccf_categorization_count", "survival_rate")
+
+# the methods of a 'where' view (see Analyzer.where)
+VIEW_METHODS = ("get_stats", "aggregate", "chi_square_test", "ccf_categorization", "ccf_categorization_mean",
+                "ccf_categorization_count", "survival_rate")
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf", "json": "application/json"}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+# %%
+def _jsonable(value):
+    """Converts a result of an Analyzer method into plain Python objects."""
+    if isinstance(value, pd.DataFrame):
+        table = json.loads(value.to_json(orient="split", date_format="iso"))
+        return {"index": table["index"], "index_names": list(value.index.names),
+                "columns": table["columns"], "data": table["data"]}
+    if isinstance(value, pd.Series):
+        series = json.loads(value.to_json(orient="split", date_format="iso"))
+        return {"name": value.name, "index": series["index"], "index_names": list(value.index.names),
+                "data": series["data"]}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        # JSON has no NaN
+        return None
+    return value
+# %%
+# the Analyzer and Visualizer of a worker process, built once per worker
+_worker_analyzer = None
+_worker_visualizer = None
+
+
+def _init_worker(path: str):
+    global _worker_analyzer, _worker_visualizer
+    # the plots are rendered into memory, no window is opened
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from mypackage.analysis import Analyzer
+    _worker_analyzer = Analyzer(load_data(path))
+    _worker_visualizer = None
+
+
+def _compute(kind: str, method: str, args: list, kwargs: dict, where: dict, format: str):
+    """Runs one request in a worker and returns its content type and body."""
+    global _worker_visualizer
+    if kind == "plot":
+        # imported on demand, the plotting libraries are only needed for plots
+        from mypackage.visualization import Visualizer, PLOT_METHODS, _render
+        assert method in PLOT_METHODS, f"Unknown plotting method '{method}'."
+        if _worker_visualizer is None:
+            _worker_visualizer = Visualizer(_worker_analyzer.data)
+        body = _render(_worker_visualizer, {"method": method, "args": args, "kwargs": kwargs, "format": format})
+        return CONTENT_TYPES.get(format, "application/octet-stream"), body
+
+    target = _worker_analyzer
+    if where:
+        assert method in VIEW_METHODS, f"'{method}' can't be used with 'where'."
+        target = _worker_analyzer.where(**where)
+    else:
+        assert method in ANALYZER_METHODS, f"Unknown Analyzer method '{method}'."
+    result = getattr(target, method)(*args, **kwargs)
+    return CONTENT_TYPES["json"], json.dumps({"result": _jsonable(result)}).encode()
+# %%
+class AnalysisService:
+    """Serves Analyzer results and Visualizer plots of one dataset over HTTP.
+
+
+    Endpoints
+    ---------
+    POST /analyze
+        {"method": "survival_rate", "args": ["who"], "kwargs": {}, "where": {"sex": "female"}},
+        'where' (optional) runs the method on a view of the rows (see 'Analyzer.where').
+        The response is {"result": ...}, DataFrames and Series are split into
+        'index', 'columns' and 'data'.
+    POST /plot
+        {"method": "plot_survival_rate", "args": ["who"], "format": "png"},
+        the response is the image.
+    POST /reload
+        Fingerprints the dataset file again and restarts the workers if it changed.
+    GET /health
+        The fingerprint of the dataset and the request counters.
+
+
+    Attributes
+    ----------
+    path: str
+        The csv file of the dataset.
+    fingerprint: str
+        The sha256 hash of the dataset file, part of every cache key.
+    cache_size: int
+        The largest number of cached results (least recently used are dropped first).
+    stats: dict
+        'requests', 'hits' (served from the cache), 'coalesced' (waited for
+        an identical running request), 'computed' and 'errors'.
+
+
+    Examples
+    --------
+    service = AnalysisService("cleaned_data.csv", workers = 4)
+
+    asyncio.run(service.serve_forever(port = 8000))
+
+    """
+
+
+    def __init__(self, path: str = None, workers: int = None, cache_size: int = 256):
+        self.path = csv_path if path is None else os.fspath(path)
+        self.workers = workers
+        self.cache_size = cache_size
+        self.fingerprint = file_fingerprint(self.path)["sha256"]
+        self.stats = {"requests": 0, "hits": 0, "coalesced": 0, "computed": 0, "errors": 0}
+        self._cache = collections.OrderedDict()
+        self._running = {}
+        self._pool = None
+
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.path,))
+        return self._pool
+
+
+    def close(self):
+        """Stops the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+    async def reload(self):
+        """Fingerprints the dataset file again, new workers load it if it changed.
+
+        The cached results of the old dataset can't be hit anymore (their keys
+        hold the old fingerprint), they are dropped like any unused result.
+        Hashing the file and stopping the old workers run in threads, so the
+        other requests are served meanwhile (by new workers).
+
+        """
+        loop = asyncio.get_running_loop()
+        fingerprint = (await loop.run_in_executor(None, file_fingerprint, self.path))["sha256"]
+        changed = fingerprint != self.fingerprint
+        if changed:
+            pool, self._pool = self._pool, None
+            self.fingerprint = fingerprint
+            if pool is not None:
+                await loop.run_in_executor(None, functools.partial(pool.shutdown, cancel_futures=True))
+        return changed
+
+
+    async def compute(self, kind: str, request: dict):
+        """Returns the content type and the body of a request, from the cache if possible.
+
+
+        Parameters
+        ----------
+        kind: str
+            "analyze" or "plot".
+        request: dict
+            'method', 'args', 'kwargs', 'where' (analyze) and 'format' (plot).
+
+
+        Returns
+        -------
+        content_type: str
+        body: bytes
+
+        """
+        # check if the request names a method
+        assert isinstance(request.get("method"), str), "The request needs a 'method'."
+        args = request.get("args", [])
+        kwargs = request.get("kwargs", {})
+        where = request.get("where") or {}
+        format = request.get("format", "png") if kind == "plot" else None
+        assert isinstance(args, list) and isinstance(kwargs, dict) and isinstance(where, dict), \
+            "'args' must be a list, 'kwargs' and 'where' must be objects."
+        key = json.dumps([self.fingerprint, kind, request["method"], args, kwargs, where, format], sort_keys=True)
+
+        self.stats["requests"] += 1
+        if key in self._cache:
+            self.stats["hits"] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key in self._running:
+            self.stats["coalesced"] += 1
+        else:
+            self._running[key] = asyncio.ensure_future(
+                self._run(key, kind, request["method"], args, kwargs, where, format))
+        # shielded, so a client that disconnects doesn't cancel the computation of the others
+        return await asyncio.shield(self._running[key])
+
+
+    async def _run(self, key: str, kind: str, *arguments):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor(), _compute, kind, *arguments)
+        finally:
+            del self._running[key]
+        self.stats["computed"] += 1
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+
+    async def handle(self, method: str, path: str, body: bytes):
+        """Answers one HTTP request and returns the status, the content type and the body."""
+        try:
+            if path == "/health":
+                content = {"status": "ok", "path": self.path, "fingerprint": self.fingerprint,
+                           "cached": len(self._cache), "running": len(self._running), **self.stats}
+                return 200, CONTENT_TYPES["json"], json.dumps(content).encode()
+            if path not in ("/analyze", "/plot", "/reload"):
+                return 404, CONTENT_TYPES["json"], json.dumps({"error": f"Unknown path '{path}'."}).encode()
+            if method != "POST":
+                return 405, CONTENT_TYPES["json"], json.dumps({"error": "Use POST."}).encode()
+            if path == "/reload":
+                return 200, CONTENT_TYPES["json"], json.dumps({"changed": await self.reload(),
+                                                               "fingerprint": self.fingerprint}).encode()
+            request = json.loads(body or b"{}")
+            assert isinstance(request, dict), "The request must be a JSON object."
+            return (200, *await self.compute(path.strip("/"), request))
+        except (AssertionError, KeyError, TypeError, ValueError) as error:
+            # invalid requests (unknown methods or columns, wrong arguments, broken JSON)
+            self.stats["errors"] += 1
+            return 400, CONTENT_TYPES["json"], json.dumps({"error": str(error) or type(error).__name__}).encode()
+        except Exception as error:
+            self.stats["errors"] += 1
+            logger.exception("request %s %s failed", method, path)
+            return 500, CONTENT_TYPES["json"], json.dumps({"error": repr(error)}).encode()
+
+
+    async def _connection(self, reader, writer):
+        """Serves the requests of one (keep-alive) connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, content_type, content = await self.handle(method, target.split("?")[0], body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(content)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            # a broken request or a closed connection (also when the server shuts down) ends the connection
+            pass
+        finally:
+            writer.close()
+
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        """Starts listening and returns the asyncio server (port 0 picks a free port)."""
+        # the workers are started (and load the dataset) before the first request
+        self._executor()
+        return await asyncio.start_server(self._connection, host, port)
+
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8000):
+        server = await self.start(host, port)
+        logger.info("serving %s on %s", self.path, ", ".join(str(s.getsockname()) for s in server.sockets))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+# %%
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON service of the Analyzer and Visualizer methods.")
+    parser.add_argument("--data", help="the csv file of the dataset, defaults to the shipped dataset")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="the port to listen on")
+    parser.add_argument("--workers", type=int, help="the number of worker processes, defaults to the cpu cores")
+    parser.add_argument("--cache-size", type=int, default=256, help="the number of cached results")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    service = AnalysisService(args.data, args.workers, args.cache_size)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(service.serve_forever(args.host, args.port))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
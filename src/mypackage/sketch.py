@@ -0,0 +1,194 @@
+# %%
+import pandas as pd
+import numpy as np
+from mypackage.aggregates import Moments
+# %%
+class QuantileSketch:
+    """A mergeable quantile sketch with a relative error bound.
+
+    The values are counted in logarithmically sized buckets
+    (the DDSketch algorithm): bucket i holds the values in
+    (gamma^(i-1), gamma^i] with gamma = (1 + accuracy) / (1 - accuracy).
+    Every quantile that is returned is within 'relative_accuracy' of the
+    true value (relative to the value). Adding values is a vectorized
+    numpy bincount, two sketches are merged by adding their bucket counts,
+    and the memory only depends on the range of the values,
+    not on their number.
+
+
+    Attributes
+    ----------
+    relative_accuracy: float
+        The relative error bound of the quantiles (e.g. 0.01 = 1%).
+    count: int
+        The number of values in the sketch.
+    minimum, maximum: float
+        The exact smallest and largest value.
+
+    """
+
+    # values closer to zero than this are counted as zero
+    min_value = 1e-9
+    # values are added in blocks of this size to keep the temporary arrays small
+    block_size = 1 << 20
+
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        # check if the error bound is a valid proportion
+        assert 0 < relative_accuracy < 1, "The relative accuracy must be between 0 and 1."
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.minimum = np.nan
+        self.maximum = np.nan
+        # dense bucket counts, bucket index = offset + position in the array
+        self._positive = (0, np.zeros(0, dtype=np.int64))
+        self._negative = (0, np.zeros(0, dtype=np.int64))
+
+
+    @classmethod
+    def from_values(cls, values, relative_accuracy: float = 0.01):
+        return cls(relative_accuracy).update(values)
+
+
+    def _bucket(self, values):
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+
+    @staticmethod
+    def _add(store, offset: int, counts):
+        """Adds dense bucket counts (starting at 'offset') to a store."""
+        store_offset, store_counts = store
+        if counts.size == 0:
+            return store
+        if store_counts.size == 0:
+            return offset, counts.copy()
+        start = min(store_offset, offset)
+        end = max(store_offset + store_counts.size, offset + counts.size)
+        merged = np.zeros(end - start, dtype=np.int64)
+        merged[store_offset - start:store_offset - start + store_counts.size] += store_counts
+        merged[offset - start:offset - start + counts.size] += counts
+        return start, merged
+
+
+    def update(self, values):
+        """Adds an array of values (missing values are ignored) and returns the sketch."""
+        values = np.asarray(values, dtype=float).ravel()
+        for start in range(0, values.size, self.block_size):
+            block = values[start:start + self.block_size]
+            block = block[~np.isnan(block)]
+            if block.size == 0:
+                continue
+            self.count += block.size
+            self.minimum = np.fmin(self.minimum, block.min())
+            self.maximum = np.fmax(self.maximum, block.max())
+
+            positive = block[block > self.min_value]
+            negative = -block[block < -self.min_value]
+            self.zero_count += block.size - positive.size - negative.size
+            for name, part in (("_positive", positive), ("_negative", negative)):
+                if part.size:
+                    buckets = self._bucket(part)
+                    offset = buckets.min()
+                    setattr(self, name, self._add(getattr(self, name), offset,
+                                                  np.bincount(buckets - offset)))
+        return self
+
+
+    def merge(self, other):
+        """Merges another sketch (e.g. of another partition) into this sketch and returns this sketch."""
+        # check if both sketches use the same buckets
+        assert self.relative_accuracy == other.relative_accuracy, "Only sketches with the same accuracy can be merged."
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self._positive = self._add(self._positive, *other._positive)
+        self._negative = self._add(self._negative, *other._negative)
+        return self
+
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile(s) of the values.
+
+
+        Parameters
+        ----------
+        q: float or array-like
+            The quantile(s) between 0 and 1.
+
+
+        Returns
+        -------
+        float or numpy.ndarray
+            The approximate quantile(s), NaN if the sketch is empty.
+
+        """
+        q = np.asarray(q, dtype=float)
+        # check if the quantiles are valid proportions
+        assert np.all((q >= 0) & (q <= 1)), "Quantiles must be between 0 and 1."
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+
+        # all buckets in ascending order of their values: negative, zero, positive
+        negative_offset, negative_counts = self._negative
+        positive_offset, positive_counts = self._positive
+        negative_values = -self._representative(negative_offset + np.arange(negative_counts.size))
+        positive_values = self._representative(positive_offset + np.arange(positive_counts.size))
+        values = np.concatenate([negative_values[::-1], [0.0], positive_values])
+        counts = np.concatenate([negative_counts[::-1], [self.zero_count], positive_counts])
+
+        # the value with the rank q * (count - 1), like the lower quantile
+        rank = q * (self.count - 1)
+        position = np.searchsorted(np.cumsum(counts), rank, side="right")
+        result = values[np.minimum(position, values.size - 1)]
+        # the exact minimum and maximum are known, the estimates never leave that range
+        return np.clip(result, self.minimum, self.maximum)[()]
+
+
+    def _representative(self, buckets):
+        """The value in the middle (relative to the error) of the buckets."""
+        return 2 * self.gamma ** buckets.astype(float) / (self.gamma + 1)
+
+
+
+def describe_approximate(values, relative_accuracy: float = 0.01, percentiles=(0.25, 0.5, 0.75), name: str = None):
+    """Computes the statistics of pandas.Series.describe with approximate percentiles.
+
+    The count, mean, std, min and max are exact, the percentiles come from
+    a 'QuantileSketch'.
+
+
+    Parameters
+    ----------
+    values: array-like
+        The values of a numerical column.
+    relative_accuracy: float
+        The relative error bound of the percentiles.
+    percentiles: tuple
+        The percentiles to include in the output.
+    name: str
+        The name of the returned Series.
+
+
+    Returns
+    -------
+    pandas.Series
+        count, mean, std, min, the percentiles and max, indexed like describe().
+
+    """
+    values = np.asarray(values, dtype=float)
+    sketch = QuantileSketch.from_values(values, relative_accuracy)
+    return describe_from_states(Moments.from_values(values), sketch, percentiles, name)
+
+
+
+def describe_from_states(moments, sketch: QuantileSketch, percentiles=(0.25, 0.5, 0.75), name: str = None):
+    """Builds the describe() layout from merged Moments and a QuantileSketch."""
+    labels = [f"{p * 100:g}%" for p in percentiles]
+    exact = moments.describe()
+    quantiles = np.atleast_1d(sketch.quantile(list(percentiles)))
+    data = [exact["count"], exact["mean"], exact["std"], exact["min"], *quantiles, exact["max"]]
+    return pd.Series(data, index=["count", "mean", "std", "min", *labels, "max"], name=name, dtype=float)
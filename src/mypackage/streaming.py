@@ -0,0 +1,311 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+import logging
+import itertools
+from mypackage import contingency
+from mypackage.aggregates import Moments, ValueCounts, GroupMoments, ContingencyCounts
+from mypackage.sketch import QuantileSketch, describe_from_states
+# %%
+logger = logging.getLogger(__name__)
+# %%
+class StreamingAnalyzer:
+    """The StreamingAnalyzer class provides the analyses of the 'Analyzer'
+    class for datasets that don't fit into memory.
+
+    The dataset is read in chunks. A single pass over all chunks computes
+    mergeable partial states (see mypackage.aggregates) for every column,
+    every group-by column and every pair of categorical columns, all results
+    are then derived from these states.
+
+
+    Attributes
+    ----------
+    source: str or iterable
+        The path of a csv file (read with index_col = 0 like 'cleaned_data.csv')
+        or an iterable of pandas DataFrames (the chunks).
+    chunksize: int
+        The number of rows per chunk when a csv file is read.
+
+    """
+
+
+    def __init__(self, source, chunksize: int = 100_000, categorical: list = None,
+                 pairs: list = None, max_levels: int = 50, relative_accuracy: float = 0.01):
+        """Initializes the class instance with the given data source.
+
+
+        Parameters
+        ----------
+        source: str or iterable
+            The path of a csv file or an iterable of pandas DataFrames.
+        chunksize: int
+            The number of rows per chunk when a csv file is read.
+        categorical: list
+            The names of the categorical columns. Defaults to the string and
+            boolean columns and the integer columns with at most 'max_levels'
+            distinct values in the first chunk.
+        pairs: list
+            The pairs of columns for 'chi_square_test'. Defaults to all
+            pairs of categorical columns.
+        max_levels: int
+            See 'categorical'.
+        relative_accuracy: float
+            The relative error bound of the percentiles in 'get_stats'.
+
+        """
+        # check if the source is a file path or an iterable of chunks
+        is_path = isinstance(source, (str, os.PathLike))
+        assert is_path or hasattr(source, "__iter__"), "Source must be a file path or an iterable of DataFrames."
+        assert chunksize > 0, "The chunksize must be positive."
+
+        self.source = source
+        self.chunksize = chunksize
+        self._categorical = categorical
+        self._pairs = pairs
+        self._max_levels = max_levels
+        self._relative_accuracy = relative_accuracy
+        self._done = False
+
+
+    def _chunks(self):
+        if isinstance(self.source, (str, os.PathLike)):
+            return pd.read_csv(self.source, index_col=0, chunksize=self.chunksize)
+        return iter(self.source)
+
+
+    def _setup(self, chunk: pd.DataFrame):
+        """Decides which states are needed, based on the first chunk."""
+        self.columns = list(chunk.columns)
+        if self._categorical is None:
+            self._categorical = []
+            for name, dtype in chunk.dtypes.items():
+                if isinstance(dtype, pd.CategoricalDtype) or dtype == object or dtype == bool:
+                    self._categorical.append(name)
+                elif pd.api.types.is_integer_dtype(dtype) and chunk[name].nunique() <= self._max_levels:
+                    self._categorical.append(name)
+        if self._pairs is None:
+            self._pairs = list(itertools.combinations(self._categorical, 2))
+
+        # like pandas' describe, the statistics depend on the dtype and not on the categorical columns
+        numerical = [name for name, dtype in chunk.dtypes.items()
+                     if pd.api.types.is_numeric_dtype(dtype) and dtype != bool]
+        self._moments = {name: Moments() for name in numerical}
+        self._sketches = {name: QuantileSketch(self._relative_accuracy) for name in numerical}
+        self._value_counts = {name: ValueCounts() for name in self.columns if name not in numerical}
+        self._survival = {}
+        if "survived" in self.columns:
+            self._survival = {name: GroupMoments() for name in self._categorical if name != "survived"}
+        self._fares = GroupMoments() if {"embark_town", "pclass", "fare"} <= set(self.columns) else None
+        self._contingency = {tuple(pair): ContingencyCounts() for pair in self._pairs}
+
+
+    def run(self):
+        """Reads the dataset once and computes all partial states.
+
+        The other methods call 'run' automatically on first use. A file source
+        is read again by every call of 'run', an iterator source can only be
+        read once.
+
+
+        Returns
+        -------
+        StreamingAnalyzer
+            The instance itself (to allow chaining).
+
+        """
+        self.n_rows = 0
+        first = True
+        for chunk in self._chunks():
+            if first:
+                self._setup(chunk)
+                first = False
+            self._update(chunk)
+
+        # ensure that the dataset is not empty
+        assert not first and self.n_rows > 0, "The dataset must not be empty."
+        self._done = True
+        return self
+
+
+    def _update(self, chunk: pd.DataFrame):
+        """Adds a chunk to all partial states."""
+        self.n_rows += len(chunk)
+        for name, state in self._moments.items():
+            values = chunk[name].to_numpy(dtype=float, na_value=np.nan)
+            state.update(values)
+            self._sketches[name].update(values)
+        for name, state in self._value_counts.items():
+            state.update(chunk[name])
+        for name, state in self._survival.items():
+            state.update(chunk, name, "survived")
+        if self._fares is not None:
+            self._fares.update(chunk, ["embark_town", "pclass"], "fare")
+        for (column1, column2), state in self._contingency.items():
+            state.update(chunk, column1, column2)
+
+
+    def merge(self, other):
+        """Merges the partial states of another part of the dataset into this instance.
+
+        Both instances need the same columns, categorical columns and pairs
+        (e.g. passed explicitly with 'categorical' and 'pairs'). The merged
+        results are the results of the concatenated parts.
+
+
+        Returns
+        -------
+        StreamingAnalyzer
+            The instance itself (to allow chaining).
+
+        """
+        self._ensure_run()
+        other._ensure_run()
+        # check if both parts have the same states
+        assert (self.columns == other.columns and set(self._moments) == set(other._moments)
+                and set(self._survival) == set(other._survival) and set(self._contingency) == set(other._contingency)), \
+            "Only parts with the same columns, categorical columns and pairs can be merged."
+        self.n_rows += other.n_rows
+        for name, state in self._moments.items():
+            state.merge(other._moments[name])
+            self._sketches[name].merge(other._sketches[name])
+        for name, state in self._value_counts.items():
+            state.merge(other._value_counts[name])
+        for name, state in self._survival.items():
+            state.merge(other._survival[name])
+        if self._fares is not None:
+            self._fares.merge(other._fares)
+        for pair, state in self._contingency.items():
+            state.merge(other._contingency[pair])
+        return self
+
+
+    def _ensure_run(self):
+        if not self._done:
+            self.run()
+
+
+    def get_stats(self, column: str):
+        """Provides statistical summaries for a specific column in the dataset.
+
+        Like 'Analyzer.get_stats', but the percentiles of numerical columns
+        are approximated with a quantile sketch (exact percentiles can't be
+        computed in one pass with constant memory).
+
+
+        Parameters
+        ----------
+        column: str
+            The name of the column to analyze.
+
+
+        Returns
+        -------
+        pandas.Series
+            numerical variables: count, mean, std, min, 25%, 50%, 75%, max
+            categorial variables: count, unique, top, freq
+
+        """
+        self._ensure_run()
+        # check if the passed column exists in the dataset
+        assert column in self.columns, f"Column '{column}' does not exist in the dataset."
+        if column in self._moments:
+            return describe_from_states(self._moments[column], self._sketches[column], name=column)
+        assert column in self._value_counts, f"Column '{column}' is not numerical or categorical."
+        return self._value_counts[column].describe(name=column)
+
+
+    def survival_rate(self, group_by_column: str):
+        """Computes survival rates grouped by a categorical variable.
+
+
+        Parameters
+        ----------
+        group_by_column: str
+            The name of the column used to group survival rates.
+            This should be one of the categorical columns.
+
+
+        Returns
+        -------
+        pandas.Series
+            A Series containing the survival rates for each category of the
+            categorical variable.
+
+        """
+        self._ensure_run()
+        # check if the column used to group the survival rates exists in the dataset
+        assert group_by_column in self.columns, f"Column '{group_by_column}' does not exist in the dataset."
+        assert group_by_column in self._survival, f"Column '{group_by_column}' is not a categorical column."
+        return self._survival[group_by_column].statistic("mean").rename("survived")
+
+
+    def ccf_categorization(self, statistic: str = "mean"):
+        """Computes a statistic ('mean', 'min', 'max', 'count', 'std' or 'var') of the
+        ticket price per class for every embarked town.
+
+
+        Returns
+        -------
+        pandas.DataFrame
+            pivot-table with the embarked towns as rows, the classes as
+            columns and the statistic of the fares as values.
+
+        """
+        self._ensure_run()
+        assert self._fares is not None, "The dataset needs the columns 'embark_town', 'pclass' and 'fare'."
+        return self._fares.statistic(statistic).rename(statistic).unstack("pclass")
+
+
+    def ccf_categorization_mean(self):
+        """Computes the average ticket price paid per class for every embarked town."""
+        return self.ccf_categorization("mean")
+
+
+    def ccf_categorization_count(self):
+        """Computes the passenger count for every passenger class by embarked towns."""
+        return self.ccf_categorization("count")
+
+
+    def contingency_table(self, column1: str, column2: str):
+        """Returns the contingency table of two categorical columns."""
+        self._ensure_run()
+        if (column1, column2) in self._contingency:
+            return self._contingency[(column1, column2)].table()
+        assert (column2, column1) in self._contingency, \
+            f"The pair ('{column1}', '{column2}') was not part of the pass, pass it with 'pairs'."
+        return self._contingency[(column2, column1)].table().T
+
+
+    def chi_square_test(self, column1: str, column2: str):
+        """Does a Chi-Square test to analyze the relationship
+        between two categorical variables.
+
+        The contingency table comes from the counts of the single pass,
+        the results are identical to 'Analyzer.chi_square_test'.
+
+
+        Returns
+        -------
+        chi2: float
+            The Chi-Square statistic.
+        p: float
+            The p-value.
+        v: float
+            Cramer's V value.
+
+        """
+        contingency_table = self.contingency_table(column1, column2)
+        assert not contingency_table.empty, "Contingency table must not be empty."
+
+        from scipy.stats import chi2_contingency
+        chi2, p, dof, expected = chi2_contingency(contingency_table)
+        v = contingency.cramers_v_values(chi2, contingency_table.to_numpy().sum(),
+                                         min(contingency_table.shape) - 1)[()]
+
+        alpha = 0.05
+        # Determine if the result is statistically significant based on the p-value
+        if p < alpha: logger.info("There is a statistically significant relationship between %s and %s", column1, column2)
+        else: logger.info("There is no significant relationship between %s and %s", column1, column2)
+        return chi2, p, v
@@ -0,0 +1,224 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+from mypackage.dataset import load_data, cache_path_for, write_cache_chunks
+# %%
+# Synthetic datasets with the schema of 'cleaned_data.csv' at any size.
+# The conditional distributions are fitted from a dataset once (the rows of every
+# group are kept as an empirical distribution) and N rows are then sampled with a
+# handful of vectorized numpy operations, independent of the size of the groups.
+# %%
+class _EmpiricalSampler:
+    """Samples rows of a dataset conditional on a group, with the empirical distribution of every group."""
+
+
+    def __init__(self, groups, n_groups: int):
+        # the rows sorted by group, group g owns the rows order[offsets[g]:offsets[g] + counts[g]]
+        self.order = np.argsort(groups, kind="stable")
+        self.counts = np.bincount(groups, minlength=n_groups)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+
+    def sample(self, rng, groups):
+        """Returns one row of the group of every element of 'groups'."""
+        position = (rng.random(groups.size) * self.counts[groups]).astype(np.int64)
+        return self.order[self.offsets[groups] + position]
+
+
+
+def _take(series: pd.Series, rows):
+    """Takes rows of a column as an array, categorical columns stay categorical (without decoding them)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(series.cat.codes.to_numpy()[rows], dtype=series.dtype)
+    return series.to_numpy()[rows]
+
+
+
+class TitanicGenerator:
+    """The TitanicGenerator class samples synthetic datasets with the
+    columns, dtypes and joint structure of the (cleaned) Titanic dataset.
+
+    Every synthetic passenger is built in four steps:
+
+    - the class, the type of person ('who') and the embarked town are drawn
+      together from their observed combinations,
+    - sex, age, sibsp and parch are taken from a random passenger with the
+      same class and type of person (so 'who' always agrees with sex and age),
+    - the fare is taken from a random passenger with the same class and
+      embarked town,
+    - survival is drawn with the survival rate of the class and type of person.
+
+    'alive' and 'alone' are derived from 'survived' and sibsp + parch,
+    like in the original dataset.
+
+
+    Attributes
+    ----------
+    columns: pandas.Index
+        The columns of the generated datasets.
+    dtypes: pandas.Series
+        The dtypes of the generated datasets (categories included).
+
+    """
+
+    # the columns the conditional distributions are fitted on
+    required_columns = ("survived", "pclass", "sex", "age", "sibsp", "parch", "fare", "who", "embark_town")
+
+
+    def __init__(self, data: pd.DataFrame = None):
+        """Fits the conditional distributions.
+
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            The dataset the distributions are fitted on, defaults to the
+            cleaned Titanic dataset that ships with the package.
+
+        """
+        if data is None:
+            data = load_data()
+        # check if the dataset has the columns of the Titanic dataset
+        missing = set(self.required_columns) - set(data.columns)
+        assert not missing, f"The dataset misses the columns {sorted(missing)}."
+        assert not data.empty, "The dataset must not be empty."
+
+        self.columns = data.columns
+        self.dtypes = data.dtypes
+        self._data = data.reset_index(drop=True)
+
+        # the observed combinations of class, person and town (a missing town is a combination as well)
+        strata = data.groupby(["pclass", "who", "embark_town"], dropna=False, observed=True).ngroup().to_numpy()
+        n_strata = strata.max() + 1
+        self._strata_p = np.bincount(strata, minlength=n_strata) / strata.size
+
+        def group_of_stratum(keys):
+            # the coarser groups are functions of the strata, any row of a stratum gives its group
+            groups = data.groupby(keys, dropna=False, observed=True).ngroup().to_numpy()
+            mapping = np.empty(n_strata, dtype=np.int64)
+            mapping[strata] = groups
+            return groups, mapping
+
+        person_groups, self._person_group = group_of_stratum(["pclass", "who"])
+        fare_groups, self._fare_group = group_of_stratum(["pclass", "embark_town"])
+        self._persons = _EmpiricalSampler(person_groups, person_groups.max() + 1)
+        self._fares = _EmpiricalSampler(fare_groups, fare_groups.max() + 1)
+        self._survival_p = (np.bincount(person_groups, weights=data["survived"].to_numpy(dtype=float))
+                            / np.bincount(person_groups))
+        self._stratum_rows = _EmpiricalSampler(strata, n_strata)
+        # a row that died and a row that survived, 'alive' of the new rows is copied from them
+        survived = data["survived"].to_numpy()
+        self._outcome_rows = np.array([np.argmax(survived == 0), np.argmax(survived == 1)])
+
+
+    def sample(self, n_rows: int, seed: int = 0, start: int = 0):
+        """Samples a synthetic dataset.
+
+
+        Parameters
+        ----------
+        n_rows: int
+            The number of rows.
+        seed: int or numpy.random.Generator
+            The seed of the random generator, the same seed gives the same dataset.
+        start: int
+            The first row label (the index is start, start + 1, ...).
+
+
+        Returns
+        -------
+        pandas.DataFrame
+            The dataset with the columns and dtypes of the fitted dataset.
+
+        """
+        rng = np.random.default_rng(seed)
+        data = self._data
+        strata = rng.choice(self._strata_p.size, size=n_rows, p=self._strata_p)
+        # class, person and town of a random row of every stratum
+        keys = self._stratum_rows.sample(rng, strata)
+        persons = self._persons.sample(rng, self._person_group[strata])
+        fares = self._fares.sample(rng, self._fare_group[strata])
+        survived = (rng.random(n_rows) < self._survival_p[self._person_group[strata]]).astype(np.int64)
+        sibsp = data["sibsp"].to_numpy()[persons]
+        parch = data["parch"].to_numpy()[persons]
+
+        columns = {
+            "survived": survived,
+            "pclass": _take(data["pclass"], keys),
+            "sex": _take(data["sex"], persons),
+            "age": _take(data["age"], persons),
+            "sibsp": sibsp,
+            "parch": parch,
+            "fare": _take(data["fare"], fares),
+            "who": _take(data["who"], keys),
+            "embark_town": _take(data["embark_town"], keys),
+            "alone": (sibsp + parch) == 0,
+        }
+        if "alive" in data:
+            columns["alive"] = _take(data["alive"], self._outcome_rows[survived])
+        sample = pd.DataFrame({name: columns[name] for name in self.columns if name in columns},
+                              index=pd.RangeIndex(start, start + n_rows))
+        return sample.astype(self.dtypes[sample.columns].to_dict())
+
+
+    def chunks(self, n_rows: int, chunksize: int = 1_000_000, seed: int = 0):
+        """Samples a synthetic dataset chunk by chunk (a generator of DataFrames).
+
+        Every chunk has its own random stream derived from the seed, so the
+        same seed and chunksize always give the same dataset.
+
+        """
+        assert chunksize > 0, "The chunksize must be positive."
+        streams = np.random.SeedSequence(seed).spawn(-(-n_rows // chunksize))
+        for i, stream in enumerate(streams):
+            start = i * chunksize
+            yield self.sample(min(chunksize, n_rows - start), np.random.default_rng(stream), start)
+
+
+    def write(self, path: str, n_rows: int, chunksize: int = 1_000_000, seed: int = 0, cache: bool = True):
+        """Writes a synthetic dataset to a csv file in chunks, in bounded memory.
+
+
+        Parameters
+        ----------
+        path: str
+            The csv file (written like 'cleaned_data.csv', with the row labels).
+        n_rows: int
+            The number of rows.
+        chunksize: int
+            The number of rows that are in memory at once.
+        seed: int
+            The seed of the random generator.
+        cache: bool
+            Whether the typed binary cache of the file is written as well, so
+            'load_data(path)' memory-maps it without parsing the csv file.
+
+
+        Returns
+        -------
+        str
+            The path of the csv file.
+
+
+        Examples
+        --------
+        TitanicGenerator().write("titanic_1e8.csv", 100_000_000)
+
+        analyzer = Analyzer(load_data("titanic_1e8.csv"))
+
+        """
+        # ensure that there is something to write
+        assert n_rows > 0, "The number of rows must be positive."
+
+        def written_chunks():
+            for i, chunk in enumerate(self.chunks(n_rows, chunksize, seed)):
+                chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0)
+                yield chunk
+
+        if cache:
+            write_cache_chunks(written_chunks(), cache_path_for(path), n_rows, self.dtypes.to_dict(), path)
+        else:
+            for _ in written_chunks():
+                pass
+        return os.fspath(path)
@@ -1,14 +1,29 @@
 # %%
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import seaborn as sns
+import io
+import numpy as np
+# matplotlib and seaborn take about a second to import, they are imported by the
+# plotting methods on first use instead of here
+from concurrent.futures import ProcessPoolExecutor
 from mypackage.analysis import Analyzer
+from mypackage.dataset import csv_path, load_data
+from mypackage import contingency, density, profiling
+from mypackage.profiling import profiled
 # %%
+# the dataset is loaded on first access of 'data' instead of at import
 # data = pd.read_csv("cleaned_data.csv", index_col=0)
-csv_path = os.path.join(os.path.dirname(__file__), 'cleaned_data.csv')
-data = pd.read_csv(csv_path, index_col = 0)
+def __getattr__(name):
+    if name == "data":
+        return load_data()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+# %%
+# the plotting methods that can be used in the specs of 'render_all'
+PLOT_METHODS = ("distribution_numerical", "plot_survival_rate", "ccf_mean_heatmap", "ccf_count_heatmap",
+                "plot_contingency_heatmap", "basic_scatterplot", "scatterplot_sorted_by")
+
+# with mode = "auto" the scatterplots switch to the density mode above this number of rows
+LARGE_N = 50_000
 # %%
 # to make the visualizations easier to implement we'll use a class 'Visualizer' that inherits the functions of
 # the 'Analyzer' class. This helps keep our code clean and makes it more efficient
@@ -19,6 +34,13 @@ class Visualizer(Analyzer):
     It includes methods for plotting distributions, generating heatmaps and
     creating scatterplots.
     
+    Every plotting method takes an optional 'output'. Without it the plot is
+    displayed with plt.show(). With it the plot is drawn headless on its own
+    matplotlib Figure (without the global pyplot state) and saved to
+    'output', which can be a file path (the format follows the file
+    extension, e.g. '.png' or '.svg') or a binary file-like object such as
+    io.BytesIO (the format is given with 'format', default png).
+    
     
     Attributes
     ----------
@@ -28,7 +50,7 @@ class Visualizer(Analyzer):
     """
 
 
-    def __init__(self, data):
+    def __init__(self, data = None):
         """Initializes the class instance with the given (Titanic) dataset.
         
         
@@ -36,8 +58,12 @@ class Visualizer(Analyzer):
         ----------
         data: pandas.DataFrame
             The Titanic dataset that is going to be analyzed.
+            If no dataset is passed, the cleaned Titanic dataset that ships
+            with the package is loaded through 'load_data'.
             
         """
+        if data is None:
+            data = load_data()
         # check if the dataset is stored as a pandas DataFrame
         assert isinstance(data, pd.DataFrame), ("Data must be a pandas DataFrame")
         
@@ -45,7 +71,146 @@ class Visualizer(Analyzer):
 
 
 
-    def distribution_numerical(self, column: str):
+    def clear_cache(self):
+        """Removes all cached aggregations, maintained states and density estimates."""
+        super().clear_cache()
+        self._densities = {}
+
+
+
+    def append(self, rows):
+        # the density estimates don't include the new rows
+        super().append(rows)
+        self._densities = {}
+        return self
+
+
+
+    @profiled
+    def density_estimate(self, column: str, bins: int = None, bw_adjust: float = 1.0):
+        """Returns the histogram and the kde of a numerical column (cached).
+        
+        The result of mypackage.density.binned_kde is cached per
+        (column, bins, bw_adjust) until the dataset changes, so repeated
+        renders of 'distribution_numerical' skip the computation.
+        
+        
+        Parameters
+        ----------
+        column: str
+            The name of a numerical column.
+        bins: int, optional
+            The number of histogram bins.
+        bw_adjust: float
+            Factor for the bandwidth of the kde curve.
+        
+        
+        Returns
+        -------
+        dict
+            See mypackage.density.binned_kde.
+        
+        """
+        # check if the passed column exists in the dataset
+        assert column in self.columns, f"Column '{column}' does not exist in the dataset."
+        key = (column, bins, bw_adjust)
+        profiling.cache_access("densities", key in self._densities)
+        if key not in self._densities:
+            values = self.data[column].to_numpy(dtype = float, na_value = np.nan)
+            with profiling.phase("binned_kde"):
+                self._densities[key] = density.binned_kde(values, bins, bw_adjust)
+        return self._densities[key]
+
+
+
+    def precompute_densities(self, columns: list = None, bins: int = None, bw_adjust: float = 1.0):
+        """Computes and caches the density estimates of numerical columns ahead of rendering.
+        
+        
+        Parameters
+        ----------
+        columns: list
+            The names of the columns, defaults to all numerical (non boolean) columns.
+        bins, bw_adjust:
+            See 'density_estimate'.
+        
+        """
+        if columns is None:
+            columns = [name for name, dtype in self.data.dtypes.items()
+                       if pd.api.types.is_numeric_dtype(dtype) and dtype != bool]
+        for column in columns:
+            self.density_estimate(column, bins, bw_adjust)
+
+
+
+    def _figure(self, figsize: tuple, output):
+        """Creates a new figure with one axes.
+        
+        Interactive plots use pyplot so that plt.show() can display them,
+        headless plots (with an output) use a standalone Figure that never
+        touches the global pyplot state and can be drawn in parallel.
+        
+        """
+        if output is None:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize = figsize)
+        else:
+            # headless plots don't touch the global pyplot figure state
+            from matplotlib.figure import Figure
+            fig = Figure(figsize = figsize)
+        return fig, fig.subplots()
+
+
+
+    def _finish(self, fig, output, format: str = None):
+        """Displays the figure or saves it to the output."""
+        if output is None:
+            import matplotlib.pyplot as plt
+            plt.show()
+            return None
+        if format is None and not isinstance(output, (str, os.PathLike)):
+            format = "png"
+        with profiling.phase("savefig"):
+            fig.savefig(output, format = format)
+        return output
+
+
+
+    def _scatter_mode(self, mode: str):
+        # check if the mode is known
+        assert mode in ("auto", "scatter", "density"), "The mode must be 'auto', 'scatter' or 'density'."
+        if mode == "auto":
+            return "scatter" if len(self.data) <= LARGE_N else "density"
+        return mode
+
+
+
+    def _draw_density(self, fig, ax, x, y, bins: int):
+        """Draws the number of observations per cell of a 2-D grid (log y-axis) instead of the points."""
+        with profiling.phase("histogram2d"):
+            valid = ~np.isnan(x) & ~np.isnan(y) & (y > 0)
+            x_edges = density.bin_edges(x[valid], bins)
+            y_edges = density.bin_edges(y[valid], bins, log = True)
+            counts = density.histogram2d(x[valid], y[valid], x_edges, y_edges, log_y = True)
+        from matplotlib.colors import LogNorm
+        # empty cells stay transparent
+        mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts, 0).T, cmap = "Greys", norm = LogNorm())
+        fig.colorbar(mesh, ax = ax, label = "count")
+
+
+
+    def _draw_fit(self, ax, fits: dict, group: int, ci: float, color, label: str = None):
+        """Draws a fitted line with its analytic confidence band."""
+        grid, line, lower, upper = density.fit_line(fits, group, ci)
+        ax.plot(grid, line, color = color, label = label)
+        if lower is not None:
+            ax.fill_between(grid, lower, upper, color = color, alpha = 0.15)
+
+
+
+    @profiled
+    def distribution_numerical(self, column: str, output = None, format: str = None,
+                               bins: int = None, bw_adjust: float = 1.0, fast: bool = True):
         """Plots the distribution of observations for a numerical variable
         using a histogram and a kde curve.
         
@@ -56,12 +221,26 @@ class Visualizer(Analyzer):
             The name of the column to analyze. This should be a name of one
             of the columns in the Titanic dataset and must represent
             a numerical variable.
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        bins: int, optional
+            The number of histogram bins (see mypackage.density.binned_kde).
+        bw_adjust: float
+            Factor for the bandwidth of the kde curve (Scott's rule).
+        fast: bool
+            Whether the histogram and the kde curve come from one binning pass
+            with an FFT convolution (default, see 'density_estimate') instead
+            of seaborn's histplot, which evaluates the kde at every grid
+            point for every observation.
         
         
         Notes
         -----
         Although this method can technically be used with categorical variables,
-        it is designed for numerical variables.
+        it is designed for numerical variables. Non-numerical columns are
+        always drawn with seaborn's histplot.
         
         
         Examples
@@ -70,7 +249,7 @@ class Visualizer(Analyzer):
         
         visualizer.distribution_numerical(column = "age")
        
-        visualizer.distribution_numerical(column = "fare")
+        visualizer.distribution_numerical(column = "fare", output = "fare.svg")
         
         This will generate a histogram that shows the distribution of the numerical
         variables 'age' and 'fare' with an overlaid kde curve.
@@ -79,17 +258,33 @@ class Visualizer(Analyzer):
         # check if the passed column exists in the dataset
         assert column in self.data.columns, f"Column '{column}' does not exist in the dataset."
         
-        plt.figure(figsize = (8,5))  # creates a new figure
-        sns.histplot(self.data[column], kde = True, color = "blue")  # generates a
-        # histogram with an overlaid kde curve and sets the color to blue
-        plt.title(f"Distribution of {column}")  # adds a title
-        plt.xlabel(column)  # label the x-axis with column name
-        plt.ylabel("frequency")  # adds label for the y-axis
-        plt.show()  # displays the histogram and the kde curve
+        fig, ax = self._figure((8,5), output)  # creates a new figure
+        dtype = self.data[column].dtype
+        if fast and pd.api.types.is_numeric_dtype(dtype) and dtype != bool:
+            estimate = self.density_estimate(column, bins, bw_adjust)
+            edges = estimate["edges"]
+            # draws the histogram from the binned counts
+            ax.bar(edges[:-1], estimate["counts"], width = np.diff(edges), align = "edge",
+                   color = "blue", alpha = 0.5, edgecolor = "black")
+            # scales the density to the counts of the histogram and draws the kde curve
+            # over the range of the values (like histplot)
+            inside = (estimate["grid"] >= edges[0]) & (estimate["grid"] <= edges[-1])
+            ax.plot(estimate["grid"][inside], estimate["density"][inside] * estimate["n"] * (edges[1] - edges[0]),
+                    color = "blue")
+        else:
+            import seaborn as sns
+            sns.histplot(self.data[column], kde = True, color = "blue", ax = ax)  # generates a
+            # histogram with an overlaid kde curve and sets the color to blue
+        ax.set_title(f"Distribution of {column}")  # adds a title
+        ax.set_xlabel(column)  # label the x-axis with column name
+        ax.set_ylabel("frequency")  # adds label for the y-axis
+        return self._finish(fig, output, format)  # displays the histogram and the kde curve
         
     
     
-    def plot_survival_rate(self, group_by_column: str):
+    @profiled
+    def plot_survival_rate(self, group_by_column: str, output = None, format: str = None,
+                           ci: float = None, method: str = "wilson", resamples: int = 10_000, seed: int = 0):
         """Plots survival rates grouped by a categorical variable as a barplot.
         
         
@@ -98,6 +293,15 @@ class Visualizer(Analyzer):
         group_by_column: str
             The name of the column used to group survival rates.
             This should be a categorical variable.
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        ci: float, optional
+            The confidence level in percent of the error bars drawn on the
+            bars (no error bars without it).
+        method, resamples, seed:
+            How the intervals are computed (see 'Analyzer.survival_rate').
             
         
         Examples
@@ -106,6 +310,8 @@ class Visualizer(Analyzer):
         
         visualizer.plot_survival_rate("who")
         
+        visualizer.plot_survival_rate("who", ci = 95, method = "bootstrap")
+        
         visualizer.plot_survival_rate("pclass")
         
         This will generate barplots of the survival rates grouped by the
@@ -113,28 +319,45 @@ class Visualizer(Analyzer):
         
         """
         # check if the column used to group the survival rates exists in the dataset
-        assert group_by_column in self.data.columns, f"Column '{group_by_column}' does not exist in the dataset."
+        assert group_by_column in self.columns, f"Column '{group_by_column}' does not exist in the dataset."
         
         # computes survival rates grouped by the specified column
-        survival_rates = self.survival_rate(group_by_column)
-        
-        plt.figure(figsize = (8,5))  # creates a new figure
-        survival_rates.sort_values().plot(kind = "bar", color = "darkgrey", alpha = 0.7)
+        if ci is None:
+            survival_rates = self.survival_rate(group_by_column).sort_values()
+            errors = None
+        else:
+            rates = self.survival_rate(group_by_column, ci, method, resamples, seed).sort_values("survived")
+            survival_rates = rates["survived"]
+            # the distances from the rates to the bounds, as matplotlib's asymmetric error bars
+            errors = [(rates["survived"] - rates["lower"]).to_numpy(), (rates["upper"] - rates["survived"]).to_numpy()]
+        
+        fig, ax = self._figure((8,5), output)  # creates a new figure
+        survival_rates.plot(kind = "bar", color = "darkgrey", alpha = 0.7, ax = ax,
+                            yerr = errors, capsize = 4 if errors is not None else 0)
         # plots survival rates as a barplot, sorts values for better visualization
-        plt.title(f"Survival rates grouped by {group_by_column}")  # adds title
-        plt.xlabel(group_by_column)  # adds label to the x-axis
-        plt.ylabel("Survival Rate")  # adds label to the y-axis
-        plt.xticks(rotation = 360)  # rotates labels for better visualization
-        plt.ylim((0,1))  # sets limits for the y-axis from 0 to 1 since survival rates are proportions
-        plt.show()  # displays the barplot
+        ax.set_title(f"Survival rates grouped by {group_by_column}")  # adds title
+        ax.set_xlabel(group_by_column)  # adds label to the x-axis
+        ax.set_ylabel("Survival Rate")  # adds label to the y-axis
+        ax.tick_params(axis = "x", labelrotation = 360)  # rotates labels for better visualization
+        ax.set_ylim((0,1))  # sets limits for the y-axis from 0 to 1 since survival rates are proportions
+        return self._finish(fig, output, format)  # displays the barplot
 
 
     
-    def ccf_mean_heatmap(self):
+    @profiled
+    def ccf_mean_heatmap(self, output = None, format: str = None):
         """Creates a heatmap to visualize the average ticket price by
         embarked town and passenger class.
         
         
+        Parameters
+        ----------
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        
+        
         Notes
         -----
         This method uses the pivot table generated by the method
@@ -159,22 +382,32 @@ class Visualizer(Analyzer):
         # embarked town and passenger class.
         pivot_table_mean = self.ccf_categorization_mean()
         
-        plt.figure(figsize=(8, 6))  # creates a new figure
-        sns.heatmap(pivot_table_mean, annot=True, fmt=".2f", cmap="coolwarm")
+        fig, ax = self._figure((8, 6), output)  # creates a new figure
+        import seaborn as sns
+        sns.heatmap(pivot_table_mean, annot=True, fmt=".2f", cmap="coolwarm", ax=ax)
         # creates a heatmap to visualize the average ticket prices, annot = True
         # to display the values inside the cells
-        plt.title("Average Fare by Embark Town and Passenger Class")  # adds title
-        plt.xlabel("Passenger Class")  # adds label to the x-axis
-        plt.ylabel("Embark Town")  # adds label to the y-axis
-        plt.show()  # displays the heatmap
+        ax.set_title("Average Fare by Embark Town and Passenger Class")  # adds title
+        ax.set_xlabel("Passenger Class")  # adds label to the x-axis
+        ax.set_ylabel("Embark Town")  # adds label to the y-axis
+        return self._finish(fig, output, format)  # displays the heatmap
     
     
     
-    def ccf_count_heatmap(self):
+    @profiled
+    def ccf_count_heatmap(self, output = None, format: str = None):
         """Creates a heatmap to visualize the passenger count by
         embarked town and passenger class.
         
         
+        Parameters
+        ----------
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        
+        
         Notes
         -----
         This method uses the pivot table generated by the method
@@ -199,17 +432,19 @@ class Visualizer(Analyzer):
         # embarked town and passenger class.
         pivot_table_count = self.ccf_categorization_count()
 
-        plt.figure(figsize = (8,6))  # creates a new figure
-        sns.heatmap(pivot_table_count, annot=True, fmt=".2f", cmap="coolwarm")
+        fig, ax = self._figure((8,6), output)  # creates a new figure
+        import seaborn as sns
+        sns.heatmap(pivot_table_count, annot=True, fmt=".2f", cmap="coolwarm", ax=ax)
         # creates a heatmap to visualize the passenger count, annot = True to
         # display the values inside the cells
-        plt.title("Passenger Count by Embark Town and Passenger Class")  # adds a title
-        plt.xlabel("Passenger Class")  # labels the x-axis
-        plt.ylabel("Embark Town")  # labels the y-axis
-        plt.show()  # displays the heatmap
+        ax.set_title("Passenger Count by Embark Town and Passenger Class")  # adds a title
+        ax.set_xlabel("Passenger Class")  # labels the x-axis
+        ax.set_ylabel("Embark Town")  # labels the y-axis
+        return self._finish(fig, output, format)  # displays the heatmap
         
         
-    def plot_contingency_heatmap(self, column1: str, column2: str):
+    @profiled
+    def plot_contingency_heatmap(self, column1: str, column2: str, output = None, format: str = None):
         """Creates a heatmap to visualize the contingency table between
         two categorical variables.
         
@@ -222,6 +457,10 @@ class Visualizer(Analyzer):
         column2: str
             The name of the second column to analyze.
             This should also be a categorical variable.
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
             
             
         Examples
@@ -244,18 +483,21 @@ class Visualizer(Analyzer):
         # between column1 and column2
         contingency_table = pd.crosstab(self.data[column1], self.data[column2])
         
-        plt.figure(figsize=(8, 6))  # creates a new figure
-        sns.heatmap(contingency_table, annot=True, cmap="coolwarm", fmt="d")
+        fig, ax = self._figure((8, 6), output)  # creates a new figure
+        import seaborn as sns
+        sns.heatmap(contingency_table, annot=True, cmap="coolwarm", fmt="d", ax=ax)
         # generates a heatmap to visualize the relationship between two categorical variables,
         # annot = True to display the frequencies inside the cells
-        plt.title(f'Contingency Table: {column1} vs {column2}')  # adds a title
-        plt.xlabel(column2)  # labels the x-axis with the name of column2
-        plt.ylabel(column1)  # labels the y-axis with the name of column1
-        plt.show()  # displays the heatmap
+        ax.set_title(f'Contingency Table: {column1} vs {column2}')  # adds a title
+        ax.set_xlabel(column2)  # labels the x-axis with the name of column2
+        ax.set_ylabel(column1)  # labels the y-axis with the name of column1
+        return self._finish(fig, output, format)  # displays the heatmap
 
 
 
-    def basic_scatterplot(self, column1: str, column2: str):
+    @profiled
+    def basic_scatterplot(self, column1: str, column2: str, output = None, format: str = None,
+                          mode: str = "auto", bins: int = 80, ci: float = 95):
         """Creates a scatterplot to visualize the relationship
         between two numerical variables.
         
@@ -268,6 +510,22 @@ class Visualizer(Analyzer):
         column2: str
             The name of the column that is used for the y-axis.
             This should also be a numerical variable.
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        mode: str
+            "scatter" draws every point and lets seaborn bootstrap the
+            confidence band of the regression line. "density" draws the
+            number of points per cell of a 2-D histogram (binned with numpy)
+            and an ordinary least squares line with an analytic confidence
+            band, so the time barely grows with the number of rows.
+            "auto" (default) uses "density" above LARGE_N rows.
+        bins: int
+            The number of bins per axis in the density mode.
+        ci: float
+            The confidence level of the band around the regression line in
+            percent, None for no band.
             
         
         Notes
@@ -290,23 +548,32 @@ class Visualizer(Analyzer):
         assert column1 in self.data.columns, f"Column '{column1}' does not exist in the dataset."
         assert column2 in self.data.columns, f"Column '{column2}' does not exist in the dataset."
         
-        plt.figure(figsize=(10, 6))  # creates a new figure
-        sns.regplot(x = column1, y = column2, data=data, scatter_kws={'alpha': 0.5})
-        # generates a scatterplot using seaborn, scatter_kws={'alpha': 0.5} sets
-        # transparency of points to 0.5 for better visualization
-        plt.yscale('log')  # makes the y-axis logarithmic
+        fig, ax = self._figure((10, 6), output)  # creates a new figure
+        if self._scatter_mode(mode) == "scatter":
+            import seaborn as sns
+            sns.regplot(x = column1, y = column2, data=self.data, scatter_kws={'alpha': 0.5}, ci = ci, ax = ax)
+            # generates a scatterplot using seaborn, scatter_kws={'alpha': 0.5} sets
+            # transparency of points to 0.5 for better visualization
+        else:
+            x = self.data[column1].to_numpy(dtype = float, na_value = np.nan)
+            y = self.data[column2].to_numpy(dtype = float, na_value = np.nan)
+            self._draw_density(fig, ax, x, y, bins)  # draws the density of the points
+            self._draw_fit(ax, density.linear_fits(x, y), 0, ci, "C0")  # draws the regression line
+        ax.set_yscale('log')  # makes the y-axis logarithmic
 
         fare_ticks = [1, 5, 10, 20, 50, 100, 200, 500]  # example values (ticket prices)
         # for better visualization
-        plt.yticks(fare_ticks, fare_ticks)
-        plt.title(f"Scatterplot of {column1} vs {column2}")  # adds title
-        plt.xlabel(column1)  # adds label to the x-axis using the name of column1
-        plt.ylabel(column2)  # adds label to the y-axis using the name of column2
-        plt.show()  # displays the scatterplot
+        ax.set_yticks(fare_ticks, [str(tick) for tick in fare_ticks])
+        ax.set_title(f"Scatterplot of {column1} vs {column2}")  # adds title
+        ax.set_xlabel(column1)  # adds label to the x-axis using the name of column1
+        ax.set_ylabel(column2)  # adds label to the y-axis using the name of column2
+        return self._finish(fig, output, format)  # displays the scatterplot
     
     
     
-    def scatterplot_sorted_by(self, column1: str, column2: str, hue: str):
+    @profiled
+    def scatterplot_sorted_by(self, column1: str, column2: str, hue: str, output = None, format: str = None,
+                              mode: str = "auto", bins: int = 80, ci: float = 95):
         """Creates a scatterplot to visualize the relationship between two
         numerical variables grouped by categorical variable.
         
@@ -321,11 +588,31 @@ class Visualizer(Analyzer):
         hue: str
             The name of the column representing the groups.
             This should be a categorical variable.
+        output: str or file-like, optional
+            Where the plot is saved instead of displaying it (see the class docstring).
+        format: str, optional
+            The image format ("png", "svg", ...) if it can't be taken from the output path.
+        mode: str
+            "scatter" draws every point and lets seaborn bootstrap the
+            confidence band of the regression line. "density" draws the
+            number of points per cell of a 2-D histogram (binned with numpy)
+            and an ordinary least squares line with an analytic confidence
+            band, so the time barely grows with the number of rows.
+            "auto" (default) uses "density" above LARGE_N rows.
+        bins: int
+            The number of bins per axis in the density mode.
+        ci: float
+            The confidence level of the band around the regression line in
+            percent, None for no band.
             
         
         Notes
         -----
         The y-axis is set to a logarithmic scale.
+        Every group gets its own scatter points and regression line
+        (like seaborn's lmplot), drawn on a single axes.
+        In the density mode all points share one 2-D histogram and the
+        lines of all groups are fitted together in one grouped pass.
         
         
         Examples
@@ -343,45 +630,140 @@ class Visualizer(Analyzer):
         assert column2 in self.data.columns, f"Column '{column2}' does not exist in the dataset."
         assert hue in self.data.columns, f"Column '{hue}' does not exist in the dataset."
        
-        sns.lmplot(x = column1, y = column2, data=data, hue = hue, aspect=1.5, scatter_kws={'alpha': 0.5})
-        # generates a scatterplot using seaborn, scatter_kws={'alpha': 0.5} sets
-        # transparency of points to 0.5 for better visualization
-        plt.yscale('log')  # makes the y-axis logarithmic
+        fig, ax = self._figure((7.5, 5), output)  # creates a new figure (the size of lmplot with aspect=1.5)
+        import seaborn as sns
+        if self._scatter_mode(mode) == "scatter":
+            groups = self.data.groupby(hue, observed=True)
+            palette = sns.color_palette(n_colors=groups.ngroups)
+            for color, (level, group) in zip(palette, groups):
+                sns.regplot(x = column1, y = column2, data=group, color = color, label = str(level),
+                            scatter_kws={'alpha': 0.5}, ci = ci, ax = ax)
+            # generates a scatterplot with a regression line per group (like lmplot, but on a
+            # single axes instead of a pyplot figure), scatter_kws={'alpha': 0.5} sets
+            # transparency of points to 0.5 for better visualization
+        else:
+            x = self.data[column1].to_numpy(dtype = float, na_value = np.nan)
+            y = self.data[column2].to_numpy(dtype = float, na_value = np.nan)
+            self._draw_density(fig, ax, x, y, bins)  # draws the density of all points
+            # fits the regression lines of all groups in one pass
+            codes, levels = contingency.factorize(self.data[hue])
+            fits = density.linear_fits(x, y, codes, len(levels))
+            palette = sns.color_palette(n_colors=len(levels))
+            for group, (color, level) in enumerate(zip(palette, levels)):
+                self._draw_fit(ax, fits, group, ci, color, label = str(level))
+        ax.legend(title = hue)
+        ax.set_yscale('log')  # makes the y-axis logarithmic
 
         fare_ticks = [1, 5, 10, 20, 50, 100, 200, 500]  # example values (ticket prices)
         # for better visualization
-        plt.yticks(fare_ticks, fare_ticks)  # setting the ticks for the y axis
-        plt.title(f"Scatterplot of {column1} vs {column2} by {hue}")  # adds title
-        plt.xlabel(column1)  # adds label to the x-axis using the name of column1
-        plt.ylabel(column2)  # adds label to the y-axis using the name of column2
-        plt.show()  # displays the scatterplot
+        ax.set_yticks(fare_ticks, [str(tick) for tick in fare_ticks])  # setting the ticks for the y axis
+        ax.set_title(f"Scatterplot of {column1} vs {column2} by {hue}")  # adds title
+        ax.set_xlabel(column1)  # adds label to the x-axis using the name of column1
+        ax.set_ylabel(column2)  # adds label to the y-axis using the name of column2
+        return self._finish(fig, output, format)  # displays the scatterplot
 
-    
-# %%
-# The following part includes a few function calls to check our written methods.
 
-visualizer = Visualizer(data)
-# %%
-# use the distribution_numerical method to plot the distribution of a
-# numerical variable (e.g. age, fare)
-visualizer.distribution_numerical(column = "age")
-visualizer.distribution_numerical(column = "fare")
 
+    @profiled
+    def render_all(self, specs: list, processes: int = None):
+        """Renders many plots headless, spread over a pool of processes.
+        
+        
+        Parameters
+        ----------
+        specs: list
+            One dictionary per plot with the keys
+            - 'method': the name of a plotting method (see PLOT_METHODS)
+            - 'args' and 'kwargs' (optional): the arguments of the method
+            - 'output' (optional): a file path; without it the image is
+              returned as bytes
+            - 'format' (optional): the image format, default png for bytes
+        processes: int
+            The number of worker processes, defaults to the number of cpu cores.
+            With 1 everything is rendered in the current process.
+        
+        
+        Returns
+        -------
+        list
+            For every spec (in order) the output path or the image as bytes.
+        
+        
+        Notes
+        -----
+        The dataset is sent to every worker once, not once per plot. A dataset
+        opened with 'open' is not sent at all, the workers map the same column store.
+        
+        
+        Examples
+        --------
+        visualizer = Visualizer(data)
+        
+        visualizer.render_all([
+            {"method": "plot_survival_rate", "args": ["who"], "output": "who.png"},
+            {"method": "ccf_mean_heatmap", "format": "svg"},
+        ])
+        
+        """
+        for spec in specs:
+            # check if every spec names a plotting method
+            assert spec.get("method") in PLOT_METHODS, f"Unknown plotting method '{spec.get('method')}'."
+        
+        if processes == 1:
+            return [_render(self, spec) for spec in specs]
+        # workers open the column store of the dataset themselves, other datasets are sent once per worker
+        initargs = (type(self), None, self._store) if self._store is not None else (type(self), self.data, None)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_render_worker,
+                                 initargs=initargs) as pool:
+            return list(pool.map(_render_in_worker, specs))
 # %%
-# use the plot_survival_rate method to plot the survival rates (barplot) grouped by a
-# categorical variable (e.g. who, pclass, sex)
-visualizer.plot_survival_rate("who")
-visualizer.plot_survival_rate("sex")
-visualizer.plot_survival_rate("pclass")
-# %%
-# plot gives us a heatmap which showcases the average price of the different classes in different towns
-visualizer.ccf_mean_heatmap()
-# %%
-visualizer.ccf_count_heatmap()
-# %%
-# visualizes the correlation between two categorical variables using a heatmap
-visualizer.plot_contingency_heatmap("survived", "pclass")
-# %%
-visualizer.basic_scatterplot("age", "fare")
+# the Visualizer of a worker process of 'render_all', built once per worker
+_worker_visualizer = None
+
+
+def _init_render_worker(cls, data, store: tuple = None):
+    global _worker_visualizer
+    _worker_visualizer = cls(data) if store is None else cls.open(*store)
+
+
+def _render(visualizer, spec: dict):
+    """Renders one plot spec headless and returns the output path or the image bytes."""
+    output = spec.get("output")
+    target = io.BytesIO() if output is None else output
+    getattr(visualizer, spec["method"])(*spec.get("args", ()), **spec.get("kwargs", {}),
+                                        output = target, format = spec.get("format"))
+    return target.getvalue() if output is None else output
+
+
+def _render_in_worker(spec: dict):
+    return _render(_worker_visualizer, spec)
 # %%
-visualizer.scatterplot_sorted_by("age","fare", hue="pclass")
+# The following part includes a few function calls to check our written methods,
+# it only runs when the module is executed (python -m mypackage.visualization).
+if __name__ == "__main__":
+
+    visualizer = Visualizer()
+    # %%
+    # use the distribution_numerical method to plot the distribution of a
+    # numerical variable (e.g. age, fare)
+    visualizer.distribution_numerical(column = "age")
+    visualizer.distribution_numerical(column = "fare")
+
+    # %%
+    # use the plot_survival_rate method to plot the survival rates (barplot) grouped by a
+    # categorical variable (e.g. who, pclass, sex)
+    visualizer.plot_survival_rate("who")
+    visualizer.plot_survival_rate("sex")
+    visualizer.plot_survival_rate("pclass")
+    # %%
+    # plot gives us a heatmap which showcases the average price of the different classes in different towns
+    visualizer.ccf_mean_heatmap()
+    # %%
+    visualizer.ccf_count_heatmap()
+    # %%
+    # visualizes the correlation between two categorical variables using a heatmap
+    visualizer.plot_contingency_heatmap("survived", "pclass")
+    # %%
+    visualizer.basic_scatterplot("age", "fare")
+    # %%
+    visualizer.scatterplot_sorted_by("age","fare", hue="pclass")
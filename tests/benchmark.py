@@ -0,0 +1,241 @@
+# %%
+import pandas as pd
+import numpy as np
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tracemalloc
+# the plots are rendered into memory, no window is opened
+os.environ.setdefault("MPLBACKEND", "Agg")
+from mypackage.analysis import Analyzer
+from mypackage.synthetic import TitanicGenerator
+# %%
+# Benchmarks of the public Analyzer and Visualizer methods at growing dataset sizes.
+# Every benchmark is timed on a cold cache (the memoized aggregations are cleared
+# before every run) and its peak memory is measured in a separate run with
+# tracemalloc, because tracing slows the timed runs down.
+#
+# python -m tests.benchmark --sizes 1000 100000 --output results.json
+# python -m tests.benchmark --output results.json --baseline baseline.json
+# %%
+SIZES = (1_000, 100_000, 1_000_000, 10_000_000)
+
+# a benchmark is flagged as a regression if it is this much slower (or needs this much more memory)
+TOLERANCE = 0.25
+
+
+def _plot(method: str, *args, **kwargs):
+    """A benchmark that renders a Visualizer plot into memory."""
+    return lambda visualizer: getattr(visualizer, method)(*args, output=io.BytesIO(), **kwargs)
+
+
+ANALYZER_BENCHMARKS = {
+    "get_stats[age]": lambda analyzer: analyzer.get_stats("age"),
+    "get_stats[sex]": lambda analyzer: analyzer.get_stats("sex"),
+    "chi_square_test[sex,pclass]": lambda analyzer: analyzer.chi_square_test("sex", "pclass"),
+    "ccf_categorization_mean": lambda analyzer: analyzer.ccf_categorization_mean(),
+    "ccf_categorization_count": lambda analyzer: analyzer.ccf_categorization_count(),
+    "survival_rate[who]": lambda analyzer: analyzer.survival_rate("who"),
+    "report": lambda analyzer: analyzer.report(),
+}
+
+VISUALIZER_BENCHMARKS = {
+    "distribution_numerical[fare]": _plot("distribution_numerical", "fare"),
+    "plot_survival_rate[who]": _plot("plot_survival_rate", "who"),
+    "ccf_mean_heatmap": _plot("ccf_mean_heatmap"),
+    "ccf_count_heatmap": _plot("ccf_count_heatmap"),
+    "plot_contingency_heatmap[survived,pclass]": _plot("plot_contingency_heatmap", "survived", "pclass"),
+    "basic_scatterplot[age,fare]": _plot("basic_scatterplot", "age", "fare"),
+    "scatterplot_sorted_by[age,fare,pclass]": _plot("scatterplot_sorted_by", "age", "fare", hue="pclass"),
+}
+# %%
+def make_data(n_rows: int, seed: int = 0):
+    """Builds a synthetic dataset with n_rows rows (see mypackage.synthetic).
+
+
+    Parameters
+    ----------
+    n_rows: int
+        The number of rows.
+    seed: int
+        The seed of the random generator, the same seed gives the same dataset.
+
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataset with the columns and dtypes of 'load_data()'.
+
+    """
+    return TitanicGenerator().sample(n_rows, seed)
+
+
+
+def measure(benchmark, instance, repeat: int = 3, memory: bool = True):
+    """Runs a benchmark on a cold cache and returns its wall time and peak memory.
+
+
+    Parameters
+    ----------
+    benchmark: callable
+        The benchmark, it's called with the Analyzer or Visualizer.
+    instance: Analyzer
+        The instance the benchmark runs on.
+    repeat: int
+        The number of timed runs.
+    memory: bool
+        Whether the peak memory is measured (in one more, traced run).
+
+
+    Returns
+    -------
+    dict
+        'time' (the median of the runs in seconds), 'time_min' and
+        'peak_memory' (bytes allocated on top of the dataset, None without memory).
+
+    """
+    times = []
+    for _ in range(repeat):
+        instance.clear_cache()
+        start = time.perf_counter()
+        benchmark(instance)
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        instance.clear_cache()
+        tracemalloc.start()
+        try:
+            benchmark(instance)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"time": float(np.median(times)), "time_min": min(times), "peak_memory": peak}
+
+
+
+def run_benchmarks(sizes=SIZES, names: list = None, repeat: int = 3, memory: bool = True, plots: bool = True):
+    """Runs the benchmarks at every dataset size.
+
+
+    Parameters
+    ----------
+    sizes: tuple
+        The numbers of rows.
+    names: list
+        The benchmarks to run (see ANALYZER_BENCHMARKS and VISUALIZER_BENCHMARKS),
+        defaults to all of them.
+    repeat: int
+        The number of timed runs per benchmark and size.
+    memory: bool
+        Whether the peak memory is measured.
+    plots: bool
+        Whether the Visualizer benchmarks are part of the default benchmarks.
+
+
+    Returns
+    -------
+    dict
+        'meta' (the versions, the platform and the time of the run) and
+        'results' (one dict per benchmark and size, see 'measure').
+
+    """
+    benchmarks = dict(ANALYZER_BENCHMARKS)
+    if plots or (names is not None and set(names) & set(VISUALIZER_BENCHMARKS)):
+        benchmarks.update(VISUALIZER_BENCHMARKS)
+    if names is not None:
+        unknown = set(names) - set(benchmarks)
+        assert not unknown, f"Unknown benchmarks {sorted(unknown)}."
+        benchmarks = {name: benchmarks[name] for name in names}
+    if set(benchmarks) & set(VISUALIZER_BENCHMARKS):
+        # imported on demand, the plotting libraries are not needed for the Analyzer benchmarks
+        from mypackage.visualization import Visualizer
+
+    results = []
+    for n_rows in sizes:
+        data = make_data(int(n_rows))
+        instances = {"analyzer": Analyzer(data)}
+        if set(benchmarks) & set(VISUALIZER_BENCHMARKS):
+            instances["visualizer"] = Visualizer(data)
+        for name, benchmark in benchmarks.items():
+            instance = instances["visualizer" if name in VISUALIZER_BENCHMARKS else "analyzer"]
+            result = measure(benchmark, instance, repeat=repeat, memory=memory)
+            results.append({"benchmark": name, "rows": int(n_rows), **result})
+            print(f"{name:45s} {int(n_rows):>10d} rows {result['time']:10.4f} s", file=sys.stderr)
+        del data, instances
+
+    meta = {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "platform": platform.platform(), "timestamp": datetime.datetime.now().isoformat(timespec="seconds")}
+    return {"meta": meta, "results": results}
+
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE):
+    """Compares a run with a saved baseline.
+
+
+    Parameters
+    ----------
+    results, baseline: dict
+        The results of two runs of 'run_benchmarks' (e.g. loaded from their JSON files).
+    tolerance: float
+        The relative increase of the time or the peak memory that is tolerated
+        (0.25 = 25% slower).
+
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per benchmark and size that is part of both runs, with the
+        ratios to the baseline and the column 'regression'.
+
+    """
+    columns = ["benchmark", "rows", "time", "peak_memory"]
+    current = pd.DataFrame(results["results"], columns=columns)
+    previous = pd.DataFrame(baseline["results"], columns=columns)
+    table = current.merge(previous, on=["benchmark", "rows"], suffixes=("", "_baseline"))
+    table["time_ratio"] = table["time"] / table["time_baseline"]
+    table["memory_ratio"] = (table["peak_memory"] / table["peak_memory_baseline"]).astype(float)
+    # a missing memory measurement is never a regression
+    table["regression"] = (table["time_ratio"] > 1 + tolerance) | (table["memory_ratio"].fillna(0) > 1 + tolerance)
+    return table
+# %%
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the Analyzer and Visualizer methods.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES, help="the numbers of rows")
+    parser.add_argument("--only", nargs="+", help="the names of the benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of timed runs per benchmark")
+    parser.add_argument("--no-memory", action="store_true", help="don't measure the peak memory")
+    parser.add_argument("--no-plots", action="store_true", help="skip the Visualizer benchmarks")
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    parser.add_argument("--baseline", help="a JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="the tolerated relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks([int(size) for size in args.sizes], args.only, args.repeat,
+                             not args.no_memory, not args.no_plots)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        table = compare(results, baseline, args.tolerance)
+        print(table.to_string(index=False))
+        regressions = table[table["regression"]]
+        if len(regressions):
+            print(f"{len(regressions)} regression(s) over the tolerance of {args.tolerance:.0%}.")
+            return 1
+    else:
+        print(pd.DataFrame(results["results"]).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# %%
+import numpy as np
+import sys
+import json
+import time
+import asyncio
+import argparse
+from mypackage.service import AnalysisService
+# %%
+# Load test of the analysis service (see mypackage.service). A number of clients
+# send a mix of requests over keep-alive connections and the latency of every
+# request is recorded. Without --url a service is started in this process.
+# The repeated requests are served from the cache of the service after their
+# first computation, the uncached requests have random arguments and are
+# computed every time, their latencies are reported separately.
+#
+# python -m tests.load_test --requests 2000 --concurrency 32
+# python -m tests.load_test --uncached 1.0
+# python -m tests.load_test --url 127.0.0.1:8000 --output latencies.json
+# %%
+# the requests the clients choose from (round robin), repeated requests are cache hits
+REQUESTS = [
+    ("/analyze", {"method": "survival_rate", "args": ["who"]}),
+    ("/analyze", {"method": "survival_rate", "args": ["pclass"], "kwargs": {"ci": 95}}),
+    ("/analyze", {"method": "chi_square_test", "args": ["sex", "pclass"]}),
+    ("/analyze", {"method": "ccf_categorization_mean"}),
+    ("/analyze", {"method": "ccf_categorization_count"}),
+    ("/analyze", {"method": "get_stats", "args": ["age"]}),
+    ("/analyze", {"method": "survival_rate", "args": ["alone"],
+                  "where": {"sex": "female", "pclass": 3, "embark_town": "Southampton"}}),
+    ("/plot", {"method": "plot_survival_rate", "args": ["who"], "format": "png"}),
+]
+
+# the columns and values of the random requests (every combination selects some rows)
+GROUP_COLUMNS = ["who", "sex", "pclass", "alone", "embark_town"]
+
+WHERE_VALUES = {"sex": ["female", "male"], "pclass": [1, 2, 3],
+                "embark_town": ["Cherbourg", "Queenstown", "Southampton"]}
+# %%
+async def _send(reader, writer, host: str, path: str, payload: dict):
+    """Sends one request over an open connection and returns the status and the body."""
+    body = json.dumps(payload).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, await reader.readexactly(int(headers["content-length"]))
+
+
+
+def random_request(rng):
+    """Returns an analyze request with random arguments, which is not in the cache of the service.
+
+    A survival rate with a random confidence level on the rows of random
+    values of WHERE_VALUES, the confidence level makes every request unique.
+
+    """
+    where = {}
+    for column, values in WHERE_VALUES.items():
+        if rng.random() < 0.5:
+            where[column] = [values[i] for i in sorted(rng.choice(len(values), rng.integers(1, len(values) + 1),
+                                                                  replace=False))]
+    return ("/analyze", {"method": "survival_rate", "args": [GROUP_COLUMNS[rng.integers(len(GROUP_COLUMNS))]],
+                         "kwargs": {"ci": float(rng.uniform(80, 99.9))}, "where": where})
+
+
+
+def _latencies(latencies: list):
+    """The number of requests and the latency percentiles in milliseconds."""
+    # None without requests, NaN is not valid JSON
+    p50, p90, p99, p100 = np.percentile(np.array(latencies) * 1000, [50, 90, 99, 100]) if latencies \
+        else [None] * 4
+    return {"requests": len(latencies), "p50": p50, "p90": p90, "p99": p99, "max": p100}
+
+
+
+async def _client(host: str, port: int, requests: list, latencies: dict, statuses: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for kind, (path, payload) in requests:
+            start = time.perf_counter()
+            status, _ = await _send(reader, writer, host, path, payload)
+            latencies[kind].append(time.perf_counter() - start)
+            statuses.append(status)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+
+async def run_load_test(host: str, port: int, n_requests: int = 1000, concurrency: int = 16,
+                        requests: list = REQUESTS, uncached: float = 0.25, seed: int = 0):
+    """Sends n_requests requests from 'concurrency' clients and measures their latency.
+
+
+    Parameters
+    ----------
+    host, port:
+        The address of the service.
+    n_requests: int
+        The total number of requests.
+    concurrency: int
+        The number of clients, every client has its own connection and
+        sends its requests one after the other.
+    requests: list
+        (path, payload) pairs, the repeated requests. The i-th of them is
+        requests[i % len(requests)].
+    uncached: float
+        The fraction of the requests with random arguments (see 'random_request').
+    seed: int
+        The seed of the random requests and of their positions.
+
+
+    Returns
+    -------
+    dict
+        'requests', 'errors' (responses other than 200), 'seconds',
+        'throughput' (requests per second) and the latency percentiles
+        'p50', 'p90', 'p99' and 'max' in milliseconds of all requests,
+        'cached' and 'uncached' hold the number and the latency percentiles
+        of the repeated and of the random requests.
+
+    """
+    rng = np.random.default_rng(seed)
+    schedule, repeated = [], 0
+    for is_random in rng.random(n_requests) < uncached:
+        if is_random:
+            schedule.append(("uncached", random_request(rng)))
+        else:
+            schedule.append(("cached", requests[repeated % len(requests)]))
+            repeated += 1
+    latencies, statuses = {"cached": [], "uncached": []}, []
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, schedule[i::concurrency], latencies, statuses)
+                           for i in range(min(concurrency, n_requests))])
+    seconds = time.perf_counter() - start
+    results = _latencies(latencies["cached"] + latencies["uncached"])
+    return {**results, "errors": sum(status != 200 for status in statuses),
+            "seconds": seconds, "throughput": results["requests"] / seconds,
+            "cached": _latencies(latencies["cached"]), "uncached": _latencies(latencies["uncached"])}
+
+
+
+async def _local_load_test(args):
+    """Starts a service in this process on a free port and runs the load test against it."""
+    service = AnalysisService(args.data, args.workers, args.cache_size)
+    server = await service.start(port=0)
+    try:
+        host, port = server.sockets[0].getsockname()[:2]
+        if args.warmup:
+            # the first requests of a worker import the libraries and build its Analyzer
+            await run_load_test(host, port, len(REQUESTS), len(REQUESTS), uncached=0)
+        results = await run_load_test(host, port, args.requests, args.concurrency, uncached=args.uncached,
+                                      seed=args.seed)
+        stats = dict(service.stats)
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.close()
+    return {**results, "service": stats}
+# %%
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Load test of the analysis service.")
+    parser.add_argument("--url", help="host:port of a running service, without it a local service is started")
+    parser.add_argument("--requests", type=int, default=1000, help="the total number of requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="the number of concurrent clients")
+    parser.add_argument("--uncached", type=float, default=0.25,
+                        help="the fraction of requests with random arguments, which miss the cache")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the random requests")
+    parser.add_argument("--data", help="the dataset of the local service")
+    parser.add_argument("--workers", type=int, help="the number of worker processes of the local service")
+    parser.add_argument("--cache-size", type=int, default=256, help="the cache size of the local service")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="measure the first requests of the local service as well")
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        host, _, port = args.url.replace("http://", "").rstrip("/").rpartition(":")
+        results = asyncio.run(run_load_test(host, int(port), args.requests, args.concurrency, uncached=args.uncached,
+                                            seed=args.seed))
+    else:
+        results = asyncio.run(_local_load_test(args))
+    print(f"{results['requests']} requests in {results['seconds']:.2f} s ({results['throughput']:.0f}/s), "
+          f"{results['errors']} errors")
+    for kind in ("cached", "uncached"):
+        latency = results[kind]
+        if not latency["requests"]:
+            continue
+        print(f"{kind:8} {latency['requests']:6} requests, latency p50 {latency['p50']:.2f} ms, "
+              f"p90 {latency['p90']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+    print(f"all      {results['requests']:6} requests, latency p50 {results['p50']:.2f} ms, "
+          f"p90 {results['p90']:.2f} ms, p99 {results['p99']:.2f} ms, max {results['max']:.2f} ms")
+    if "service" in results:
+        print(f"service: {results['service']}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# %%
+import os
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from mypackage.analysis import Analyzer
+from mypackage.dataset import load_data
+# %%
+# The same dataset as a pandas DataFrame (the reference), a dict of numpy arrays
+# and a pyarrow Table (plain and dictionary encoded) must give the same results
+# (see mypackage.backends).
+# The categorical columns are plain object columns here, so the group keys have
+# the same dtypes on every backend. The arrow tests are skipped without pyarrow
+# (except in the 'hatch test' environment, which installs it).
+# %%
+# float sums are added up in a different order by the backends
+RTOL = 1e-12
+
+CATEGORICAL = ["survived", "pclass", "sex", "who", "embark_town", "alone"]
+# %%
+def _columns():
+    columns = {}
+    for name, series in load_data().items():
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object).where(series.notna(), None)
+        columns[name] = series.to_numpy()
+    return columns
+
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return Analyzer(pd.DataFrame(_columns()))
+
+
+
+@pytest.fixture(scope="module", params=["numpy", "arrow", "arrow-dictionary"])
+def analyzer(request):
+    columns = _columns()
+    if request.param.startswith("arrow"):
+        # the test environment of hatch requires pyarrow, elsewhere the arrow tests are skipped without it
+        pyarrow = __import__("pyarrow") if os.environ.get("MYPACKAGE_REQUIRE_PYARROW") \
+            else pytest.importorskip("pyarrow")
+        table = pyarrow.table(columns)
+        if request.param == "arrow-dictionary":
+            # the string columns dictionary encoded, like the categoricals of Table.from_pandas
+            table = pyarrow.table({name: table[name].dictionary_encode() if values.dtype == object else table[name]
+                                   for name, values in columns.items()})
+        return Analyzer(table)
+    return Analyzer(columns)
+# %%
+def test_backend(analyzer, reference):
+    assert reference.backend == "pandas"
+    assert analyzer.backend in ("numpy", "arrow")
+    assert list(analyzer.columns) == list(reference.columns)
+    assert analyzer.n_rows == reference.n_rows
+
+
+
+@pytest.mark.parametrize("column", list(_columns()))
+def test_get_stats(analyzer, reference, column):
+    pd.testing.assert_series_equal(analyzer.get_stats(column), reference.get_stats(column),
+                                   check_exact=False, rtol=RTOL)
+
+
+
+def test_get_stats_approx(analyzer, reference):
+    pd.testing.assert_series_equal(analyzer.get_stats("fare", approx=True), reference.get_stats("fare", approx=True))
+
+
+
+@pytest.mark.parametrize("column", CATEGORICAL)
+def test_survival_rate(analyzer, reference, column):
+    pd.testing.assert_series_equal(analyzer.survival_rate(column), reference.survival_rate(column))
+    pd.testing.assert_frame_equal(analyzer.survival_rate(column, ci=95), reference.survival_rate(column, ci=95))
+
+
+
+@pytest.mark.parametrize("statistic", ["mean", "count", "median", "min", "max", "std"])
+def test_ccf_categorization(analyzer, reference, statistic):
+    pd.testing.assert_frame_equal(analyzer.ccf_categorization(statistic), reference.ccf_categorization(statistic),
+                                  check_exact=False, rtol=RTOL)
+
+
+
+def test_aggregate(analyzer, reference):
+    statistics = ("count", "sum", "mean", "std", "var", "min", "max", "median")
+    pd.testing.assert_frame_equal(analyzer.aggregate(["who", "sex"], "age", statistics),
+                                  reference.aggregate(["who", "sex"], "age", statistics),
+                                  check_exact=False, rtol=RTOL)
+    pd.testing.assert_frame_equal(analyzer.aggregate("embark_town", "parch", statistics),
+                                  reference.aggregate("embark_town", "parch", statistics),
+                                  check_exact=False, rtol=RTOL)
+    pd.testing.assert_frame_equal(analyzer.aggregate("sex", "alone", ("count", "sum", "mean", "min", "max")),
+                                  reference.aggregate("sex", "alone", ("count", "sum", "mean", "min", "max")))
+
+
+
+@pytest.mark.parametrize("column1, column2", [("sex", "pclass"), ("survived", "embark_town"), ("who", "alone")])
+def test_chi_square_test(analyzer, reference, column1, column2, capsys, caplog):
+    with caplog.at_level(logging.INFO, logger="mypackage.analysis"):
+        np.testing.assert_allclose(analyzer.chi_square_test(column1, column2),
+                                   reference.chi_square_test(column1, column2), rtol=RTOL)
+    # the conclusion is logged, not printed
+    assert capsys.readouterr().out == ""
+    assert len({record.getMessage() for record in caplog.records}) == 1
+
+
+
+def test_pandas_only_methods(analyzer):
+    with pytest.raises(AssertionError, match="needs a pandas DataFrame"):
+        analyzer.survival_cube()
+    with pytest.raises(AssertionError, match="needs a pandas DataFrame"):
+        analyzer.where(sex="female")
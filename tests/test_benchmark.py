@@ -0,0 +1,30 @@
+# %%
+from tests.benchmark import run_benchmarks, compare, make_data
+# %%
+# The benchmark suite itself runs with 'python -m tests.benchmark', these tests
+# only check that it works on a small dataset.
+# %%
+def test_make_data():
+    data = make_data(1_000)
+    assert len(data) == 1_000
+    assert data.index.is_unique
+    assert list(data.columns) == list(make_data(10).columns)
+
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(sizes=(1_000,), repeat=1, plots=False)
+    assert {result["benchmark"] for result in results["results"]} >= {"get_stats[age]", "survival_rate[who]"}
+    for result in results["results"]:
+        assert result["time"] > 0
+        assert result["peak_memory"] > 0
+
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": [{"benchmark": "a", "rows": 10, "time": 1.0, "peak_memory": 100},
+                            {"benchmark": "b", "rows": 10, "time": 1.0, "peak_memory": 100}]}
+    results = {"results": [{"benchmark": "a", "rows": 10, "time": 1.1, "peak_memory": 100},
+                           {"benchmark": "b", "rows": 10, "time": 2.0, "peak_memory": 100}]}
+    table = compare(results, baseline, tolerance=0.25)
+    assert table.set_index("benchmark")["regression"].to_dict() == {"a": False, "b": True}
@@ -0,0 +1,76 @@
+# %%
+import numpy as np
+import pandas as pd
+import pytest
+from mypackage.analysis import Analyzer
+from mypackage.compaction import compact
+from mypackage.dataset import load_data
+# %%
+# Compacting a dataset (see mypackage.compaction) changes the dtypes only, every
+# analysis must give the same results on the compacted and on the raw dataset.
+# The group keys are categoricals after the compaction, so only the values and
+# the labels of the results are compared, not the dtypes of their index.
+# %%
+# the dataset repeated, large enough for float32 sums to lose digits
+REPEATS = 500
+# %%
+def _raw():
+    data = load_data(cache=False)
+    data = pd.concat([data] * REPEATS, ignore_index=True)
+    # quarter values, each of them is exact in float32
+    data["fare"] = np.round(data["fare"] * 4) / 4
+    return data
+
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return Analyzer(_raw())
+
+
+
+@pytest.fixture(scope="module")
+def compacted():
+    return Analyzer(_raw(), compact=True)
+# %%
+def test_dtypes_are_compact(compacted):
+    dtypes = compacted.data.dtypes
+    assert dtypes["pclass"] == np.int8 and dtypes["fare"] == np.float64
+    assert isinstance(dtypes["who"], pd.CategoricalDtype)
+
+
+
+def test_signed_arithmetic(raw, compacted):
+    # unsigned columns would wrap around below zero
+    assert (compacted.data["sibsp"] - compacted.data["parch"]).min() == (raw.data["sibsp"] - raw.data["parch"]).min() < 0
+
+
+
+@pytest.mark.parametrize("column", ["age", "fare", "sibsp", "parch", "pclass"])
+def test_get_stats(raw, compacted, column):
+    pd.testing.assert_series_equal(compacted.get_stats(column), raw.get_stats(column), check_exact=True)
+
+
+
+@pytest.mark.parametrize("column", ["who", "sex", "pclass", "embark_town", "alone"])
+def test_survival_rate(raw, compacted, column):
+    pd.testing.assert_series_equal(compacted.survival_rate(column), raw.survival_rate(column),
+                                   check_exact=True, check_index_type=False, check_categorical=False)
+
+
+
+@pytest.mark.parametrize("method", ["ccf_categorization_mean", "ccf_categorization_count"])
+def test_ccf_categorization(raw, compacted, method):
+    pd.testing.assert_frame_equal(getattr(compacted, method)(), getattr(raw, method)(), check_exact=True,
+                                  check_index_type=False, check_column_type=False, check_categorical=False)
+
+
+
+def test_chi_square_test(raw, compacted):
+    assert compacted.chi_square_test("sex", "pclass") == raw.chi_square_test("sex", "pclass")
+
+
+
+def test_compact_keeps_floats():
+    data = pd.DataFrame({"fare": np.full(2_000_000, 249.75) + np.tile([0.0, 0.25, 0.5], 666_667)[:2_000_000]})
+    assert compact(data)["fare"].mean() == data["fare"].mean()
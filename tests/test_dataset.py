@@ -0,0 +1,41 @@
+# %%
+import os
+import shutil
+import multiprocessing
+import pandas as pd
+from mypackage.dataset import csv_path, cache_path_for, load_data
+# %%
+# Worker processes that start without a cache all parse the csv file and
+# write its cache at once, none of them may fail or see a broken cache.
+# %%
+N_PROCESSES = 8
+
+N_ROUNDS = 60
+# %%
+def _cold_starts(path: str, barrier, first: bool):
+    for _ in range(N_ROUNDS):
+        # every round starts without a cache
+        if first:
+            shutil.rmtree(cache_path_for(path), ignore_errors=True)
+        barrier.wait()
+        for _ in range(3):
+            assert len(load_data(path)) > 0
+        barrier.wait()
+
+
+
+def test_concurrent_cold_start(tmp_path):
+    path = os.fspath(tmp_path / "cleaned_data.csv")
+    shutil.copy(csv_path, path)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(N_PROCESSES, timeout=60)
+    processes = [context.Process(target=_cold_starts, args=(path, barrier, i == 0)) for i in range(N_PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * N_PROCESSES
+
+    pd.testing.assert_frame_equal(load_data(path), load_data())
+    # no temporary directories or lock files are left behind
+    assert sorted(os.listdir(tmp_path)) == ["cleaned_data.csv", "cleaned_data.csv.cache"]
@@ -0,0 +1,60 @@
+# %%
+import os
+import sys
+import json
+import pkgutil
+import subprocess
+import mypackage
+# %%
+# Importing the package must not run any analysis or plot and must not load
+# scipy, matplotlib or seaborn, they are imported by the methods that use them.
+# Every check runs in a fresh interpreter, so the modules imported by other
+# tests don't count.
+# %%
+HEAVY = ("scipy", "matplotlib", "seaborn")
+
+# the time the modules may take on top of pandas and numpy (which they always need),
+# generous enough for slow machines, the eager imports took more than a second
+IMPORT_BUDGET = 0.5
+
+MODULES = sorted(f"mypackage.{module.name}" for module in pkgutil.iter_modules(mypackage.__path__))
+# %%
+def _run(code: str):
+    """Runs python code in a fresh interpreter and returns what it printed as JSON."""
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={**os.environ, "MPLBACKEND": "Agg"})
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+
+def test_imports_are_lazy():
+    loaded = _run(f"import sys, json\n"
+                  f"for module in {MODULES!r}: __import__(module)\n"
+                  f"print(json.dumps([name for name in {HEAVY!r} if name in sys.modules]))")
+    assert loaded == []
+
+
+
+def test_imports_have_no_output():
+    result = subprocess.run([sys.executable, "-c", "; ".join(f"import {module}" for module in MODULES)],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout == ""
+
+
+
+def test_import_time_budget():
+    seconds = _run("import time, json, numpy, pandas\n"
+                   "start = time.perf_counter()\n"
+                   "import mypackage.analysis, mypackage.visualization\n"
+                   "print(json.dumps(time.perf_counter() - start))")
+    assert seconds < IMPORT_BUDGET, f"Importing the package took {seconds:.2f} s."
+
+
+
+def test_scipy_is_loaded_on_first_use():
+    loaded = _run("import sys, json\n"
+                  "from mypackage.analysis import Analyzer\n"
+                  "before = 'scipy.stats' in sys.modules\n"
+                  "Analyzer().chi_square_test('sex', 'pclass')\n"
+                  "print(json.dumps([before, 'scipy.stats' in sys.modules]))")
+    assert loaded == [False, True]